@@ -8,26 +8,38 @@ from PIL import Image
 import jwt
 import requests
 import typing
+import threading
+import time
+import ast
+from concurrent.futures import ThreadPoolExecutor
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+import api_client
+import charts
+import duplicates
+import export
+import ingest
+import memo
+import profiling
+import projects
+import rollups
+import schema
+import table_cache
+import warmup
 
 
-@st.cache_data(ttl=3600)  # 1 hour
 def get_api_token() -> typing.Union[str, None]:
-    """returns API token (str) based on environment variables. Returns None
-    if API call fails"""
-    server_name = os.environ["API_SERVER_URL"]
-    cert_key = os.environ["CERT_NAME"]
-    encoded = os.environ["ENCODED_CERT"]
-    resp = requests.get(
-        f"{server_name}/auth", headers={"mykey": cert_key, "test": encoded,},
-    )
-    if resp.status_code != 200:
-        st.error(f"status_code={resp.status_code}, {data['msg']}")
+    """returns API token (str) based on environment variables. The token is
+    shared by all sessions and refreshed ahead of its expiry by
+    api_client.tokens. Returns None if API call fails"""
+    try:
+        return api_client.tokens.get()
+    except (requests.exceptions.RequestException, api_client.AuthError) as e:
+        st.error(f"API authentication failed: {e}")
         return None
 
-    data = resp.json()
-    return data["access_token"]
-
 
+@profiling.timed()
 def decrypt_api_response(encryted_data: str) -> pd.DataFrame:
     """Decrypts the api query response data using jwt and returns a pandas
     DataFrame"""
@@ -37,31 +49,110 @@ def decrypt_api_response(encryted_data: str) -> pd.DataFrame:
     return pd.DataFrame(data)
 
 
+# records requested per API call, 0 downloads each query in a single request
+PAGE_SIZE = int(os.environ.get("BWF_API_PAGE_SIZE", 0))
+
+
+class APIError(Exception):
+    """raised when the API answers a query with an error status"""
+
+
+def fetch_query(token: str, query_data: dict, table: str) -> str:
+    """posts a query to the API and returns the still encrypted response. If
+    the token is rejected the query is retried once with a fresh token.
+    raises requests.exceptions.RequestException if the API can't be reached
+    and APIError if it returns an error status"""
+    server_name = os.environ["API_SERVER_URL"]
+    resp = api_client.post(
+        f"{server_name}/query/{table}",
+        data=query_data,
+        headers={"Authorization": f"Bearer {token}",},
+    )
+    if resp.status_code == 401:
+        # the token expired early or was revoked, retry once with a new one
+        token = api_client.tokens.invalidate(token)
+        resp = api_client.post(
+            f"{server_name}/query/{table}",
+            data=query_data,
+            headers={"Authorization": f"Bearer {token}",},
+        )
+    if resp.status_code != 200:
+        raise APIError(f"status_code={resp.status_code}, {resp.json()}")
+    # query data will be encrypted with server cert
+    return resp.json()
+
+
+def with_page(query_data: dict, skip: int, limit: int) -> dict:
+    """returns a copy of query_data that only asks for {limit} records after
+    the first {skip}"""
+    extra = ast.literal_eval(query_data.get("extra", "{}"))
+    extra.update(skip=skip, limit=limit)
+    return dict(query_data, extra=str(extra))
+
+
+@profiling.timed()
 def query_api(
-    token: str, query_data: dict, table: str
+    token: str,
+    query_data: dict,
+    table: str,
+    page_size: int = None,
+    report: bool = False,
 ) -> typing.Union[pd.DataFrame, None]:
     """runs a query on the API according to the following inputs:
     token=Authorization token retreived previously
     query_data=dictionary with all query parameters
     table=name of table to query from
+    page_size=records per request, defaults to PAGE_SIZE. 0 fetches the whole
+    result in one request. When paging, the next page is downloaded while the
+    current one is decoded, and only the decoded DataFrame chunks are kept,
+    each with schema.apply_schema() applied as it comes in
+    report=record the memory use for schema.memory_report()
     returns a pandas DataFrame or None if the API request fails"""
-    server_name = os.environ["API_SERVER_URL"]
-    server_public_key = os.environ["PUBLIC_KEY"]
-    resp = requests.post(
-        f"{server_name}/query/{table}",
-        data=query_data,
-        headers={"Authorization": f"Bearer {token}",},
-    )
-
-    if resp.status_code != 200:
-        st.error(f"status_code={resp.status_code}, {resp.json()}")
+    if page_size is None:
+        page_size = PAGE_SIZE
+    try:
+        if not page_size:
+            # decrypt query results with server public cert
+            df = decrypt_api_response(fetch_query(token, query_data, table))
+            return schema.apply_schema(df, table, report=report)
+
+        chunks = []
+        bytes_before = 0
+        skip = 0
+        pool = ThreadPoolExecutor(max_workers=1)
+        try:
+            page = pool.submit(
+                fetch_query, token, with_page(query_data, skip, page_size), table
+            )
+            while True:
+                results = page.result()
+                skip += page_size
+                # the next page is requested before it is known to exist so
+                # that its download overlaps with decoding this one
+                page = pool.submit(
+                    fetch_query, token, with_page(query_data, skip, page_size), table
+                )
+                chunk = decrypt_api_response(results)
+                del results
+                if report:
+                    bytes_before += int(chunk.memory_usage(deep=True).sum())
+                # only the converted chunk is kept, not its raw objects
+                chunk = schema.apply_schema(chunk, table)
+                chunks.append(chunk)
+                if len(chunk) < page_size:
+                    break
+        finally:
+            # don't wait for the speculative request after the last page
+            pool.shutdown(wait=False, cancel_futures=True)
+    except (requests.exceptions.RequestException, APIError, api_client.AuthError) as e:
+        st.error(f"API query of {table} failed: {e}")
         return None
-        # query data will be encrypted with server cert
-    query_results = resp.json()
-    # load server public cert
-    # server_public_key = open('certs/server/2023-02-10.pub', 'rb').read()
-    # decrypt query results with server public cert
-    return decrypt_api_response(query_results)
+
+    df = schema.concat(chunks, table, bytes_before if report else None)
+    if "id" in df.columns:
+        # records added while paging shift the pages, which can repeat a record
+        df = df.drop_duplicates(subset="id", ignore_index=True)
+    return df
 
 
 # table names
@@ -84,100 +175,356 @@ def query_api(
 # VolunteerMonthlyTotalSummary
 
 
-@st.cache_data(ttl=3600 * 24)  # 24 hrs
-def get_data(tableName: str) -> typing.Union[pd.DataFrame, None]:
-    """returns pandas DataFrame of all {tableName} data from Ghana where
-    completed == 1 and disabled != True.
-    returns None if API request (query_api()) fails"""
-    query_data = {
-        "query": str(
-            {
-                "$and": [
-                    {"Country": "Ghana"},
-                    {"Completed": 1},
-                    {"disabled": {"$ne": True}},
-                ]
-            }
-        ),
-        "extra": str({"sort": [("date", 1)]}),
+# when set, community selections are sent to the API as a filter instead of
+# downloading every Ghana record and filtering locally
+SERVER_SIDE_FILTER = os.environ.get("BWF_SERVER_SIDE_FILTER", "0") == "1"
+
+# when set, tables that have been synced before (in memory or in the disk
+# cache) are served as they are, without asking the API for changes
+OFFLINE = os.environ.get("BWF_OFFLINE", "0") == "1"
+
+# a full re-download replaces the delta-synced copy at least this often so that
+# edits the delta query can't see (e.g. Completed flipping to 1 on an old record)
+# are eventually picked up
+FULL_SYNC_TTL = 3600 * 24 * 7  # 1 week
+
+# tables synced less than this many seconds ago are served as they are. The
+# warm-up worker syncs every table more often than this (see warmup.py), so
+# sessions don't wait on the API
+SYNC_MAX_AGE = float(os.environ.get("BWF_SYNC_MAX_AGE", 3600))
+
+
+# columns every projected download keeps, they are needed for syncing and for
+# filtering by community
+SYNC_COLUMNS = ["id", "Community", "date", table_cache.WATERMARK_COLUMN]
+
+
+def build_query(
+    conditions: typing.List[dict],
+    columns: typing.Union[typing.Sequence[str], None] = None,
+) -> dict:
+    """returns the query_data dictionary for query_api() for Ghana records where
+    completed == 1, plus any extra {conditions}, sorted by date and id.
+    If {columns} is given only those fields are requested from the server"""
+    # records on the same date are ordered by id, so pages don't overlap
+    extra = {"sort": [("date", 1), ("id", 1)]}
+    if columns is not None:
+        extra["projection"] = {column: 1 for column in columns}
+    return {
+        "query": str({"$and": [{"Country": "Ghana"}, {"Completed": 1}] + conditions}),
+        "extra": str(extra),
     }
-    token = get_api_token()
-    df = query_api(token, query_data, tableName)
-    return df
 
 
-def add_since_earliest(df: pd.DataFrame) -> pd.DataFrame:
-    """adds a column to the inputted DataFrame that contains the earliest
-    date"""
-    return df.assign(
-        since_earliest=lambda df_: df_.date - df_.groupby(by="Community").date.transform(min)
+@st.cache_data(ttl=3600)  # 1 hour, refreshes are incremental
+@profiling.timed("get_data (cache miss)")
+def get_data(
+    tableName: str,
+    columns: typing.Union[typing.Sequence[str], None] = None,
+    communities: typing.Union[typing.Sequence[str], None] = None,
+) -> typing.Union[pd.DataFrame, None]:
+    """returns pandas DataFrame of all {tableName} data from Ghana where
+    completed == 1 and disabled != True.
+    If {columns} is given, only those columns (plus SYNC_COLUMNS) are
+    downloaded, and the result is cached separately for each column set.
+    If {communities} is given, the API only returns records from those
+    communities, and the result is cached separately for each community set.
+    The first call does a full download, later calls only ask the API for
+    records created after the newest one already held (plus the ids of
+    records that have been disabled since) and merge them in.
+    Column dtypes come from schema.TABLE_SCHEMAS and are applied once, as
+    records are downloaded.
+    Synced tables are also kept in an on-disk Parquet cache, so after a
+    restart the first call starts from that copy instead of a full download.
+    returns None if API request (query_api()) fails and nothing was
+    downloaded before"""
+    return sync_data(tableName, columns, communities, SYNC_MAX_AGE)
+
+
+def community_conditions(
+    communities: typing.Union[typing.Sequence[str], None],
+) -> typing.List[dict]:
+    """returns the query conditions for records of {communities}, none if
+    it is None"""
+    if communities is None:
+        return []
+    return [{"Community": {"$in": sorted(set(communities))}}]
+
+
+def table_key(
+    tableName: str,
+    columns: typing.Union[typing.Sequence[str], None] = None,
+    communities: typing.Union[typing.Sequence[str], None] = None,
+) -> table_cache.TableKey:
+    """returns the key the {tableName} table that get_data() serves is stored
+    under"""
+    if columns is not None:
+        columns = sorted(set(columns) | set(SYNC_COLUMNS))
+    query_data = build_query(
+        community_conditions(communities) + [{"disabled": {"$ne": True}}], columns
+    )
+    return table_cache.TableKey(
+        tableName,
+        query_data["query"],
+        query_data["extra"],
+        None if communities is None else tuple(sorted(set(communities))),
+        ingest.VERSION,
     )
 
 
-def tweak_initial(df: pd.DataFrame) -> pd.DataFrame:
-    """data wrangling function for initial survey DataFrame. Strips whitespace on free input
-    questions"""
-    # name and phone are the only true free response questions
-    return df.assign(
-        HeadHouseholdName=lambda df_: df_.HeadHouseholdName.str.strip(),
-        HeadHouseholdPhoneNumber=lambda df_: df_.HeadHouseholdPhoneNumber.str.strip(),
-        nameBwe=lambda df_: df_.nameBwe.str.strip(),
+def serves_stored(
+    state: typing.Union[table_cache.TableState, None], max_age: float
+) -> bool:
+    """True if sync_data() serves the stored {state} without asking the API:
+    when offline, the API is down or the copy is less than {max_age} seconds
+    old"""
+    return state is not None and (
+        OFFLINE
+        or api_client.breaker.is_open()
+        or time.time() - state.synced_at < max_age
     )
 
 
-def tweak_followup(df: pd.DataFrame) -> pd.DataFrame:
-    """data wrangling function for followup survey DataFrame. Strips whitespace on free input 
-    questions"""
-    return df.assign(
-        HeadHouseholdName=lambda df_: df_.HeadHouseholdName.str.strip(),
-        nameBwe=lambda df_: df_.nameBwe.str.strip(),
+def sync_data(
+    tableName: str,
+    columns: typing.Union[typing.Sequence[str], None] = None,
+    communities: typing.Union[typing.Sequence[str], None] = None,
+    max_age: float = 0,
+) -> typing.Union[pd.DataFrame, None]:
+    """syncs the stored copy of the {tableName} table that get_data() serves,
+    unless it was synced less than {max_age} seconds ago, and returns it.
+    Unlike get_data() this isn't cached, so every call with max_age=0 asks
+    the API for changes"""
+    if columns is not None:
+        columns = sorted(set(columns) | set(SYNC_COLUMNS))
+    conditions = community_conditions(communities)
+    key = table_key(tableName, columns, communities)
+    query_data = {"query": key.query, "extra": key.extra}
+    state = table_cache.get_state(key)
+    if serves_stored(state, max_age):
+        return state.frame
+    first_dates = first_survey_dates(tableName)
+    if tableName in ingest.FIRST_DATES_TABLES and first_dates is None:
+        # never store follow ups without their derived columns
+        return None if state is None else state.frame
+    token = get_api_token()
+
+    if table_cache.needs_full_sync(state, FULL_SYNC_TTL):
+        df = query_api(token, query_data, tableName, report=True)
+        if df is None:
+            return None if state is None else state.frame
+        df = ingest.prepare(df, tableName, first_dates)
+        return table_cache.replace(key, df).frame
+
+    new_rows = query_api(
+        token,
+        build_query(
+            conditions
+            + [
+                {"disabled": {"$ne": True}},
+                {table_cache.WATERMARK_COLUMN: {"$gt": state.watermark}},
+            ],
+            columns,
+        ),
+        tableName,
+    )
+    disabled = query_api(
+        token, build_query(conditions + [{"disabled": True}], ["id"]), tableName
     )
+    if new_rows is None or disabled is None:
+        return state.frame
+    removed_ids = disabled.id if not disabled.empty else []
+    # categories that only appear in the new rows turn merged categoricals
+    # back into objects, so the schema is applied to the merged frame as well,
+    # and the derived columns are computed again over all of its rows
+    return table_cache.merge(
+        key,
+        new_rows,
+        removed_ids,
+        prepare=lambda df: ingest.prepare(
+            schema.apply_schema(df, tableName), tableName, first_dates
+        ),
+    ).frame
 
 
+def first_survey_dates(tableName: str) -> typing.Union[pd.Series, None]:
+    """returns the first initial survey date of each community, which the
+    ingest pipeline needs for follow up surveys, or None for other tables or
+    if the initial surveys can't be downloaded"""
+    if tableName not in ingest.FIRST_DATES_TABLES:
+        return None
+    # the same download as get_community_options(), so usually already cached
+    initial = get_data(tableName="InitialSurvey", columns=["Community"])
+    return None if initial is None else ingest.first_survey_dates(initial)
+
+
+@profiling.timed()
+def get_tables(
+    tableNames: typing.List[str],
+    columns: typing.Union[typing.Dict[str, typing.Sequence[str]], None] = None,
+    communities: typing.Union[typing.Sequence[str], None] = None,
+) -> typing.List[typing.Union[pd.DataFrame, None]]:
+    """returns get_data(tableName, columns[tableName], communities) for every
+    table in {tableNames}, in the same order. Tables missing from {columns}
+    are downloaded with all their columns. Tables that aren't cached yet are
+    downloaded and decoded concurrently, so a cold page waits about as long
+    as its slowest table"""
+    columns = columns or {}
+    if communities is not None:
+        # one cache entry per community set, whatever order it was picked in
+        communities = sorted(set(communities))
+    # fetch the token once up front instead of once per thread, unless no
+    # table is going to be synced (e.g. while the API is down)
+    if not all(
+        serves_stored(
+            table_cache.get_state(table_key(name, columns.get(name), communities)),
+            SYNC_MAX_AGE,
+        )
+        for name in tableNames
+    ):
+        get_api_token()
+    ctx = get_script_run_ctx()
+    with ThreadPoolExecutor(
+        max_workers=len(tableNames),
+        initializer=lambda: add_script_run_ctx(threading.current_thread(), ctx),
+    ) as pool:
+        return list(
+            pool.map(
+                get_data,
+                tableNames,
+                [columns.get(name) for name in tableNames],
+                [communities] * len(tableNames),
+            )
+        )
+
+
+@profiling.timed()
 def get_community(df: pd.DataFrame, communities: typing.List[str]) -> pd.DataFrame:
-    """query the DataFrame to only return the records with the selected communities"""
-    return df.query("Community.isin(@communities).values")
-
-
-def weekday_graph(data: pd.DataFrame) -> None:
-    """produce a bar graph of number of surveys conducted on each day of the week"""
-    mapdict = {
-        "0": "Mon",
-        "1": "Tues",
-        "2": "Wed",
-        "3": "Thur",
-        "4": "Fr",
-        "5": "Sat",
-        "6": "Sun",
-    }
+    """query the DataFrame to only return the records with the selected communities.
+    Synced tables are taken by their row positions in the Community
+    partition, see table_cache.select()"""
+    return table_cache.select(df, "Community", communities)
+
+
+def get_community_tables(
+    tableNames: typing.List[str],
+    communities: typing.List[str],
+    columns: typing.Union[typing.Dict[str, typing.Sequence[str]], None] = None,
+) -> typing.List[typing.Union[pd.DataFrame, None]]:
+    """returns the records of each table in {tableNames} from the selected
+    communities. With SERVER_SIDE_FILTER the API does the filtering, otherwise
+    the whole tables are fetched and filtered with get_community()"""
+    if SERVER_SIDE_FILTER:
+        return get_tables(tableNames, columns, communities)
+    return [
+        None if df is None else get_community(df, communities)
+        for df in get_tables(tableNames, columns)
+    ]
+
+
+def get_community_options() -> typing.Union[pd.DataFrame, None]:
+    """returns the Community column of every initial survey, which is all
+    selection_sidebar() needs"""
+    return get_data(tableName="InitialSurvey", columns=["Community"])
+
+
+def weekday_counts(
+    data: pd.DataFrame, communities: typing.Union[typing.List[str], None] = None
+) -> pd.Series:
+    """number of surveys conducted on each day of the week, summed from the
+    daily rollup of the table when the rows of {communities} are given"""
+    return rollups.by_weekday(rollups.daily_counts(data, communities))
+
+
+def weekday_figure(counts: pd.Series) -> plt.Figure:
+    """bar graph of number of surveys conducted on each day of the week"""
     fig, ax = plt.subplots()
-    datedata = pd.to_datetime(data.date)
-    datedata.dt.day_of_week.value_counts().sort_index().plot.bar(
+    counts.plot.bar(
         ylabel="Initial Surveys Conducted",
         title="Day of Week Initial Survey was conducted",
         ax=ax,
     )
-    newlabels = [mapdict[tck.get_text()] for tck in ax.get_xticklabels()]
-    ax.set_xticklabels(newlabels)
     ax.grid(axis="y")
     add_labels(ax, pct=False)
-    st.pyplot(fig)
+    return fig
 
 
-def date_graph(data_i: pd.DataFrame, data_f: pd.DataFrame) -> None:
-    """produce a graph showing the number of surveys conducted on each day of the year"""
-    data_i = data_i.assign(date=pd.to_datetime(data_i.date))
-    data_f = data_f.assign(date=pd.to_datetime(data_f.date))
-    weekly = data_f.groupby(pd.Grouper(key="date", freq="W")).id.count()
+@profiling.timed()
+def weekday_graph(
+    data: pd.DataFrame, scope: typing.Union[memo.Scope, None] = None
+) -> None:
+    """produce a bar graph of number of surveys conducted on each day of the week.
+    The graph is memoized in {scope} if one is given"""
+    if scope is None:
+        counts = weekday_counts(data)
+    else:
+        counts = scope.value(
+            "home.weekday_counts",
+            lambda: weekday_counts(data, list(scope.communities)),
+        )
+    charts.show(
+        "home.weekday_graph",
+        lambda: weekday_figure(counts),
+        lambda: charts.bar_spec(
+            counts,
+            "Day of Week Initial Survey was conducted",
+            "Initial Surveys Conducted",
+            pct=False,
+        ),
+        scope,
+    )
+
+
+def weekly_counts(
+    data_i: pd.DataFrame,
+    data_f: pd.DataFrame,
+    communities: typing.Union[typing.List[str], None] = None,
+) -> pd.DataFrame:
+    """number of follow up and initial surveys conducted each week, summed
+    from the daily rollups of the tables when the rows of {communities} are
+    given"""
+    return pd.concat(
+        {
+            name: rollups.by_period(rollups.daily_counts(df, communities), "W")
+            for name, df in [("Follow up", data_f), ("Initial", data_i)]
+        },
+        axis=1,
+        sort=True,
+    )
+
+
+def date_figure(weekly: pd.DataFrame) -> plt.Figure:
+    """graph showing the number of surveys conducted each week"""
     fig, ax = plt.subplots()
-    weekly.plot.area(
+    weekly["Follow up"].dropna().plot.area(
         ax=ax, title="Initial and Follow up survey date", label="Follow up"
     )
-
-    weekly = data_i.groupby(pd.Grouper(key="date", freq="W")).id.count()
-    weekly.plot.area(ax=ax, label="Initial").grid(axis="y")
+    weekly["Initial"].dropna().plot.area(ax=ax, label="Initial").grid(axis="y")
     ax.legend()
-    st.pyplot(fig)
+    return fig
+
+
+@profiling.timed()
+def date_graph(
+    data_i: pd.DataFrame,
+    data_f: pd.DataFrame,
+    scope: typing.Union[memo.Scope, None] = None,
+) -> None:
+    """produce a graph showing the number of surveys conducted on each day of the year.
+    The graph is memoized in {scope} if one is given"""
+    if scope is None:
+        weekly = weekly_counts(data_i, data_f)
+    else:
+        weekly = scope.value(
+            "home.weekly_counts",
+            lambda: weekly_counts(data_i, data_f, list(scope.communities)),
+        )
+    charts.show(
+        "home.date_graph",
+        lambda: date_figure(weekly),
+        lambda: charts.area_spec(weekly, "Initial and Follow up survey date"),
+        scope,
+    )
 
 
 def add_labels(ax: plt.Axes, pct: bool = True) -> None:
@@ -206,13 +553,21 @@ def header_info() -> None:
     )
 
 
+def community_names(df: pd.DataFrame) -> typing.List[str]:
+    """returns the communities in df. For synced tables these are read from
+    the Community partition instead of scanning the rows"""
+    version = table_cache.data_version(df)
+    part = None if version is None else table_cache.partition(version, "Community")
+    if part is None:
+        return list(df.Community.dropna().unique())
+    return list(part.rows)
+
+
 def selection_sidebar(df_initial: pd.DataFrame) -> typing.List[str]:
     """interactive multiselect on the sidebar. Whatever selection the user makes on
-    one page will be carried over to the other pages"""
-    commuity_selection_options = [
-        "Sankebunase project (Sankebunase, Nkurakan, Amonom, Mampong, Wekpeti)",
-        "Ekorso project (Ekorso, Akwadum, Akwadusu)",
-    ] + list(df_initial.Community.dropna().unique())
+    one page will be carried over to the other pages. Projects from the
+    projects.csv registry are offered along with single communities"""
+    commuity_selection_options = list(projects.PROJECTS) + community_names(df_initial)
     if "c_select" not in st.session_state:
         st.session_state.c_select = []
     communities = st.sidebar.multiselect(
@@ -224,87 +579,93 @@ def selection_sidebar(df_initial: pd.DataFrame) -> typing.List[str]:
         st.sidebar.error("Please select at least one community.")
         st.session_state.c_select = []
     else:
-        if commuity_selection_options[0] in communities:
-            group_communities = [
-                "Sankebunase (Nkurakan/Amonon)",
-                "Sankebunase",
-                "Nkurakan",
-                "Amonom",
-                "Mampong",
-                "Wekpeti/Abresu",
-            ]
-            communities.remove(commuity_selection_options[0])
-            communities += group_communities
-        if commuity_selection_options[1] in communities:
-            group_communities = ["Ekorso", "Akwadum", "Akwadusu"]
-            communities.remove(commuity_selection_options[1])
-            communities += group_communities
-        communities = list(set(communities))
+        communities = projects.expand(communities)
         st.session_state.c_select = communities
         st.write("### selected communities", communities)
 
     return communities
 
 
+def export_buttons(frames: typing.Dict[str, pd.DataFrame]) -> None:
+    """download buttons for the selected rows of each table in {frames}, a
+    table name -> DataFrame dict. Files are only written when a button is
+    clicked, in chunks and outside the script thread, see export.export()"""
+    with st.expander("Download the selected data"):
+        fmt = st.selectbox("File format", list(export.FORMATS), key="export_format")
+        extension, mime = export.FORMATS[fmt]
+        for table, df in frames.items():
+            st.download_button(
+                f"{table} ({len(df)} rows)",
+                data=lambda df=df: export.export(df, fmt),
+                file_name=f"{table}.{extension}",
+                mime=mime,
+                on_click="ignore",
+                key=f"export_{table}",
+            )
+
+
 def main() -> None:
     """main function"""
+    profiling.start_run("Home")
     header_info()
 
-    df_initial = get_data(tableName="InitialSurvey")
-    df_followup = get_data(tableName="FollowUpSurvey")
-    if (type(df_initial) != pd.DataFrame) or (type(df_followup) != pd.DataFrame):
+    df_communities = get_community_options()
+    if type(df_communities) != pd.DataFrame:
         st.error("API failed to return data")
         # return
 
-    communities = selection_sidebar(df_initial)
+    communities = selection_sidebar(df_communities)
 
     if communities:
-        data_initial = get_community(df_initial, communities)
-        data_followup = get_community(df_followup, communities)
+        data_initial, data_followup = get_community_tables(
+            ["InitialSurvey", "FollowUpSurvey"], communities
+        )
+        if (type(data_initial) != pd.DataFrame) or (
+            type(data_followup) != pd.DataFrame
+        ):
+            st.error("API failed to return data")
+            return
 
         st.write(
             "### Initial Survey Data",
-            data_initial.drop(columns=["HeadHouseholdPhoneNumber", "Namebwe"]),
+            data_initial.drop(columns=["Namebwe"]),
         )
 
         st.write("---")
         st.write("### Follow up Survey Data", data_followup.drop(columns=["Namebwe"]))
-        date_graph(data_initial, data_followup)
+        export_buttons(
+            {"InitialSurvey": data_initial, "FollowUpSurvey": data_followup}
+        )
+        with st.expander("Memory use of downloaded tables"):
+            st.write(schema.memory_report())
+        scope = memo.Scope([data_initial, data_followup], communities)
+        date_graph(data_initial, data_followup, scope)
 
-        weekday_graph(data_initial)
+        weekday_graph(data_initial, scope)
 
         st.write("---")
         # st.write('### Number of Surveys conducted per Safe Water Educator',data_initial.Namebwe.value_counts())
 
-        dup_name = data_initial.HeadHouseholdName.value_counts().loc[lambda x: x > 1]
-        if dup_name.any():
+        with profiling.timer("home.duplicates"):
+            dup_households = duplicates.duplicate_households(data_initial, communities)
+        if not dup_households.empty:
             st.write("---")
             st.write(
-                "#### These household names are duplicated in this dataset", dup_name
+                "#### These households look duplicated in this dataset",
+                "Records with the same or a similar head of household name, or "
+                "the same phone number, in the same community. A score of 1 "
+                "means an exact match after ignoring case, spacing and word order",
+                dup_households,
             )
         else:
             st.write("---")
-            st.write("#### There are no duplicate household names in this dataset")
+            st.write("#### There are no duplicate households in this dataset")
             
         
 
         
-        data_initial['date'] = pd.to_datetime(
-            data_initial['date']
-        )
-        
-        data_initial['firstDateCommunity'] = (data_initial
-            .groupby('Community')
-            .date
-            .transform(min)
-        )
-        data_initial['sinceEarliest'] = ((data_initial
-                                        .date - data_initial
-                                        .firstDateCommunity)
-                                       .dt
-                                       .days
-                                      )
-        
+        # firstDateCommunity and sinceEarliest are added as the tables are
+        # downloaded, see ingest.prepare()
         cols = ['SurveyId','date',
                 'createdAt','Namebwe',
                 'HeadHouseholdName','Community',
@@ -312,17 +673,32 @@ def main() -> None:
             
         # st.write(data_initial[cols])
         # st.write(data_initial[cols].dtypes)
-        fig,ax = plt.subplots()
-        (data_initial
-         .sinceEarliest
-         .plot
-         .hist(bins=30,ax=ax,
-               title=f'''  Initial Surveys
-               How many days since the first survey
-               was conducted in this community'''
-              )
+        def initial_since_earliest_figure() -> plt.Figure:
+            fig,ax = plt.subplots()
+            (data_initial
+             .sinceEarliest
+             .plot
+             .hist(bins=30,ax=ax,
+                   title=f'''  Initial Surveys
+                   How many days since the first survey
+                   was conducted in this community'''
+                  )
+            )
+            return fig
+
+        charts.show(
+            "home.initial_since_earliest",
+            initial_since_earliest_figure,
+            lambda: charts.histogram_spec(
+                data_initial.sinceEarliest,
+                [
+                    "Initial Surveys",
+                    "How many days since the first survey",
+                    "was conducted in this community",
+                ],
+            ),
+            scope,
         )
-        st.pyplot(fig)
         
         
         
@@ -330,37 +706,44 @@ def main() -> None:
         
         
         #=============================================
-        mindatekey = data_initial.groupby('Community').date.min().reset_index().rename(columns={'date':'firstDateCommunity'})
-        # st.write(mindatekey)
-        
-        data_followup['date'] = pd.to_datetime(
-            data_followup['date']
-        )
-        
-        data_followup = data_followup.merge(mindatekey,how='left')
         # st.write(df_followup)
         
-        data_followup['sinceEarliest'] = ((data_followup
-                                        .date - data_followup
-                                        .firstDateCommunity)
-                                       .dt
-                                       .days
-                                      )
-        
-        fig,ax = plt.subplots()
-        (data_followup
-         .sinceEarliest
-         .plot
-         .hist(bins=30,ax=ax,
-               title=f'''  Follow Up Surveys
-               How many days since the first survey
-               was conducted in this community
-               6 months = {365//2} days
-               9 months = {3*365//4} days'''
-              )
+        def followup_since_earliest_figure() -> plt.Figure:
+            fig,ax = plt.subplots()
+            (data_followup
+             .sinceEarliest
+             .plot
+             .hist(bins=30,ax=ax,
+                   title=f'''  Follow Up Surveys
+                   How many days since the first survey
+                   was conducted in this community
+                   6 months = {365//2} days
+                   9 months = {3*365//4} days'''
+                  )
+            )
+            return fig
+
+        charts.show(
+            "home.followup_since_earliest",
+            followup_since_earliest_figure,
+            lambda: charts.histogram_spec(
+                data_followup.sinceEarliest,
+                [
+                    "Follow Up Surveys",
+                    "How many days since the first survey",
+                    "was conducted in this community",
+                    f"6 months = {365//2} days",
+                    f"9 months = {3*365//4} days",
+                ],
+            ),
+            scope,
         )
-        st.pyplot(fig)
 
 
+# the first page opened in this process starts the warm-up worker, unless
+# tools/serve.py started it with the server
+warmup.start()
+
 if __name__ == "__main__":
     main()
+    profiling.render_panel()
@@ -0,0 +1,245 @@
+import typing
+from dataclasses import dataclass
+
+import pandas as pd
+from pandas.api.types import CategoricalDtype
+
+import comparison
+import cube
+import households
+
+
+@dataclass
+class Aggregate:
+    """an aggregate memoized under {section}, computed by
+    compute(*frames, communities) from the selected rows of each table in
+    {tables}, which maps table names to the columns its page requests them
+    with"""
+
+    section: str
+    tables: typing.Dict[str, typing.List[str]]
+    compute: typing.Callable[..., typing.Any]
+
+
+# InitialSurvey fields used by the demographics page, only these are downloaded
+DEMOGRAPHICS_COLUMNS = [
+    "HeadHouseholdName",
+    "TotalNoPeopleHousehold",
+    "NoHouseholdMale0_1Year",
+    "NoHouseholdFemale0_1Year",
+    "NoHouseholdMale1_5Year",
+    "NoHouseholdFemale1_5Year",
+    "NoHouseholdMale5_12Year",
+    "NoHouseholdFemale5_12Year",
+    "NoHouseholdMale13_17Year",
+    "NoHouseholdFemale13_17Year",
+    "MainSourceDrinkingWater",
+    "MainSourceOtherPurposeWater",
+    "HouseholdFrequencyAtWaterSource",
+    "TimeToWaterSourceGetReturn",
+    "UsualHouseholdWaterFetcher",
+    "ContainerCarryWater",
+    "HeadHouseholdAge",
+    "HeadHouseholdSex",
+    "HeadHouseholdMaritalStatus",
+    "HeadHouseholdEducation",
+    "HeadHouseholdOccupation",
+]
+
+
+WATER_MAPPING = {
+    "2ORMORETIMEPERDAY": "Two or More Times Daily",
+    "ONCEDAILY": "Once Daily",
+    "EVERYOTHERDAY": "Every Other Day",
+    "EVERYTHIRDDAY": "Every Third Day",
+    "WEEKLY": "Weekly",
+}
+WATER_CAT = CategoricalDtype(
+    categories=[
+        "Two or More Times Daily",
+        "Once Daily",
+        "Every Other Day",
+        "Every Third Day",
+        "Weekly",
+    ],
+    ordered=True,
+)
+ED_MAPPING = {
+    "COMPLETEDJRHIGHSCHOOL": "Completed Jr. High",
+    "SOMEJRHIGHSCHOOL": "Completed Primary School",
+    "SOMEPRIMARYSCHOOL": "Some or No Primary School",
+    "NOFORMALEDUCATION": "Some or No Primary School",
+    "COMPLETEDPRIMARYSCHOOL": "Completed Primary School",
+    "SOMESRHIGHSCHOOL": "Completed Jr. High",
+    "COMPLETEDSRHIGHSCHOOL": "Completed High School",
+    "SOMEEDUCATIONBEYONDHIGHSCHOOL": "Some Education Beyond High School",
+}
+ED_CAT = CategoricalDtype(
+    categories=[
+        "Some or No Primary School",
+        "Completed Primary School",
+        "Completed Jr. High",
+        "Completed High School",
+        "Some Education Beyond High School",
+    ],
+    ordered=True,
+)
+OCC_MAPPING = {
+    "FARMER": "Farmer",
+    "TRADER": "Trader",
+    "OTHER": "Other/None",
+    "NONE": "Other/None",
+    "CIVILSERVANT": "Civil Servant/Teacher",
+    "TEACHER": "Civil Servant/Teacher",
+}
+
+
+def percent(df: pd.DataFrame, column: str, communities: list, **kwargs) -> pd.Series:
+    """value_counts of a column as percentages rounded to 2 decimals"""
+    return (
+        cube.value_counts(df, column, communities, normalize=True, **kwargs)
+        .mul(100)
+        .round(2)
+    )
+
+
+def demographics_summary(initial: pd.DataFrame, communities: list) -> dict:
+    """compute every number and table shown by demographics() for the
+    surveys of {communities}"""
+    total_pop = initial.TotalNoPeopleHousehold.sum()
+    childrencolumns = [
+        "NoHouseholdMale0_1Year",
+        "NoHouseholdFemale0_1Year",
+        "NoHouseholdMale1_5Year",
+        "NoHouseholdFemale1_5Year",
+    ]
+    children5 = initial.loc[:, childrencolumns].sum().sum()
+    childrencolumns += ["NoHouseholdMale5_12Year", "NoHouseholdFemale5_12Year"]
+    children12 = initial.loc[:, childrencolumns].sum().sum()
+    childrencolumns += ["NoHouseholdMale13_17Year", "NoHouseholdFemale13_17Year"]
+    children18 = initial.loc[:, childrencolumns].sum().sum()
+
+    water_collection_bins = [0]
+    for i in range(15):
+        water_collection_bins.append(water_collection_bins[-1] + 10)
+        if water_collection_bins[-1] >= initial.TimeToWaterSourceGetReturn.max():
+            water_collection_bins[-1] = initial.TimeToWaterSourceGetReturn.max()
+            break
+
+    return {
+        "entries": initial.id.size,
+        "unique_names": initial.HeadHouseholdName.nunique(),
+        "total_pop": total_pop,
+        "average_family_size": initial.TotalNoPeopleHousehold.mean(),
+        "pct_under_5": 100 * children5 / total_pop,
+        "pct_under_12": 100 * children12 / total_pop,
+        "pct_under_18": 100 * children18 / total_pop,
+        "drinking_water_source": percent(
+            initial, "MainSourceDrinkingWater", communities, dropna=False
+        ),
+        "other_water_source": percent(
+            initial, "MainSourceOtherPurposeWater", communities, dropna=False
+        ),
+        "water_collection_frequency": percent(
+            initial,
+            "HouseholdFrequencyAtWaterSource",
+            communities,
+            mapping=WATER_MAPPING,
+            dtype=WATER_CAT,
+            dropna=False,
+            sort=False,
+        ),
+        # the bins depend on the selection, so these are counted directly
+        "water_collection_time": pd.cut(
+            initial.TimeToWaterSourceGetReturn,
+            water_collection_bins,
+            right=True,
+            include_lowest=True,
+        )
+        .value_counts(normalize=True, sort=False)
+        .mul(100)
+        .round(2),
+        "who_collects_water": percent(
+            initial, "UsualHouseholdWaterFetcher", communities, dropna=False
+        ),
+        "water_container": percent(
+            initial, "ContainerCarryWater", communities, dropna=False
+        ),
+        "average_age": initial.HeadHouseholdAge.mean(),
+        "sex": percent(initial, "HeadHouseholdSex", communities, dropna=False),
+        "marital_status": percent(
+            initial, "HeadHouseholdMaritalStatus", communities, dropna=False
+        ),
+        "education": percent(
+            initial,
+            "HeadHouseholdEducation",
+            communities,
+            mapping=ED_MAPPING,
+            dtype=ED_CAT,
+            dropna=False,
+            sort=False,
+        ),
+        "occupation": percent(
+            initial,
+            "HeadHouseholdOccupation",
+            communities,
+            mapping=OCC_MAPPING,
+            dropna=False,
+        ),
+    }
+
+
+# CommunityWaterTest fields used by the community water page
+WATER_TEST_COLUMNS = ["Community", "ColilertTestResult", "PetrifilmTestResult"]
+
+
+def water_test_summary(communitywater: pd.DataFrame, communities: list) -> dict:
+    """percentage of the water tests of {communities} with each result"""
+    return {
+        "colilert": percent(
+            communitywater, "ColilertTestResult", communities, dropna=False
+        ),
+        "petrifilm": percent(
+            communitywater, "PetrifilmTestResult", communities, dropna=False
+        ),
+    }
+
+
+# fields needed to compare the answers of the same households
+PANEL_COLUMNS = comparison.COLUMNS + households.LINK_COLUMNS
+# fields used by the follow up page, only these are downloaded
+FOLLOWUP_COLUMNS = PANEL_COLUMNS + [households.PHONE_COLUMN]
+
+
+def followup_summary(
+    initial: pd.DataFrame, followup: pd.DataFrame, communities: list
+) -> dict:
+    """comparison.compare() of the initial and follow up surveys of
+    {communities}"""
+    return comparison.compare(initial, followup)
+
+
+# aggregates only depend on the selected rows and communities, so these are
+# computed ahead of time for every project, see projects.precompute()
+AGGREGATES = [
+    Aggregate(
+        "demographics.summary",
+        {"InitialSurvey": DEMOGRAPHICS_COLUMNS},
+        demographics_summary,
+    ),
+    Aggregate(
+        "community_water.summary",
+        {"CommunityWaterTest": WATER_TEST_COLUMNS},
+        water_test_summary,
+    ),
+    Aggregate(
+        "followup.summary",
+        {"InitialSurvey": FOLLOWUP_COLUMNS, "FollowUpSurvey": FOLLOWUP_COLUMNS},
+        followup_summary,
+    ),
+    Aggregate(
+        "followup.panel",
+        {"InitialSurvey": FOLLOWUP_COLUMNS, "FollowUpSurvey": FOLLOWUP_COLUMNS},
+        households.panel_summary,
+    ),
+]
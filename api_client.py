@@ -0,0 +1,250 @@
+import logging
+import os
+import random
+import threading
+import time
+import typing
+
+import jwt
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# (connect, read) timeouts in seconds for every call to the survey API
+TIMEOUT = (
+    float(os.environ.get("BWF_API_CONNECT_TIMEOUT", 5)),
+    float(os.environ.get("BWF_API_READ_TIMEOUT", 60)),
+)
+MAX_RETRIES = int(os.environ.get("BWF_API_RETRIES", 3))
+BACKOFF_BASE = 0.5  # seconds, doubled on every retry
+BACKOFF_MAX = 8.0
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# consecutive failed calls before the breaker opens, and how long it stays
+# open before a single trial call is let through
+BREAKER_THRESHOLD = int(os.environ.get("BWF_API_BREAKER_THRESHOLD", 5))
+BREAKER_COOLDOWN = float(os.environ.get("BWF_API_BREAKER_COOLDOWN", 60))
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """raised instead of calling the API while the circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """counts consecutive failures and refuses calls for {cooldown} seconds
+    once {threshold} of them have happened in a row"""
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: typing.Union[float, None] = None
+        self._lock = threading.Lock()
+
+    def is_open(self) -> bool:
+        """True while the breaker is open and its cooldown has not passed"""
+        with self._lock:
+            return (
+                self.opened_at is not None
+                and time.monotonic() - self.opened_at < self.cooldown
+            )
+
+    def allow_request(self) -> bool:
+        """False while calls should fail fast. After the cooldown one caller
+        is let through as a trial (half-open) and the breaker stays open for
+        everyone else until that call reports back"""
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.cooldown:
+                # restart the cooldown so only this caller makes the trial call
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+
+breaker = CircuitBreaker(BREAKER_THRESHOLD, BREAKER_COOLDOWN)
+
+_session: typing.Union[requests.Session, None] = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """returns the shared keep-alive session used for all API calls"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+
+def _backoff(attempt: int) -> float:
+    """exponential backoff with full jitter for retry number {attempt}"""
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+def request(method: str, url: str, **kwargs) -> requests.Response:
+    """send an HTTP request through the shared session with timeouts,
+    retries on transient errors and the circuit breaker.
+    Raises CircuitOpenError while the API is considered down and
+    requests.exceptions.RequestException if every attempt failed to connect.
+    Responses with other status codes are returned to the caller"""
+    if not breaker.allow_request():
+        raise CircuitOpenError(f"API circuit breaker open, not calling {url}")
+
+    kwargs.setdefault("timeout", TIMEOUT)
+    session = get_session()
+    for attempt in range(MAX_RETRIES + 1):
+        last_try = attempt == MAX_RETRIES
+        try:
+            resp = session.request(method, url, **kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            if last_try:
+                breaker.record_failure()
+                raise
+        else:
+            if resp.status_code not in RETRY_STATUS_CODES:
+                breaker.record_success()
+                return resp
+            if last_try:
+                breaker.record_failure()
+                return resp
+        time.sleep(_backoff(attempt))
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    return request("GET", url, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    return request("POST", url, **kwargs)
+
+
+# tokens are refreshed this many seconds before they expire
+TOKEN_REFRESH_MARGIN = float(os.environ.get("BWF_TOKEN_REFRESH_MARGIN", 300))
+# lifetime assumed for tokens without an exp claim
+TOKEN_DEFAULT_LIFETIME = 3600
+# seconds before a token is refreshed again at the soonest, even if the API
+# hands out tokens that are (about to be) expired, and before the first retry
+# of a failed background refresh. Retries wait twice as long each time
+TOKEN_MIN_REFRESH = 30
+
+
+class AuthError(Exception):
+    """raised when the API refuses to hand out a token"""
+
+
+def fetch_token() -> str:
+    """requests a new API token using the certificate from the environment
+    variables. raises requests.exceptions.RequestException if the API can't be
+    reached and AuthError if it rejects the request"""
+    server_name = os.environ["API_SERVER_URL"]
+    cert_key = os.environ["CERT_NAME"]
+    encoded = os.environ["ENCODED_CERT"]
+    resp = get(f"{server_name}/auth", headers={"mykey": cert_key, "test": encoded,})
+    if resp.status_code != 200:
+        try:
+            msg = resp.json()["msg"]
+        except (ValueError, KeyError, TypeError):
+            msg = resp.text
+        raise AuthError(f"status_code={resp.status_code}, {msg}")
+    return resp.json()["access_token"]
+
+
+def token_expiry(token: str) -> float:
+    """returns the expiry time (unix seconds) from the token's exp claim"""
+    try:
+        claims = jwt.decode(token, options={"verify_signature": False})
+        return float(claims["exp"])
+    except (jwt.exceptions.DecodeError, KeyError, TypeError, ValueError):
+        return time.time() + TOKEN_DEFAULT_LIFETIME
+
+
+class TokenManager:
+    """hands out the current API token to every session in the process.
+    The token is refreshed in the background {margin} seconds (or half its
+    lifetime, if that is shorter) before its exp claim runs out, but no
+    sooner than TOKEN_MIN_REFRESH seconds after it was fetched. Only one
+    thread ever fetches a new token at a time"""
+
+    def __init__(self, fetch: typing.Callable[[], str], margin: float):
+        self.fetch = fetch
+        self.margin = margin
+        self.token: typing.Union[str, None] = None
+        self.refresh_at = 0.0
+        self._lock = threading.Lock()
+        self._timer: typing.Union[threading.Timer, None] = None
+        # background refreshes that failed in a row
+        self._failures = 0
+
+    def get(self) -> str:
+        """returns the current token, fetching a new one if it is due for a
+        refresh"""
+        with self._lock:
+            if self.token is None or time.time() >= self.refresh_at:
+                self._refresh()
+            return self.token
+
+    def invalidate(self, token: str) -> str:
+        """call when the API rejected {token}. Returns a fresh token, which is
+        only fetched once however many sessions were using the rejected one"""
+        with self._lock:
+            if self.token == token:
+                self._refresh()
+            return self.token
+
+    def _refresh(self) -> None:
+        """fetch a new token and schedule its background refresh. Must be
+        called with the lock held"""
+        token = self.fetch()
+        now = time.time()
+        lifetime = max(0.0, token_expiry(token) - now)
+        # short lived tokens are refreshed halfway through instead
+        delay = max(lifetime - min(self.margin, lifetime / 2), TOKEN_MIN_REFRESH)
+        self.token = token
+        self.refresh_at = now + delay
+        self._failures = 0
+        self._schedule(delay)
+
+    def _schedule(self, delay: float) -> None:
+        """refresh the token in the background in {delay} seconds. Must be
+        called with the lock held"""
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(delay, self._refresh_in_background)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _refresh_in_background(self) -> None:
+        with self._lock:
+            try:
+                self._refresh()
+            except Exception:
+                # retried with a backoff, get() also retries in the foreground
+                # once the token is due
+                logger.warning("background API token refresh failed", exc_info=True)
+                self._schedule(
+                    min(
+                        TOKEN_MIN_REFRESH * 2 ** self._failures,
+                        max(self.margin, TOKEN_MIN_REFRESH),
+                    )
+                )
+                self._failures += 1
+
+
+tokens = TokenManager(fetch_token, TOKEN_REFRESH_MARGIN)
@@ -0,0 +1,141 @@
+import os
+import typing
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+import memo
+
+# how charts are drawn
+#   matplotlib: rendered to a PNG on the server
+#   native: only the aggregated data is sent and the browser draws it with
+#           Vega-Lite, so the server does no drawing at all
+BACKEND = os.environ.get("BWF_CHART_BACKEND", "matplotlib")
+BACKENDS = ("matplotlib", "native")
+if BACKEND not in BACKENDS:
+    raise ValueError(f"BWF_CHART_BACKEND must be one of {BACKENDS}, not {BACKEND!r}")
+
+
+def show(
+    section: str,
+    figure: typing.Callable[[], plt.Figure],
+    spec: typing.Callable[[], dict],
+    scope: typing.Union[memo.Scope, None] = None,
+) -> None:
+    """draw a chart with the configured backend, from the matplotlib figure
+    made by figure() or the Vega-Lite spec made by spec(). Either is memoized
+    under {section} in {scope} if one is given"""
+    if BACKEND == "native":
+        st.vega_lite_chart(
+            spec=spec() if scope is None else scope.value(section + ":spec", spec)
+        )
+    elif scope is None:
+        st.pyplot(figure())
+    else:
+        st.image(scope.figure(section, figure))
+
+
+def _records(data: pd.Series, label: str, value: str) -> typing.List[dict]:
+    """returns the rows of {data} as [{label: index, value: value}], with the
+    index as strings so any index (intervals, categories, dates) can be sent"""
+    return [
+        {label: str(index), value: None if pd.isna(v) else float(v)}
+        for index, v in data.items()
+    ]
+
+
+def bar_spec(data: pd.Series, title: str, ylabel: str, pct: bool = True) -> dict:
+    """bar chart of {data} in index order with value labels on the bars, like
+    Home.add_labels. For absolute counts, set pct=False"""
+    label_format = ".1f" if pct else ".0f"
+    return {
+        "title": title,
+        "data": {"values": _records(data, "label", "value")},
+        "encoding": {
+            "x": {"field": "label", "type": "nominal", "sort": None, "title": None},
+            "y": {"field": "value", "type": "quantitative", "title": ylabel},
+        },
+        "layer": [
+            {"mark": {"type": "bar", "tooltip": True}},
+            {
+                "mark": {"type": "text", "baseline": "bottom", "dy": -2},
+                "encoding": {
+                    "text": {
+                        "field": "value",
+                        "type": "quantitative",
+                        "format": label_format,
+                    }
+                },
+            },
+        ],
+    }
+
+
+def pie_spec(data: pd.Series, title: str = None) -> dict:
+    """pie chart of the shares in {data}"""
+    spec = {
+        "data": {"values": _records(data, "label", "value")},
+        "mark": {"type": "arc", "tooltip": True},
+        "encoding": {
+            "theta": {"field": "value", "type": "quantitative", "stack": True},
+            "color": {"field": "label", "type": "nominal", "sort": None, "title": None},
+        },
+    }
+    if title:
+        spec["title"] = title
+    return spec
+
+
+def area_spec(data: pd.DataFrame, title: str, ylabel: str = None) -> dict:
+    """overlapping area chart of each column of {data} against its datetime
+    index"""
+    values = [
+        {"date": index.isoformat(), "series": column, "value": float(v)}
+        for column in data.columns
+        for index, v in data[column].dropna().items()
+    ]
+    return {
+        "title": title,
+        "data": {"values": values},
+        "mark": {"type": "area", "opacity": 0.6, "tooltip": True},
+        "encoding": {
+            "x": {"field": "date", "type": "temporal", "title": None},
+            "y": {
+                "field": "value",
+                "type": "quantitative",
+                "stack": None,
+                "title": ylabel,
+            },
+            "color": {
+                "field": "series",
+                "type": "nominal",
+                "sort": list(data.columns),
+                "title": None,
+            },
+        },
+    }
+
+
+def histogram_spec(
+    values: pd.Series, title: typing.Union[str, typing.List[str]], bins: int = 30
+) -> dict:
+    """histogram of {values}, a list of strings is a title over several
+    lines. The bins are counted here so only {bins} rows are sent instead of
+    every value"""
+    counts, edges = np.histogram(values.dropna(), bins=bins)
+    rows = [
+        {"start": float(start), "end": float(end), "count": int(count)}
+        for start, end, count in zip(edges[:-1], edges[1:], counts)
+    ]
+    return {
+        "title": title,
+        "data": {"values": rows},
+        "mark": {"type": "bar", "tooltip": True},
+        "encoding": {
+            "x": {"field": "start", "type": "quantitative", "title": None},
+            "x2": {"field": "end"},
+            "y": {"field": "count", "type": "quantitative", "title": "Frequency"},
+        },
+    }
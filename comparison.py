@@ -0,0 +1,158 @@
+import typing
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+import schema
+
+# value of the wave column for the rows of each survey, in display order
+WAVES = ["Initial Survey", "Follow Up Survey"]
+# multiple choice and count answers are compared by how many households gave
+# each answer, counts and other numbers by their total
+DISTRIBUTION_KINDS = ("category", "count")
+TOTAL_KINDS = ("count", "number")
+
+
+@dataclass
+class Question:
+    """a question asked in both surveys"""
+
+    key: str  # short name from the mapping files
+    column: str  # API column the answers are stored in
+    text: str  # as asked in the follow up survey
+    kind: str  # see schema.QUESTION_KINDS
+
+
+def comparable_questions() -> typing.List[Question]:
+    """returns the questions that appear in both question mapping files and
+    whose answers the dashboard knows how to compare, in the order of the
+    follow up survey"""
+    initial_keys = set(schema.INITIAL_QUESTIONS.key)
+    questions = []
+    for text, key in zip(
+        schema.FOLLOWUP_QUESTIONS.question, schema.FOLLOWUP_QUESTIONS.key
+    ):
+        kind = schema.QUESTION_KINDS.get(key)
+        if (
+            key in initial_keys
+            and key in schema.QUESTION_COLUMNS
+            and kind in DISTRIBUTION_KINDS + TOTAL_KINDS
+            # the communities are what is being selected, not compared
+            and key != "community"
+        ):
+            questions.append(Question(key, schema.QUESTION_COLUMNS[key], text, kind))
+    return questions
+
+
+QUESTIONS = comparable_questions()
+# fields needed to compare every question
+COLUMNS = [question.column for question in QUESTIONS]
+
+
+def stack(
+    initial: pd.DataFrame, followup: pd.DataFrame, columns: typing.List[str]
+) -> pd.DataFrame:
+    """returns {columns} of both surveys in one frame, with a wave column
+    saying which survey each row came from. Columns missing from a survey
+    are filled with NaN, and multiple choice answers stay categorical"""
+    frames = [initial.reindex(columns=columns), followup.reindex(columns=columns)]
+    stacked = {
+        "wave": pd.Categorical.from_codes(
+            np.repeat(np.arange(len(WAVES)), [len(df) for df in frames]), WAVES
+        )
+    }
+    for column in columns:
+        parts = [df[column] for df in frames]
+        if all(isinstance(part.dtype, pd.CategoricalDtype) for part in parts):
+            stacked[column] = union_categoricals(
+                [part.array for part in parts], ignore_order=True
+            )
+        else:
+            stacked[column] = pd.concat(parts, ignore_index=True)
+    return pd.DataFrame(stacked)
+
+
+def _answer_codes(
+    s: pd.Series, count_missing: bool
+) -> typing.Tuple[np.ndarray, pd.Index]:
+    """returns an integer code for the answer in each row of s and the answers
+    the codes stand for. Missing answers get code -1, unless {count_missing}"""
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        codes, answers = s.cat.codes.to_numpy().astype(np.intp), s.cat.categories
+    else:
+        codes, answers = pd.factorize(s)
+    if count_missing and (codes == -1).any():
+        codes = np.where(codes == -1, len(answers), codes)
+        answers = answers.append(pd.Index([np.nan]))
+    return codes, answers
+
+
+def compare(
+    initial: pd.DataFrame,
+    followup: pd.DataFrame,
+    questions: typing.List[Question] = QUESTIONS,
+) -> dict:
+    """returns the percentage of households giving each answer to {questions}
+    as {"percent": {wave: {column: Series}}} and the total of the numeric
+    answers as {"total": {wave: {column: total}}}. The answers of every
+    question in both surveys are counted in a single pass over integer
+    answer codes, whatever the number of questions. Missing answers are only
+    counted for multiple choice questions, and answers are sorted by how
+    often they were given, like value_counts()"""
+    distribution = [q for q in questions if q.kind in DISTRIBUTION_KINDS]
+    total_columns = [q.column for q in questions if q.kind in TOTAL_KINDS]
+    columns = list(dict.fromkeys([q.column for q in distribution] + total_columns))
+    stacked = stack(initial, followup, columns)
+    waves = stacked.wave.cat.codes.to_numpy().astype(np.intp)
+
+    # number every (question, answer) pair, so that (wave, question, answer)
+    # is a single integer and all counts come from one bincount
+    codes, answers, offsets = [], [], [0]
+    for question in distribution:
+        c, a = _answer_codes(stacked[question.column], question.kind == "category")
+        codes.append(c)
+        answers.append(a)
+        offsets.append(offsets[-1] + len(a))
+    size = offsets[-1]
+    # missing answers that aren't counted go to one extra bin at the end
+    uncounted = len(WAVES) * size
+    base = waves * size
+    keys = np.empty(len(stacked) * len(codes), dtype=np.intp)
+    for i, (c, offset) in enumerate(zip(codes, offsets)):
+        k = keys[i * len(stacked) : (i + 1) * len(stacked)]
+        np.add(base, c, out=k)
+        k += offset
+        np.putmask(k, c < 0, uncounted)
+    counts = np.bincount(keys, minlength=uncounted + 1)[:uncounted]
+    counts = counts.reshape(len(WAVES), size)
+
+    result = {
+        "percent": {wave: {} for wave in WAVES},
+        "total": {wave: {} for wave in WAVES},
+    }
+    for w, wave in enumerate(WAVES):
+        for question, a, start, stop in zip(
+            distribution, answers, offsets[:-1], offsets[1:]
+        ):
+            s = pd.Series(counts[w, start:stop], index=a)
+            if question.kind != "category":
+                # answers only given in the other survey
+                s = s[s > 0]
+            if s.sum() == 0:
+                continue
+            result["percent"][wave][question.column] = (
+                s.div(s.sum())
+                .mul(100)
+                .round(2)
+                .sort_values(ascending=False, kind="stable")
+                .rename_axis(question.column)
+                .rename("proportion")
+            )
+    for wave, df in zip(WAVES, (initial, followup)):
+        result["total"][wave] = {
+            column: df[column].sum() if column in df.columns else 0
+            for column in total_columns
+        }
+    return result
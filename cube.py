@@ -0,0 +1,116 @@
+import threading
+import typing
+
+import pandas as pd
+
+import table_cache
+
+COMMUNITY_COLUMN = "Community"
+
+
+class CountCube:
+    """number of times each answer to a question was given in each community,
+    for one version of a synced table. Since counts add up across communities
+    any community selection can be answered from them without going back to
+    the survey rows. The counts for a question are computed the first time
+    they are asked for"""
+
+    def __init__(self, frame: pd.DataFrame):
+        self.frame = frame
+        self._counts: typing.Dict[str, pd.Series] = {}
+        self._lock = threading.Lock()
+
+    def counts(self, column: str) -> pd.Series:
+        """returns the number of rows for each (Community, answer) of
+        {column}, missing answers included"""
+        with self._lock:
+            if column not in self._counts:
+                self._counts[column] = self.frame.groupby(
+                    [COMMUNITY_COLUMN, column], dropna=False, observed=True
+                ).size()
+            return self._counts[column]
+
+    def value_counts(
+        self,
+        column: str,
+        communities: typing.List[str],
+        mapping: typing.Union[dict, None] = None,
+        dtype: typing.Union[pd.CategoricalDtype, None] = None,
+        normalize: bool = False,
+        sort: bool = True,
+        dropna: bool = True,
+    ) -> pd.Series:
+        """returns the same as value_counts() of the {column} answers given in
+        {communities}, mapped through {mapping} and cast to {dtype} first if
+        they are given. Answers with equal counts (or all of them, for
+        sort=False on a non categorical column) are in answer order rather
+        than the order they were first given in"""
+        counts = self.counts(column)
+        counts = counts[counts.index.get_level_values(0).isin(communities)]
+        answers = counts.index.get_level_values(1)
+        if mapping is not None:
+            answers = answers.map(mapping)
+        if dtype is not None:
+            answers = answers.astype(dtype)
+        elif mapping is None:
+            # keep answers nobody in the selection gave, like value_counts
+            answers = answers.astype(self.frame[column].dtype)
+
+        # observed=False keeps every category of a categorical, with 0 counts
+        result = counts.groupby(answers, dropna=False, observed=False).sum()
+        if dropna:
+            result = result[result.index.notna()]
+        if sort:
+            result = result.sort_values(ascending=False, kind="stable")
+        if normalize:
+            result = result / result.sum()
+        result.index.name = column
+        return result.rename("proportion" if normalize else "count")
+
+
+# cube of every table version that has been asked for. Cubes of superseded
+# versions are dropped as soon as the table is refreshed
+_cubes: typing.Dict[str, CountCube] = {}
+_lock = threading.Lock()
+table_cache.on_change(lambda old, new: _cubes.pop(old, None))
+
+
+def for_frame(df: pd.DataFrame) -> typing.Union[CountCube, None]:
+    """returns the count cube of the whole synced table {df} was taken from,
+    or None if it didn't come from one"""
+    version = table_cache.data_version(df)
+    if version is None:
+        return None
+    with _lock:
+        cube = _cubes.get(version)
+        if cube is None:
+            frame = table_cache.frame_for_version(version)
+            if frame is None or COMMUNITY_COLUMN not in frame.columns:
+                return None
+            cube = _cubes[version] = CountCube(frame)
+        return cube
+
+
+def value_counts(
+    df: pd.DataFrame,
+    column: str,
+    communities: typing.List[str],
+    mapping: typing.Union[dict, None] = None,
+    dtype: typing.Union[pd.CategoricalDtype, None] = None,
+    **kwargs,
+) -> pd.Series:
+    """returns the value_counts() of df[column], where df holds the rows of
+    {communities}, mapped through {mapping} and cast to {dtype} first if they
+    are given. Answered from the count cube of the table df came from when
+    df holds just its rows of {communities}, otherwise df is counted
+    directly"""
+    holds = table_cache.holds(df, COMMUNITY_COLUMN, communities)
+    cube = for_frame(df) if holds else None
+    if cube is not None:
+        return cube.value_counts(column, communities, mapping, dtype, **kwargs)
+    s = df[column]
+    if mapping is not None:
+        s = s.map(mapping)
+    if dtype is not None:
+        s = s.astype(dtype)
+    return s.value_counts(**kwargs)
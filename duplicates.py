@@ -0,0 +1,194 @@
+import threading
+import typing
+import zlib
+
+import numpy as np
+import pandas as pd
+
+import households
+import table_cache
+
+# names whose character trigrams overlap at least this much (Jaccard
+# similarity) are flagged as the same household
+THRESHOLD = 0.6
+# MinHash signature of NUM_PERM values, split in BANDS bands. Two names share
+# a band with high probability once their similarity is above about
+# (1 / BANDS) ** (BANDS / NUM_PERM), a bit under THRESHOLD so few are missed
+NUM_PERM = 30
+BANDS = 10
+_rng = np.random.default_rng(0)
+_A = _rng.integers(1, 1 << 63, NUM_PERM, dtype=np.uint64) * 2 + 1  # odd
+_B = _rng.integers(0, 1 << 63, NUM_PERM, dtype=np.uint64)
+
+
+def trigrams(name: str) -> typing.Set[str]:
+    """returns the character trigrams of a normalized {name}, padded so the
+    start and end of each word count too"""
+    padded = f" {name} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(a: typing.Set[str], b: typing.Set[str]) -> float:
+    """returns the Jaccard similarity of two trigram sets"""
+    return len(a & b) / len(a | b)
+
+
+def _signatures(grams: typing.List[typing.Set[str]]) -> np.ndarray:
+    """returns the MinHash signature of each trigram set, as a
+    (len(grams), NUM_PERM) array"""
+    if not grams:
+        # reduceat needs at least one start
+        return np.empty((0, NUM_PERM), dtype=np.uint64)
+    lengths = np.array([len(g) for g in grams])
+    hashes = np.fromiter(
+        (zlib.crc32(gram.encode()) for g in grams for gram in g),
+        dtype=np.uint64,
+        count=int(lengths.sum()),
+    )
+    # a * x + b wraps around modulo 2**64, a fine hash family for MinHash
+    permuted = _A[:, None] * hashes[None, :] + _B[:, None]
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]]).astype(np.intp)
+    return np.minimum.reduceat(permuted, starts, axis=1).T
+
+
+def _candidates(names: pd.DataFrame) -> pd.DataFrame:
+    """returns the pairs (left, right) of rows of {names}, which has a
+    community and a name column with distinct rows, whose MinHash signatures
+    agree on a whole band in the same community"""
+    grams = [trigrams(name) for name in names.name]
+    signatures = _signatures(grams)
+    rows = signatures.reshape(len(names), BANDS, NUM_PERM // BANDS)
+    buckets = pd.DataFrame(
+        {
+            "community": np.repeat(names.community.to_numpy(), BANDS),
+            "band": np.tile(np.arange(BANDS), len(names)),
+            "bucket": pd.util.hash_array(
+                np.ascontiguousarray(rows)
+                .view(np.dtype((np.void, rows.dtype.itemsize * rows.shape[2])))
+                .ravel()
+            ),
+            "row": np.repeat(np.arange(len(names)), BANDS),
+        }
+    )
+    # names alone in their bucket can't pair with anything
+    buckets = buckets[buckets.duplicated(["community", "band", "bucket"], keep=False)]
+    pairs = buckets.merge(buckets, on=["community", "band", "bucket"])
+    pairs = pairs[pairs.row_x < pairs.row_y]
+    pairs = pairs[["row_x", "row_y"]].drop_duplicates()
+    pairs["score"] = [
+        similarity(grams[x], grams[y]) for x, y in zip(pairs.row_x, pairs.row_y)
+    ]
+    return pairs[pairs.score >= THRESHOLD].rename(
+        columns={"row_x": "left", "row_y": "right"}
+    )
+
+
+def _components(n: int, left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    """returns the connected component of each of {n} nodes joined by the
+    edges (left, right), as the smallest node in it"""
+    parent = np.arange(n)
+
+    def root(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for a, b in zip(left.tolist(), right.tolist()):
+        a, b = root(a), root(b)
+        if a != b:
+            parent[max(a, b)] = min(a, b)
+    return np.array([root(i) for i in range(n)])
+
+
+def _chain(codes: np.ndarray) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """returns edges (left, right) from the first row with each code >= 0 to
+    the other rows with that code"""
+    rows = np.flatnonzero(codes >= 0)
+    first = pd.Series(rows).groupby(codes[rows]).transform("first").to_numpy()
+    same = first != rows
+    return first[same], rows[same]
+
+
+def find_duplicates(df: pd.DataFrame) -> pd.DataFrame:
+    """returns the records of {df} that look like the same household, with
+    the cluster they belong to and its score: the lowest similarity of the
+    links holding the cluster together, where the same normalized name or
+    phone number counts as 1. Records are only compared within their
+    community, and names are only compared when their MinHash signatures
+    put them in the same bucket, so this takes about linear time"""
+    keys = households._link_keys(df)
+    # each distinct (community, name) is compared once, in order of first use
+    name_codes = keys.groupby(["community", "name"], sort=False).ngroup().to_numpy()
+    names = (
+        keys.dropna(subset=["community", "name"])
+        .drop_duplicates(["community", "name"])[["community", "name"]]
+        .reset_index(drop=True)
+    )
+    phone_codes = keys.groupby(["community", "phone"]).ngroup().to_numpy()
+
+    edges = []
+    # records with the same normalized name or phone number in a community
+    for codes in (name_codes, phone_codes):
+        left, right = _chain(codes)
+        edges.append(pd.DataFrame({"left": left, "right": right, "score": 1.0}))
+    # records with similar names, through the first record with each name
+    similar = _candidates(names)
+    rows = np.flatnonzero(name_codes >= 0)
+    first = pd.Series(rows).groupby(name_codes[rows]).first()
+    edges.append(
+        pd.DataFrame(
+            {
+                "left": first.reindex(similar.left).to_numpy(),
+                "right": first.reindex(similar.right).to_numpy(),
+                "score": similar.score.to_numpy(),
+            }
+        )
+    )
+    edges = pd.concat(edges, ignore_index=True)
+
+    cluster = _components(len(keys), edges.left.to_numpy(), edges.right.to_numpy())
+    edges["cluster"] = cluster[edges.left.to_numpy()]
+    score = edges.groupby("cluster").score.min()
+    clustered = np.isin(cluster, score.index)
+    result = df.reindex(
+        columns=["id", households.COMMUNITY_COLUMN, households.SURVEY_ID_COLUMN]
+        + [households.NAME_COLUMN, households.PHONE_HASH_COLUMN]
+    )[clustered]
+    result.insert(0, "cluster", cluster[clustered])
+    result.insert(1, "score", score.reindex(cluster[clustered]).round(2).to_numpy())
+    result = result.sort_values(
+        ["score", "cluster"], ascending=[False, True], kind="stable"
+    ).reset_index(drop=True)
+    if result.empty:
+        # every column is empty then, and duplicate_households() reads them
+        return result
+    return result.dropna(axis=1, how="all")
+
+
+# duplicates of every table version that has been checked. Results for
+# superseded versions are dropped as soon as the table is refreshed
+_results: typing.Dict[str, pd.DataFrame] = {}
+_lock = threading.Lock()
+table_cache.on_change(lambda old, new: _results.pop(old, None))
+
+
+def duplicate_households(df: pd.DataFrame, communities: list) -> pd.DataFrame:
+    """returns find_duplicates() of {df}, the rows of {communities}. Since
+    records are only compared within a community, this is read from the
+    duplicates of the whole synced table df came from, found once per
+    version of it, when df is that table or holds just its rows of
+    communities"""
+    version = table_cache.data_version(df)
+    frame = None if version is None else table_cache.frame_for_version(version)
+    if frame is None or not (
+        df is frame or table_cache.holds(df, households.COMMUNITY_COLUMN, communities)
+    ):
+        return find_duplicates(df)
+    with _lock:
+        result = _results.get(version)
+        if result is None:
+            result = _results[version] = find_duplicates(frame)
+    return result[result[households.COMMUNITY_COLUMN].isin(communities)].reset_index(
+        drop=True
+    )
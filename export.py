@@ -0,0 +1,141 @@
+import io
+import os
+import tempfile
+import threading
+import typing
+
+import openpyxl
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import schema
+
+# rows converted and written at a time, so an export only ever holds one
+# chunk of the table besides the cached frame itself
+CHUNK_ROWS = int(os.environ.get("BWF_EXPORT_CHUNK_ROWS", 50_000))
+# exports written at the same time, across all sessions. Others wait
+MAX_CONCURRENT = int(os.environ.get("BWF_EXPORT_CONCURRENCY", 2))
+# rows in an Excel sheet, header included
+XLSX_MAX_ROWS = 1_048_576
+
+# format name -> (file extension, mime type)
+FORMATS = {
+    "CSV": ("csv", "text/csv"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+    "Excel": (
+        "xlsx",
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    ),
+}
+
+_slots = threading.BoundedSemaphore(MAX_CONCURRENT)
+
+
+def export_columns(df: pd.DataFrame) -> typing.List[str]:
+    """returns the columns of {df} that may be exported, without
+    schema.PRIVATE_COLUMNS"""
+    return [column for column in df.columns if column not in schema.PRIVATE_COLUMNS]
+
+
+def chunks(df: pd.DataFrame) -> typing.Iterator[pd.DataFrame]:
+    """yields the exportable columns of {df}, CHUNK_ROWS rows at a time"""
+    columns = export_columns(df)
+    for start in range(0, max(len(df), 1), CHUNK_ROWS):
+        yield df.iloc[start : start + CHUNK_ROWS][columns]
+
+
+def write_csv(df: pd.DataFrame, f: typing.BinaryIO) -> None:
+    for i, chunk in enumerate(chunks(df)):
+        f.write(chunk.to_csv(index=False, header=i == 0).encode())
+
+
+def _arrow_schema(df: pd.DataFrame) -> typing.Tuple[pa.Schema, typing.Set[str]]:
+    """returns the Arrow schema of {df} and the columns of it that are written
+    as text. Types come from the dtypes of the whole frame, and for object
+    columns from all of their values, rather than from the first chunk.
+    Object columns without values, or with values of several types, are
+    written as text"""
+    schema_ = pa.Schema.from_pandas(df.iloc[:0], preserve_index=False)
+    text = set()
+    for column in df.columns:
+        if df[column].dtype != object:
+            continue
+        values = df[column].dropna()
+        type_ = pa.null()
+        if values.map(type).nunique() == 1:
+            try:
+                type_ = pa.infer_type(values.to_numpy())
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                pass
+        if pa.types.is_null(type_):
+            text.add(column)
+            type_ = pa.string()
+        i = schema_.get_field_index(column)
+        schema_ = schema_.set(i, schema_.field(i).with_type(type_))
+    return schema_, text
+
+
+def write_parquet(df: pd.DataFrame, f: typing.BinaryIO) -> None:
+    schema_, text = _arrow_schema(df[export_columns(df)])
+    with pq.ParquetWriter(f, schema_) as writer:
+        for chunk in chunks(df):
+            chunk = chunk.assign(
+                **{
+                    column: chunk[column]
+                    .where(chunk[column].notna(), None)
+                    .map(lambda v: None if v is None else str(v))
+                    for column in text
+                }
+            )
+            writer.write_table(
+                pa.Table.from_pandas(chunk, schema=schema_, preserve_index=False)
+            )
+
+
+def _excel_values(chunk: pd.DataFrame) -> pd.DataFrame:
+    """returns {chunk} as values openpyxl can write: no time zones, no NaN
+    and multi-select answers as text"""
+    converted = {}
+    for column in chunk.columns:
+        s = chunk[column]
+        if isinstance(s.dtype, pd.DatetimeTZDtype):
+            s = s.dt.tz_convert(None)
+        s = s.astype(object)
+        converted[column] = s.where(s.notna(), None).map(
+            lambda v: str(v) if isinstance(v, (list, dict)) else v
+        )
+    return pd.DataFrame(converted, index=chunk.index)
+
+
+def write_xlsx(df: pd.DataFrame, f: typing.BinaryIO) -> None:
+    if len(df) + 1 > XLSX_MAX_ROWS:
+        raise ValueError(f"{len(df)} rows don't fit in an Excel sheet")
+    # write only workbooks stream rows to disk instead of keeping every cell
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    for i, chunk in enumerate(chunks(df)):
+        if i == 0:
+            sheet.append(list(chunk.columns))
+        for row in _excel_values(chunk).itertuples(index=False, name=None):
+            sheet.append(row)
+    workbook.save(f)
+
+
+WRITERS = {"CSV": write_csv, "Parquet": write_parquet, "Excel": write_xlsx}
+
+
+def export(df: pd.DataFrame, fmt: str) -> io.RawIOBase:
+    """returns a temporary file holding the exportable columns of {df} in
+    {fmt}, one of FORMATS, positioned at the start. The file is written in
+    chunks, and at most MAX_CONCURRENT exports are written at once. It is
+    returned unbuffered, one of the file types st.download_button() reads"""
+    raw = tempfile.TemporaryFile(buffering=0)
+    # written through a buffer, which is then taken off without closing raw
+    f = io.BufferedRandom(raw)
+    with _slots:
+        WRITERS[fmt](df, f)
+    f.flush()
+    f.detach()
+    raw.seek(0)
+    return raw
@@ -0,0 +1,222 @@
+import re
+import threading
+import typing
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+import comparison
+import schema
+import table_cache
+
+COMMUNITY_COLUMN = "Community"
+SURVEY_ID_COLUMN = "SurveyId"
+NAME_COLUMN = "HeadHouseholdName"
+# fields used to recognise a household, besides its community
+LINK_COLUMNS = [SURVEY_ID_COLUMN, NAME_COLUMN]
+# only asked in some surveys of either table, and replaced by its hash as it
+# is downloaded, see schema.PII_COLUMNS
+PHONE_COLUMN = "HeadHouseholdPhoneNumber"
+PHONE_HASH_COLUMN = PHONE_COLUMN + schema.HASH_SUFFIX
+
+# ways a follow up record is matched to a household, tried in this order so
+# each record gets the most reliable match available. Apart from the survey
+# id every key includes the community, so only households of the same
+# community are ever compared
+MATCH_KEYS = {
+    "survey id": ["survey_id"],
+    "name and phone": ["community", "name", "phone"],
+    "name": ["community", "name"],
+    "phone": ["community", "phone"],
+}
+UNLINKED = "unlinked"
+
+
+def normalize_name(name: str) -> typing.Union[str, None]:
+    """returns {name} in lower case without accents or punctuation and with
+    its words sorted, so spacing slips and "Last First" still match, or None
+    if there is no name"""
+    if pd.isna(name):
+        return None
+    name = unicodedata.normalize("NFKD", str(name))
+    name = "".join(c for c in name if not unicodedata.combining(c))
+    words = re.sub(r"[^a-z0-9]+", " ", name.lower()).split()
+    return " ".join(sorted(words)) or None
+
+
+def _normalize_names(s: pd.Series) -> pd.Series:
+    """normalize_name() of every row of s, normalizing each distinct name
+    once"""
+    lookup = {name: normalize_name(name) for name in s.dropna().unique()}
+    return s.map(lookup).astype(object)
+
+
+def _link_keys(df: pd.DataFrame) -> pd.DataFrame:
+    """returns the record id and the fields of MATCH_KEYS for every row of
+    {df}, missing where df doesn't have the field"""
+    fields = df.reindex(
+        columns=["id", COMMUNITY_COLUMN] + LINK_COLUMNS + [PHONE_HASH_COLUMN]
+    )
+    return pd.DataFrame(
+        {
+            "id": fields["id"].to_numpy(),
+            "community": fields[COMMUNITY_COLUMN].astype(object).to_numpy(),
+            "survey_id": fields[SURVEY_ID_COLUMN].astype(object).to_numpy(),
+            "name": _normalize_names(fields[NAME_COLUMN]).to_numpy(),
+            "phone": fields[PHONE_HASH_COLUMN].astype(object).to_numpy(),
+        }
+    )
+
+
+class HouseholdIndex:
+    """the households of one version of the initial survey table, with a
+    lookup from each of MATCH_KEYS to the initial record it identifies. A
+    household's id is the SurveyId of its initial record (or the record id
+    if it has none), which the follow up survey app stores too, so the ids
+    stay the same across refreshes and restarts. Linking joins on these
+    lookups, so it takes time in proportion to the number of records rather
+    than comparing every pair of households"""
+
+    def __init__(self, initial: pd.DataFrame):
+        keys = _link_keys(initial)
+        household_id = keys.survey_id.where(keys.survey_id.notna(), keys.id.astype(str))
+        # initial record id -> household id
+        self.households = pd.Series(household_id.to_numpy(), index=keys.id)
+        self._lookups = {}
+        for match, columns in MATCH_KEYS.items():
+            lookup = keys[columns + ["id"]].dropna()
+            # a key shared by several households identifies none of them
+            lookup = lookup.drop_duplicates(columns, keep=False)
+            self._lookups[match] = lookup.rename(columns={"id": "initial_id"})
+
+    def link(self, followup: pd.DataFrame) -> pd.DataFrame:
+        """returns the initial record, household id and kind of match of every
+        record of {followup}, indexed by follow up record id. Records that
+        can't be matched have match UNLINKED and no household"""
+        keys = _link_keys(followup)
+        keys["row"] = np.arange(len(keys))
+        linked = np.zeros(len(keys), dtype=bool)
+        links = []
+        for match, columns in MATCH_KEYS.items():
+            candidates = keys[~linked].dropna(subset=columns)
+            if candidates.empty:
+                continue
+            found = candidates[["id", "row"] + columns].merge(
+                self._lookups[match], on=columns, how="inner"
+            )
+            links.append(found[["id", "initial_id"]].assign(match=match))
+            linked[found.row.to_numpy()] = True
+        unlinked = keys[~linked]
+        links.append(
+            pd.DataFrame({"id": unlinked.id, "initial_id": None, "match": UNLINKED})
+        )
+        result = pd.concat(
+            [df for df in links if not df.empty] or links[-1:], ignore_index=True
+        ).set_index("id")
+        result["household_id"] = result.initial_id.map(self.households)
+        return result
+
+
+# index of every initial survey version that has been linked against.
+# Indexes of superseded versions are dropped as soon as the table is refreshed
+_indexes: typing.Dict[str, HouseholdIndex] = {}
+_lock = threading.Lock()
+table_cache.on_change(lambda old, new: _indexes.pop(old, None))
+
+
+def for_frame(initial: pd.DataFrame) -> HouseholdIndex:
+    """returns the household index of the whole synced table {initial} was
+    taken from, or of {initial} itself if it didn't come from one"""
+    version = table_cache.data_version(initial)
+    if version is None:
+        return HouseholdIndex(initial)
+    with _lock:
+        index = _indexes.get(version)
+        if index is None:
+            frame = table_cache.frame_for_version(version)
+            index = _indexes[version] = HouseholdIndex(
+                initial if frame is None else frame
+            )
+        return index
+
+
+def pairs(
+    initial: pd.DataFrame,
+    followup: pd.DataFrame,
+    questions: typing.List[comparison.Question] = comparison.QUESTIONS,
+) -> pd.DataFrame:
+    """returns one row for every record of {followup} linked to a household
+    in {initial}, with its household_id, match, wave (1 for the first follow
+    up of the household, 2 for the next...) and the answers to {questions} of
+    both surveys, as (column, wave) columns with the waves of
+    comparison.WAVES"""
+    links = for_frame(initial).link(followup)
+    links = links[pd.Index(initial["id"]).get_indexer(links.initial_id) >= 0]
+    columns = [q.column for q in questions]
+    answers = [
+        df.set_index("id").reindex(columns=columns).astype(object)
+        for df in (initial, followup)
+    ]
+    result = pd.DataFrame(
+        {
+            "household_id": links.household_id,
+            "match": links.match,
+            "date": followup.set_index("id").date.reindex(links.index),
+        }
+    )
+    result["wave"] = (
+        result.sort_values("date", kind="stable").groupby("household_id").cumcount() + 1
+    )
+    result.columns = pd.MultiIndex.from_product([result.columns, [""]])
+    paired = pd.concat(
+        {
+            comparison.WAVES[0]: answers[0]
+            .reindex(links.initial_id)
+            .set_axis(links.index),
+            comparison.WAVES[1]: answers[1].reindex(links.index),
+        },
+        axis=1,
+    ).swaplevel(axis=1)
+    return pd.concat([result, paired[columns]], axis=1)
+
+
+def panel_summary(
+    initial: pd.DataFrame, followup: pd.DataFrame, communities: list
+) -> dict:
+    """returns how the follow up records of {communities} were linked to
+    households as {"matches": Series}, the number of households followed up
+    as {"households": int} and, per question, the mean within household
+    change of numeric answers as {"changes": DataFrame} and the share of
+    households giving a different answer to multiple choice questions as
+    {"changed": DataFrame}"""
+    paired = pairs(initial, followup)
+    before, after = comparison.WAVES
+    matches = paired["match"].value_counts().reindex(list(MATCH_KEYS), fill_value=0)
+    matches[UNLINKED] = len(followup) - len(paired)
+
+    changes, changed = {}, {}
+    for question in comparison.QUESTIONS:
+        answers = paired[question.column].dropna()
+        if answers.empty:
+            continue
+        if question.kind in comparison.TOTAL_KINDS:
+            answers = answers.astype(float)
+            delta = answers[after] - answers[before]
+            changes[question.text] = {
+                "pairs": len(answers),
+                before: answers[before].mean(),
+                after: answers[after].mean(),
+                "mean change": delta.mean(),
+            }
+        else:
+            changed[question.text] = {
+                "pairs": len(answers),
+                "% changed": round((answers[after] != answers[before]).mean() * 100, 2),
+            }
+    return {
+        "matches": matches.rename("records"),
+        "households": int(paired["household_id"].nunique()),
+        "changes": pd.DataFrame.from_dict(changes, orient="index"),
+        "changed": pd.DataFrame.from_dict(changed, orient="index"),
+    }
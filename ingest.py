@@ -0,0 +1,173 @@
+import typing
+
+import pandas as pd
+
+import schema
+import table_cache
+
+COMMUNITY_COLUMN = "Community"
+DATE_COLUMN = "date"
+# date of the first initial survey of the record's community, and the days
+# from it to the record's date
+FIRST_DATE_COLUMN = "firstDateCommunity"
+SINCE_EARLIEST_COLUMN = "sinceEarliest"
+# free response answers, the only ones typed in by hand
+TEXT_COLUMNS = [schema.QUESTION_COLUMNS[key] for key in ["hh_name", "SWE_name"]]
+# part of the cache key of every synced table, bumped whenever
+# schema.apply_schema() or prepare() change what is stored, so tables cached on
+# disk by an older version are downloaded again instead of being reused
+VERSION = 2
+# tables whose records count days from the first initial survey of their
+# community, see prepare()
+FIRST_DATES_TABLES = ["FollowUpSurvey"]
+
+
+def strip_text(df: pd.DataFrame) -> pd.DataFrame:
+    """strips whitespace on the free response answers of {df}"""
+    return df.assign(
+        **{
+            column: df[column].str.strip()
+            for column in TEXT_COLUMNS
+            if column in df.columns
+        }
+    )
+
+
+def parse_dates(df: pd.DataFrame) -> pd.DataFrame:
+    """returns {df} with its date column as datetimes. schema.apply_schema()
+    already parses it, so this only converts tables from elsewhere. An empty
+    download has no columns at all, and is returned as it is"""
+    if DATE_COLUMN not in df.columns or pd.api.types.is_datetime64_any_dtype(
+        df[DATE_COLUMN]
+    ):
+        return df
+    return df.assign(**{DATE_COLUMN: pd.to_datetime(df[DATE_COLUMN], errors="coerce")})
+
+
+def tweak_initial(df: pd.DataFrame) -> pd.DataFrame:
+    """data wrangling function for initial survey DataFrame. Strips whitespace
+    on free input questions"""
+    # name and phone are the only true free response questions, the phone
+    # number is already normalized and hashed by schema.apply_schema()
+    return parse_dates(strip_text(df))
+
+
+def tweak_followup(df: pd.DataFrame) -> pd.DataFrame:
+    """data wrangling function for followup survey DataFrame. Strips
+    whitespace on free input questions"""
+    return parse_dates(strip_text(df))
+
+
+def first_survey_dates(initial: pd.DataFrame) -> pd.Series:
+    """returns the date of the first initial survey of each community"""
+    if not {COMMUNITY_COLUMN, DATE_COLUMN} <= set(initial.columns):
+        return pd.Series(dtype="datetime64[us, UTC]", name=DATE_COLUMN)
+    return initial.groupby(COMMUNITY_COLUMN, observed=True)[DATE_COLUMN].min()
+
+
+def add_since_earliest(df: pd.DataFrame, first_dates: pd.Series) -> pd.DataFrame:
+    """adds the date of the first survey in each record's community, from
+    {first_dates}, and the number of days since then. Both are missing for
+    all records if {df} has no community or date, like an empty download"""
+    if not {COMMUNITY_COLUMN, DATE_COLUMN} <= set(df.columns):
+        return df.assign(
+            **{
+                FIRST_DATE_COLUMN: pd.Series(
+                    pd.NaT, index=df.index, dtype=first_dates.dtype
+                ),
+                SINCE_EARLIEST_COLUMN: pd.Series(float("nan"), index=df.index),
+            }
+        )
+    codes = first_dates.index.get_indexer(df[COMMUNITY_COLUMN])
+    first = pd.Series(first_dates.array.take(codes, allow_fill=True), index=df.index)
+    return df.assign(
+        **{
+            FIRST_DATE_COLUMN: first,
+            SINCE_EARLIEST_COLUMN: (df[DATE_COLUMN] - first).dt.days,
+        }
+    )
+
+
+def prepare(
+    df: pd.DataFrame,
+    tableName: str,
+    first_dates: typing.Union[pd.Series, None] = None,
+) -> pd.DataFrame:
+    """runs the ingest pipeline on a table straight after it is downloaded
+    and schema.apply_schema() is applied, so every page reads the columns it
+    derives instead of deriving them on each rerun. Survey records get their
+    community's first survey date and the days since, from {first_dates} for
+    follow ups as those count from the first initial survey. Follow ups
+    can't be prepared without them"""
+    if tableName == "InitialSurvey":
+        df = tweak_initial(df)
+        first_dates = first_survey_dates(df)
+    elif tableName in FIRST_DATES_TABLES:
+        if first_dates is None:
+            raise ValueError(f"{tableName} needs the first initial survey dates")
+        df = tweak_followup(df)
+    else:
+        return df
+    return add_since_earliest(df, first_dates)
+
+
+def _stored(
+    table: str, communities: bool = True
+) -> typing.List[typing.Tuple[table_cache.TableKey, table_cache.TableState]]:
+    """returns the stored copies of {table}, only the ones of every community
+    if not {communities}"""
+    return [
+        (key, state)
+        for key, state in table_cache.stored()
+        if isinstance(key, table_cache.TableKey)
+        and key.table == table
+        and (communities or key.communities is None)
+    ]
+
+
+def rederive(
+    key: table_cache.TableKey, state: table_cache.TableState, first_dates: pd.Series
+) -> None:
+    """stores the follow ups of {state} again with their first survey dates
+    from {first_dates}, unless they already have those"""
+    frame = add_since_earliest(state.frame, first_dates)
+    derived = [FIRST_DATE_COLUMN, SINCE_EARLIEST_COLUMN]
+    if set(derived) <= set(state.frame.columns) and frame[derived].equals(
+        state.frame[derived]
+    ):
+        return
+    table_cache.update(key, state, frame)
+
+
+def _rederive_followups(
+    old: typing.Union[str, None], new: typing.Union[str, None]
+) -> None:
+    """follow ups count days from the first initial survey of their community,
+    so they are derived again whenever the initial surveys of every
+    community change. Follow ups stored (or loaded from disk) are derived
+    again from the latest initial surveys in case those changed since"""
+    initials = _stored("InitialSurvey", communities=False)
+    followups = [item for table in FIRST_DATES_TABLES for item in _stored(table)]
+    key, state = next(
+        ((key, state) for key, state in initials + followups if state.version == new),
+        (None, None),
+    )
+    if key is None:
+        return
+    if key.table == "InitialSurvey":
+        initial, targets = state, followups
+    else:
+        initial = max(
+            (state for _, state in initials),
+            key=lambda state: state.synced_at,
+            default=None,
+        )
+        targets = [(key, state)]
+    if initial is None:
+        return
+    first_dates = first_survey_dates(initial.frame)
+    for key, state in targets:
+        rederive(key, state, first_dates)
+
+
+table_cache.on_change(_rederive_followups)
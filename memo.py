@@ -0,0 +1,118 @@
+import io
+import os
+import sys
+import threading
+import typing
+from collections import OrderedDict
+
+import matplotlib.pyplot as plt
+import pandas as pd
+
+import table_cache
+
+# memory the memoized section results may use before the least recently used
+# ones are evicted
+MAX_BYTES = int(os.environ.get("BWF_MEMO_MAX_MB", 64)) * 1024 * 1024
+
+
+def sizeof(value: typing.Any) -> int:
+    """rough number of bytes held by a memoized value"""
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, (pd.DataFrame, pd.Series, pd.Index)):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum() if isinstance(usage, pd.Series) else usage)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(
+            sizeof(k) + sizeof(v) for k, v in value.items()
+        )
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(sizeof(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class SectionCache:
+    """least recently used cache of section results, bounded by the total
+    size of the stored values rather than their number"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._entries: "OrderedDict[tuple, typing.Tuple[typing.Any, int]]" = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> typing.Tuple[bool, typing.Any]:
+        """returns (True, value) if key is cached, else (False, None)"""
+        with self._lock:
+            if key not in self._entries:
+                return False, None
+            self._entries.move_to_end(key)
+            return True, self._entries[key][0]
+
+    def put(self, key: tuple, value: typing.Any) -> None:
+        size = sizeof(value)
+        with self._lock:
+            if key in self._entries:
+                self.bytes -= self._entries.pop(key)[1]
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (value, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.bytes -= evicted_size
+
+    def get_or_compute(self, key: tuple, compute: typing.Callable[[], typing.Any]):
+        hit, value = self.get(key)
+        if not hit:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def drop_version(self, version: str) -> None:
+        """remove every entry computed from data {version}"""
+        with self._lock:
+            for key in [key for key in self._entries if version in key[0]]:
+                self.bytes -= self._entries.pop(key)[1]
+
+
+section_cache = SectionCache(MAX_BYTES)
+# results computed from a table are useless once it has been refreshed
+table_cache.on_change(lambda old, new: section_cache.drop_version(old))
+
+
+def figure_png(fig: plt.Figure) -> bytes:
+    """render a matplotlib figure to PNG bytes and close it"""
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png", bbox_inches="tight")
+    plt.close(fig)
+    return buf.getvalue()
+
+
+class Scope:
+    """memoizes the sections of a page for one version of its input tables and
+    one community selection, so users looking at the same data and the same
+    communities share the results. If any of the frames didn't come from a
+    synced table nothing is memoized"""
+
+    def __init__(
+        self, frames: typing.Sequence[pd.DataFrame], communities: typing.List[str]
+    ):
+        versions = tuple(table_cache.data_version(df) for df in frames)
+        self.versions = None if None in versions else versions
+        self.communities = tuple(sorted(set(communities)))
+
+    def value(self, section: str, compute: typing.Callable[[], typing.Any]):
+        """returns compute(), memoized under {section}"""
+        if self.versions is None:
+            return compute()
+        return section_cache.get_or_compute(
+            (self.versions, self.communities, section), compute
+        )
+
+    def figure(self, section: str, build: typing.Callable[[], plt.Figure]) -> bytes:
+        """returns the PNG of the figure made by build(), memoized under
+        {section}"""
+        return self.value(section + ":png", lambda: figure_png(build()))
@@ -1,261 +1,222 @@
 import streamlit as st
 from PIL import Image
-from Home import get_data, header_info, selection_sidebar, get_community, add_labels
+from Home import (
+    export_buttons,
+    get_community_options,
+    get_community_tables,
+    header_info,
+    selection_sidebar,
+    add_labels,
+)
 from pandas.api.types import CategoricalDtype
 import matplotlib.pyplot as plt
 import pandas as pd
+from profiling import render_panel, start_run, timer
+from aggregates import DEMOGRAPHICS_COLUMNS, demographics_summary
+import charts
+import memo
 
 
-def demographics(initial):
-    """Generate and st.write demographic data from initial survey data"""
-    st.write("Systematic Survey Sample:\n")
+def percent_bar_figure(data: pd.Series, title: str) -> plt.Figure:
+    """bar chart of a percentage breakdown with value labels"""
+    fig, ax = plt.subplots()
+    data.plot.bar(ax=ax, ylabel="% of Respondents", title=title).grid(axis="y")
+    ax.set_xticklabels(ax.get_xticklabels(), rotation=45, ha="right")
+    add_labels(ax)
+    return fig
 
-    st.write(f"Number of Survey Entries (Families): {initial.id.size}")
-    st.write(f"Number of Unique Household Names: {initial.HeadHouseholdName.nunique()}")
-    total_pop = initial.TotalNoPeopleHousehold.sum()
-    st.write(f"Total Survey Population: {total_pop:n}")
-    st.write(f"Average family size: {initial.TotalNoPeopleHousehold.mean():.2f}")
 
-    childrencolumns = [
-        "NoHouseholdMale0_1Year",
-        "NoHouseholdFemale0_1Year",
-        "NoHouseholdMale1_5Year",
-        "NoHouseholdFemale1_5Year",
-    ]
-    children5 = initial.loc[:, childrencolumns].sum().sum()
-    st.write(f"{100*children5/total_pop:.2f}% less than 5 yrs")
-    childrencolumns += ["NoHouseholdMale5_12Year", "NoHouseholdFemale5_12Year"]
-    children12 = initial.loc[:, childrencolumns].sum().sum()
-    st.write(f"{100*children12/total_pop:.2f}% less than 12 yrs")
-    childrencolumns += ["NoHouseholdMale13_17Year", "NoHouseholdFemale13_17Year"]
-    children18 = initial.loc[:, childrencolumns].sum().sum()
-    st.write(f"{100*children18/total_pop:.2f}% less than 18 yrs")
+def percent_bar_spec(data: pd.Series, title: str) -> dict:
+    """percent_bar_figure() as a Vega-Lite spec"""
+    return charts.bar_spec(data, title, "% of Respondents")
 
-    st.write("\nSources of Drinking Water")
-    st.write(
-        (
-            initial.MainSourceDrinkingWater.value_counts(dropna=False, normalize=True)
-            .mul(100)
-            .round(2)
-        )
-    )
 
-    st.write("\nSources of Non-Drinking Water")
-    st.write(
-        (
-            initial.MainSourceOtherPurposeWater.value_counts(
-                dropna=False, normalize=True
-            )
-            .mul(100)
-            .round(2)
-        )
-    )
+def water_collection_time_labels(data: pd.Series) -> pd.Series:
+    """data with its first bin labelled as closed on both ends, which it is
+    because of include_lowest"""
+    newlabels = [str(interval) for interval in data.index]
+    newlabels[0] = "[0.0,10.0]"
+    return data.set_axis(newlabels)
 
-    st.write("\nWater Collection Frequency")
-    water_mapping = {
-        "2ORMORETIMEPERDAY": "Two or More Times Daily",
-        "ONCEDAILY": "Once Daily",
-        "EVERYOTHERDAY": "Every Other Day",
-        "EVERYTHIRDDAY": "Every Third Day",
-        "WEEKLY": "Weekly",
-    }
-    water_cat = CategoricalDtype(
-        categories=[
-            "Two or More Times Daily",
-            "Once Daily",
-            "Every Other Day",
-            "Every Third Day",
-            "Weekly",
-        ],
-        ordered=True,
-    )
-    water_collection_freq = (
-        initial.HouseholdFrequencyAtWaterSource.astype("category")
-        .map(water_mapping)
-        .astype(water_cat)
-        .value_counts(dropna=False, normalize=True, sort=False)
-        .mul(100)
-        .round(2)
-    )
-    st.write(water_collection_freq)
-    fig, ax = plt.subplots()
-    water_collection_freq.plot.bar(
-        ax=ax, ylabel="% of Respondents", title="Water Collection Frequency"
-    ).grid(axis="y")
-    ax.set_xticklabels(ax.get_xticklabels(), rotation=45, ha="right")
-    add_labels(ax)
-    st.pyplot(fig)
 
-    st.write("\nWater Collection Time (Minutes)")
-    water_collection_bins = [0]
-    for i in range(15):
-        water_collection_bins.append(water_collection_bins[-1] + 10)
-        if water_collection_bins[-1] >= initial.TimeToWaterSourceGetReturn.max():
-            water_collection_bins[-1] = initial.TimeToWaterSourceGetReturn.max()
-            break
-    water_collection_time = (
-        pd.cut(
-            initial.TimeToWaterSourceGetReturn,
-            water_collection_bins,
-            right=True,
-            include_lowest=True,
-        )
-        .value_counts(normalize=True, sort=False)
-        .mul(100)
-        .round(2)
-    )
-    st.write(water_collection_time)
+def water_collection_time_figure(data: pd.Series) -> plt.Figure:
     fig, ax = plt.subplots()
     (
-        water_collection_time.plot.bar(
+        water_collection_time_labels(data).plot.bar(
             ax=ax, ylabel="% of Respondents", title="Water Collection Time (Minutes)"
         )
     )
     ax.grid(axis="y")
-    newlabels = [tck.get_text() for tck in ax.get_xticklabels()]
-    newlabels[0] = "[0.0,10.0]"
-    ax.set_xticklabels(newlabels, rotation=45, ha="right")
-    add_labels(ax)
-    st.pyplot(fig)
-
-    st.write("\nWho Collects Water")
-    who_collects = (
-        initial.UsualHouseholdWaterFetcher.value_counts(dropna=False, normalize=True)
-        .mul(100)
-        .round(2)
-    )
-    st.write(who_collects)
-    fig, ax = plt.subplots()
-    who_collects.plot.bar(
-        ax=ax, ylabel="% of Respondents", title="Who Collects Water?"
-    ).grid(axis="y")
     ax.set_xticklabels(ax.get_xticklabels(), rotation=45, ha="right")
     add_labels(ax)
-    st.pyplot(fig)
+    return fig
 
-    st.write("\nWater Container")
-    st.write(
-        (
-            initial.ContainerCarryWater.value_counts(dropna=False, normalize=True)
-            .mul(100)
-            .round(2)
-        )
-    )
-
-    st.write("\n\n ### Head of Household Demographics")
-    st.write("\nAverage Age")
-    st.write(f"{initial.HeadHouseholdAge.mean():.1f}")
 
-    st.write("\nSex")
-    sex = (
-        initial.HeadHouseholdSex.value_counts(dropna=False, normalize=True)
-        .mul(100)
-        .round(2)
-    )
-    st.write(sex)
+def pie_figure(data: pd.Series) -> plt.Figure:
     fig, ax = plt.subplots()
     ax.pie(
-        sex.values,
-        labels=sex.index.values,
+        data.values,
+        labels=data.index.values,
         autopct="%1.1f%%",
         shadow=False,
         startangle=140,
     )
     ax.axis("equal")
-    st.pyplot(fig)
+    return fig
 
-    st.write("\nMarital Status")
-    marital_status = (
-        initial.HeadHouseholdMaritalStatus.value_counts(dropna=False, normalize=True)
-        .mul(100)
-        .round(2)
-    )
-    st.write(marital_status)
-    fig, ax = plt.subplots()
-    marital_status.plot.bar(
-        ax=ax, ylabel="% of Respondents", title="Head of Household Marital Status"
-    ).grid(axis="y")
-    ax.set_xticklabels(ax.get_xticklabels(), rotation=45, ha="right")
-    add_labels(ax)
-    st.pyplot(fig)
 
-    st.write("\nEducation")
-    ed_mapping = {
-        "COMPLETEDJRHIGHSCHOOL": "Completed Jr. High",
-        "SOMEJRHIGHSCHOOL": "Completed Primary School",
-        "SOMEPRIMARYSCHOOL": "Some or No Primary School",
-        "NOFORMALEDUCATION": "Some or No Primary School",
-        "COMPLETEDPRIMARYSCHOOL": "Completed Primary School",
-        "SOMESRHIGHSCHOOL": "Completed Jr. High",
-        "COMPLETEDSRHIGHSCHOOL": "Completed High School",
-        "SOMEEDUCATIONBEYONDHIGHSCHOOL": "Some Education Beyond High School",
-    }
-    ed_cat = CategoricalDtype(
-        categories=[
-            "Some or No Primary School",
-            "Completed Primary School",
-            "Completed Jr. High",
-            "Completed High School",
-            "Some Education Beyond High School",
-        ],
-        ordered=True,
-    )
-    education = (
-        initial.HeadHouseholdEducation.astype("category")
-        .map(ed_mapping)
-        .astype(ed_cat)
-        .value_counts(dropna=False, normalize=True, sort=False)
-        .mul(100)
-        .round(2)
-    )
-    st.write(education)
-    fig, ax = plt.subplots()
-    education.plot.bar(
-        ax=ax, ylabel="% of Respondents", title="Head of Household Education Level"
-    ).grid(axis="y")
-    ax.set_xticklabels(ax.get_xticklabels(), rotation=45, ha="right")
-    add_labels(ax)
-    st.pyplot(fig)
+def demographics(initial: pd.DataFrame, communities: list, scope: memo.Scope) -> None:
+    """Generate and st.write demographic data from the initial surveys of
+    {communities}. Tables and charts are memoized in {scope}"""
+    with timer("demographics.summary"):
+        summary = scope.value(
+            "demographics.summary", lambda: demographics_summary(initial, communities)
+        )
 
-    st.write("\nOccupation")
-    occ_mapping = {
-        "FARMER": "Farmer",
-        "TRADER": "Trader",
-        "OTHER": "Other/None",
-        "NONE": "Other/None",
-        "CIVILSERVANT": "Civil Servant/Teacher",
-        "TEACHER": "Civil Servant/Teacher",
-    }
-    occupation = (
-        initial.HeadHouseholdOccupation.astype("category")
-        .map(occ_mapping)
-        .value_counts(dropna=False, normalize=True)
-        .mul(100)
-        .round(2)
-    )
-    st.write(occupation)
-    fig, ax = plt.subplots()
-    occupation.plot.bar(
-        ax=ax, ylabel="% of Respondents", title="Head of Household Occupation"
-    ).grid(axis="y")
-    ax.set_xticklabels(ax.get_xticklabels(), rotation=45, ha="right")
-    add_labels(ax)
-    st.pyplot(fig)
+    with timer("demographics.household_size"):
+        st.write("Systematic Survey Sample:\n")
+
+        st.write(f"Number of Survey Entries (Families): {summary['entries']}")
+        st.write(f"Number of Unique Household Names: {summary['unique_names']}")
+        st.write(f"Total Survey Population: {summary['total_pop']:n}")
+        st.write(f"Average family size: {summary['average_family_size']:.2f}")
+        st.write(f"{summary['pct_under_5']:.2f}% less than 5 yrs")
+        st.write(f"{summary['pct_under_12']:.2f}% less than 12 yrs")
+        st.write(f"{summary['pct_under_18']:.2f}% less than 18 yrs")
+
+    with timer("demographics.drinking_water_source"):
+        st.write("\nSources of Drinking Water")
+        st.write(summary["drinking_water_source"])
+
+    with timer("demographics.other_water_source"):
+        st.write("\nSources of Non-Drinking Water")
+        st.write(summary["other_water_source"])
+
+    with timer("demographics.water_collection_frequency"):
+        st.write("\nWater Collection Frequency")
+        st.write(summary["water_collection_frequency"])
+        charts.show(
+            "demographics.water_collection_frequency",
+            lambda: percent_bar_figure(
+                summary["water_collection_frequency"], "Water Collection Frequency"
+            ),
+            lambda: percent_bar_spec(
+                summary["water_collection_frequency"], "Water Collection Frequency"
+            ),
+            scope,
+        )
+
+    with timer("demographics.water_collection_time"):
+        st.write("\nWater Collection Time (Minutes)")
+        st.write(summary["water_collection_time"])
+        charts.show(
+            "demographics.water_collection_time",
+            lambda: water_collection_time_figure(summary["water_collection_time"]),
+            lambda: percent_bar_spec(
+                water_collection_time_labels(summary["water_collection_time"]),
+                "Water Collection Time (Minutes)",
+            ),
+            scope,
+        )
+
+    with timer("demographics.who_collects_water"):
+        st.write("\nWho Collects Water")
+        st.write(summary["who_collects_water"])
+        charts.show(
+            "demographics.who_collects_water",
+            lambda: percent_bar_figure(
+                summary["who_collects_water"], "Who Collects Water?"
+            ),
+            lambda: percent_bar_spec(
+                summary["who_collects_water"], "Who Collects Water?"
+            ),
+            scope,
+        )
+
+    with timer("demographics.water_container"):
+        st.write("\nWater Container")
+        st.write(summary["water_container"])
+
+    with timer("demographics.head_of_household_age"):
+        st.write("\n\n ### Head of Household Demographics")
+        st.write("\nAverage Age")
+        st.write(f"{summary['average_age']:.1f}")
+
+    with timer("demographics.sex"):
+        st.write("\nSex")
+        st.write(summary["sex"])
+        charts.show(
+            "demographics.sex",
+            lambda: pie_figure(summary["sex"]),
+            lambda: charts.pie_spec(summary["sex"]),
+            scope,
+        )
+
+    with timer("demographics.marital_status"):
+        st.write("\nMarital Status")
+        st.write(summary["marital_status"])
+        charts.show(
+            "demographics.marital_status",
+            lambda: percent_bar_figure(
+                summary["marital_status"], "Head of Household Marital Status"
+            ),
+            lambda: percent_bar_spec(
+                summary["marital_status"], "Head of Household Marital Status"
+            ),
+            scope,
+        )
+
+    with timer("demographics.education"):
+        st.write("\nEducation")
+        st.write(summary["education"])
+        charts.show(
+            "demographics.education",
+            lambda: percent_bar_figure(
+                summary["education"], "Head of Household Education Level"
+            ),
+            lambda: percent_bar_spec(
+                summary["education"], "Head of Household Education Level"
+            ),
+            scope,
+        )
+
+    with timer("demographics.occupation"):
+        st.write("\nOccupation")
+        st.write(summary["occupation"])
+        charts.show(
+            "demographics.occupation",
+            lambda: percent_bar_figure(
+                summary["occupation"], "Head of Household Occupation"
+            ),
+            lambda: percent_bar_spec(
+                summary["occupation"], "Head of Household Occupation"
+            ),
+            scope,
+        )
 
 
 ## start of main script
 ##----------------------------
+start_run("Demographics")
 header_info()
 
-df_initial = get_data(tableName="InitialSurvey")
-if type(df_initial) != pd.DataFrame:
+df_communities = get_community_options()
+if type(df_communities) != pd.DataFrame:
     st.error("API failed to return data")
 else:
-    communities = selection_sidebar(df_initial)
+    communities = selection_sidebar(df_communities)
 
     if communities:
-        data_initial = get_community(df_initial, communities)
+        (data_initial,) = get_community_tables(
+            ["InitialSurvey"], communities, {"InitialSurvey": DEMOGRAPHICS_COLUMNS}
+        )
+        if type(data_initial) != pd.DataFrame:
+            st.error("API failed to return data")
+            st.stop()
 
+        export_buttons({"InitialSurvey": data_initial})
         st.write("---")
         st.write("### Demographic summary")
-        demographics(data_initial)
+        demographics(data_initial, communities, memo.Scope([data_initial], communities))
+
+render_panel()
@@ -1,57 +1,90 @@
 import streamlit as st
 from PIL import Image
-from Home import get_data, get_community, header_info, selection_sidebar, add_labels
+from Home import (
+    export_buttons,
+    get_community_options,
+    get_community_tables,
+    header_info,
+    selection_sidebar,
+    add_labels,
+)
 from pandas.api.types import CategoricalDtype
 import matplotlib.pyplot as plt
 import pandas as pd
+from profiling import render_panel, start_run, timer
+from aggregates import WATER_TEST_COLUMNS, water_test_summary
+import charts
+import memo
+
+
+def test_result_figure(data: pd.Series, title: str) -> plt.Figure:
+    """bar chart of the percentage of tests with each result"""
+    fig, ax = plt.subplots()
+    data.plot.bar(ax=ax, ylabel="% of Tests", title=title)
+    ax.grid(axis="y")
+    ax.set_xticklabels(ax.get_xticklabels(), rotation=45, ha="right")
+    add_labels(ax)
+    return fig
+
 
 ## start of main script
 ##----------------------------
+start_run("Community Water")
 header_info()
 
-df_initial = get_data(tableName="InitialSurvey")
-if type(df_initial) != pd.DataFrame:
+df_communities = get_community_options()
+if type(df_communities) != pd.DataFrame:
     st.error("API failed to return data")
 else:
-    communities = selection_sidebar(df_initial)
+    communities = selection_sidebar(df_communities)
 
     if communities:
-        communitywater_df = get_data(tableName="CommunityWaterTest")
-        communitywater = get_community(communitywater_df, communities)
+        (communitywater,) = get_community_tables(
+            ["CommunityWaterTest"],
+            communities,
+            {"CommunityWaterTest": WATER_TEST_COLUMNS},
+        )
+        if type(communitywater) != pd.DataFrame:
+            st.error("API failed to return data")
+            st.stop()
         st.write("##")
         st.write("---")
 
         st.write("### Community Water Tests", communitywater)
-        colilert_test_result = (
-            communitywater.ColilertTestResult.value_counts(dropna=False, normalize=True)
-            .mul(100)
-            .round(2)
-        )
-        st.write(colilert_test_result)
+        export_buttons({"CommunityWaterTest": communitywater})
+        scope = memo.Scope([communitywater], communities)
+        with timer("community_water.summary"):
+            summary = scope.value(
+                "community_water.summary",
+                lambda: water_test_summary(communitywater, communities),
+            )
 
-        fig, ax = plt.subplots()
-        colilert_test_result.plot.bar(
-            ax=ax, ylabel="% of Tests", title="Colilert Test Results"
-        )
-        ax.grid(axis="y")
-        ax.set_xticklabels(ax.get_xticklabels(), rotation=45, ha="right")
-        add_labels(ax)
-        st.pyplot(fig)
-
-        petrifilm_test_result = (
-            communitywater.PetrifilmTestResult.value_counts(
-                dropna=False, normalize=True
+        with timer("community_water.colilert"):
+            colilert_test_result = summary["colilert"]
+            st.write(colilert_test_result)
+            charts.show(
+                "community_water.colilert",
+                lambda: test_result_figure(
+                    colilert_test_result, "Colilert Test Results"
+                ),
+                lambda: charts.bar_spec(
+                    colilert_test_result, "Colilert Test Results", "% of Tests"
+                ),
+                scope,
             )
-            .mul(100)
-            .round(2)
-        )
-        st.write(petrifilm_test_result)
 
-        fig, ax = plt.subplots()
-        petrifilm_test_result.plot.bar(
-            ax=ax, ylabel="% of Tests", title="Petrifilm Test Results"
-        )
-        ax.grid(axis="y")
-        ax.set_xticklabels(ax.get_xticklabels(), rotation=45, ha="right")
-        add_labels(ax)
-        st.pyplot(fig)
+        with timer("community_water.petrifilm"):
+            petrifilm_test_result = summary["petrifilm"]
+            st.write(petrifilm_test_result)
+            charts.show(
+                "community_water.petrifilm",
+                lambda: test_result_figure(
+                    petrifilm_test_result, "Petrifilm Test Results"
+                ),
+                lambda: charts.bar_spec(
+                    petrifilm_test_result, "Petrifilm Test Results", "% of Tests"
+                ),
+                scope,
+            )
+
+render_panel()
@@ -1,193 +1,120 @@
 import streamlit as st
 from PIL import Image
-from Home import get_data, get_community, header_info, selection_sidebar, add_labels
+from Home import (
+    export_buttons,
+    get_community_options,
+    get_community_tables,
+    header_info,
+    selection_sidebar,
+    add_labels,
+)
 from pandas.api.types import CategoricalDtype
 import matplotlib.pyplot as plt
 import pandas as pd
+from profiling import render_panel, start_run, timer
+from aggregates import FOLLOWUP_COLUMNS, followup_summary
+import households
+import comparison
+import memo
 
 ## start of main script
 ##----------------------------
+start_run("Follow Up Comparison")
 header_info()
 
-df_initial = get_data(tableName="InitialSurvey")
-df_followup = get_data(tableName="FollowUpSurvey")
-if (type(df_initial) != pd.DataFrame) or (type(df_followup) != pd.DataFrame):
+df_communities = get_community_options()
+if type(df_communities) != pd.DataFrame:
     st.error("API failed to return data")
 else:
-    communities = selection_sidebar(df_initial)
+    communities = selection_sidebar(df_communities)
 
     if communities:
-        data_initial = get_community(df_initial, communities)
-        data_followup = get_community(df_followup, communities)
-
-        st.write("---")
-        st.write(
-            "How much money was spent by members of this household for medical treatment for these illnesses in the last four (4) weeks? (in local currency)"
-        )
-        fig1, ax1 = plt.subplots()
-        (
-            data_initial.MoneySpentMedicalTreatmentLast4weeks.plot.hist(
-                ax=ax1, title="Initial Survey Medical Costs"
-            )
-        )
-        ax1.grid(axis="y")
-        ax1.set_xlabel("Medical Costs Previous 4 Weeks (Local Currency)")
-
-        fig2, ax2 = plt.subplots()
-        (
-            data_followup.MoneySpentMedicalTreatmentLast4weeks.plot.hist(
-                ax=ax2, title="Follow Up Survey Medical Costs"
-            )
-        )
-        ax2.grid(axis="y")
-        ax2.set_xlabel("Medical Costs Previous 4 Weeks (Local Currency)")
-        add_labels(ax1, pct=False)
-        add_labels(ax2, pct=False)
-
-        col1, col2 = st.columns(2)
-        col1.pyplot(fig1)
-        col2.pyplot(fig2)
-        # st.pyplot(fig)
-
-        st.write(
-            "In the last two weeks, how many days have you personally been unable to do work due to your own stomach pain/diarrhea illness?"
-        )
-        # st.write('---')
-        col1, col2 = st.columns(2)
-        col1.write("#### Initial Survey")
-        col1.write(
-            data_initial.NoDaysNoWorkBecauseOfOwnIllness.value_counts(normalize=True)
-            .mul(100)
-            .round(2)
-        )
-        col1.write(
-            f"sum of work days missed {data_initial.NoDaysNoWorkBecauseOfOwnIllness.sum()}"
-        )
-
-        col2.write("#### Follow Up Survey")
-        col2.write(
-            data_followup.NoDaysNoWorkBecauseOfOwnIllness.value_counts(normalize=True)
-            .mul(100)
-            .round(2)
-        )
-        col2.write(
-            f"sum of work days missed {data_followup.NoDaysNoWorkBecauseOfOwnIllness.sum()}"
-        )
-
-        st.write(
-            "In the last two weeks, how many total days have other members of your family been unable to do work due to stomach pain/diarrhea illness?"
-        )
-        col1, col2 = st.columns(2)
-        col1.write("#### Initial Survey")
-        col1.write(
-            data_initial.NoDaysNoWorkBecauseOfIllnessFamilyMembers.value_counts(
-                normalize=True
+        data_initial, data_followup = get_community_tables(
+            ["InitialSurvey", "FollowUpSurvey"],
+            communities,
+            {"InitialSurvey": FOLLOWUP_COLUMNS, "FollowUpSurvey": FOLLOWUP_COLUMNS},
+        )
+        if (type(data_initial) != pd.DataFrame) or (
+            type(data_followup) != pd.DataFrame
+        ):
+            st.error("API failed to return data")
+            st.stop()
+
+        export_buttons({"InitialSurvey": data_initial, "FollowUpSurvey": data_followup})
+        scope = memo.Scope([data_initial, data_followup], communities)
+        with timer("followup.summary"):
+            summary = scope.value(
+                "followup.summary",
+                lambda: followup_summary(data_initial, data_followup, communities),
             )
-            .mul(100)
-            .round(2)
-        )
-        col1.write(
-            f"sum of work days missed household {data_initial.NoDaysNoWorkBecauseOfIllnessFamilyMembers.sum()}"
-        )
-
-        col2.write("#### Follow Up Survey")
-        col2.write(
-            data_followup.NoDaysNoWorkBecauseOfIllnessFamilyMembers.value_counts(
-                normalize=True
-            )
-            .mul(100)
-            .round(2)
-        )
-        col2.write(
-            f"sum of work days missed household {data_followup.NoDaysNoWorkBecauseOfIllnessFamilyMembers.sum()}"
-        )
 
-        st.write(
-            "In the last two weeks, how many total school days have school-age children in this household missed due to illness? (No. of days)"
-        )
-        col1, col2 = st.columns(2)
-        col1.write("#### Initial Survey")
-        col1.write(
-            data_initial.NoTotalSchoolDaysMissedBySchoolAgeChildrenIn2LastWeek.value_counts(
-                normalize=True
-            )
-            .mul(100)
-            .round(2)
-        )
-        col1.write(
-            f"sum of school days missed {data_initial.NoTotalSchoolDaysMissedBySchoolAgeChildrenIn2LastWeek.sum()}"
-        )
-
-        col2.write("#### Follow Up Survey")
-        col2.write(
-            data_followup.NoTotalSchoolDaysMissedBySchoolAgeChildrenIn2LastWeek.value_counts(
-                normalize=True
-            )
-            .mul(100)
-            .round(2)
-        )
-        col2.write(
-            f"sum of school days missed {data_followup.NoTotalSchoolDaysMissedBySchoolAgeChildrenIn2LastWeek.sum()}"
-        )
-
-        st.write("Do you treat your water in any way to make it safer to drink?")
-        col1, col2 = st.columns(2)
-        col1.write("#### Initial Survey")
-        col1.write(
-            data_initial.WaterTreatmentBeforeDrinking.value_counts(
-                normalize=True, dropna=False
-            )
-            .mul(100)
-            .round(2)
-        )
-
-        col2.write("#### Follow Up Survey")
-        col2.write(
-            data_followup.WaterTreatmentBeforeDrinking.value_counts(
-                normalize=True, dropna=False
+        st.write("---")
+        with timer("followup.medical_costs"):
+            st.write(
+                "How much money was spent by members of this household for medical treatment for these illnesses in the last four (4) weeks? (in local currency)"
             )
-            .mul(100)
-            .round(2)
-        )
-
-        st.write("How often do you treat your water to make it safe?")
-        col1, col2 = st.columns(2)
-        col1.write("#### Initial Survey")
-        col1.write(
-            data_initial.FrequencyWaterTreatment.value_counts(
-                normalize=True, dropna=False
+            fig1, ax1 = plt.subplots()
+            (
+                data_initial.MoneySpentMedicalTreatmentLast4weeks.plot.hist(
+                    ax=ax1, title="Initial Survey Medical Costs"
+                )
             )
-            .mul(100)
-            .round(2)
-        )
-
-        col2.write("#### Follow Up Survey")
-        col2.write(
-            data_followup.FrequencyWaterTreatment.value_counts(
-                normalize=True, dropna=False
+            ax1.grid(axis="y")
+            ax1.set_xlabel("Medical Costs Previous 4 Weeks (Local Currency)")
+
+            fig2, ax2 = plt.subplots()
+            (
+                data_followup.MoneySpentMedicalTreatmentLast4weeks.plot.hist(
+                    ax=ax2, title="Follow Up Survey Medical Costs"
+                )
             )
-            .mul(100)
-            .round(2)
-        )
+            ax2.grid(axis="y")
+            ax2.set_xlabel("Medical Costs Previous 4 Weeks (Local Currency)")
+            add_labels(ax1, pct=False)
+            add_labels(ax2, pct=False)
+
+            col1, col2 = st.columns(2)
+            col1.pyplot(fig1)
+            col2.pyplot(fig2)
+            # st.pyplot(fig)
+
+        for question in comparison.QUESTIONS:
+            if question.kind not in comparison.DISTRIBUTION_KINDS:
+                continue
+            with timer(f"followup.{question.key}"):
+                st.write(question.text)
+                for col, wave in zip(st.columns(2), comparison.WAVES):
+                    col.write(f"#### {wave}")
+                    col.write(
+                        summary["percent"][wave].get(
+                            question.column, pd.Series(name="proportion")
+                        )
+                    )
+                    if question.kind in comparison.TOTAL_KINDS:
+                        col.write(
+                            f"sum of answers {summary['total'][wave][question.column]}"
+                        )
 
-        st.write(
-            "When was the last time you treated your household drinking water with chlorine?"
-        )
-        col1, col2 = st.columns(2)
-        col1.write("#### Initial Survey")
-        col1.write(
-            data_initial.LastTimeTreatedHouseholdWaterWithChlorine.value_counts(
-                normalize=True, dropna=False
+        st.write("---")
+        with timer("followup.panel"):
+            panel = scope.value(
+                "followup.panel",
+                lambda: households.panel_summary(
+                    data_initial, data_followup, communities
+                ),
             )
-            .mul(100)
-            .round(2)
-        )
-
-        col2.write("#### Follow Up Survey")
-        col2.write(
-            data_followup.LastTimeTreatedHouseholdWaterWithChlorine.value_counts(
-                normalize=True, dropna=False
+            st.write("### Same households over time")
+            st.write(
+                f"{panel['households']} households were surveyed again. Follow up "
+                "records are matched to their household by survey id, or by head "
+                "of household name and phone number within the same community"
             )
-            .mul(100)
-            .round(2)
-        )
+            st.write(panel["matches"])
+            if not panel["changes"].empty:
+                st.write("Average change in the answers of each household")
+                st.write(panel["changes"])
+            if not panel["changed"].empty:
+                st.write("Households giving a different answer")
+                st.write(panel["changed"])
+
+render_panel()
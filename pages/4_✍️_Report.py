@@ -1,11 +1,45 @@
 import streamlit as st
 from PIL import Image
+import pandas as pd
+from Home import get_community_options, get_community_tables, selection_sidebar
+from profiling import render_panel, start_run
+import report
+
+
+def report_download() -> None:
+    """offer the report of the selected communities, built from live data
+    only once it is downloaded"""
+    df_communities = get_community_options()
+    if type(df_communities) != pd.DataFrame:
+        st.error("API failed to return data")
+        return
+    communities = selection_sidebar(df_communities)
+    if not communities:
+        st.sidebar.write("Choose communities to build a report from live data")
+        return
+    frames = get_community_tables(report.TABLES, communities, report.COLUMNS)
+    if any(type(df) != pd.DataFrame for df in frames):
+        st.error("API failed to return data")
+        return
+    # built when the button is clicked, outside the script thread. Reports of
+    # the same data are shared by every session, see report.request()
+    st.sidebar.download_button(
+        "Download report (HTML)",
+        data=lambda: report.request(*frames, communities).result(),
+        file_name="bwf_report.html",
+        mime="text/html",
+        on_click="ignore",
+        key="report_download",
+    )
+
 
 ## start of main script
 ##----------------------------
+start_run("Report")
 image = Image.open("Bright-Water-Foundation-Logo-1.jpg")
 
 st.image(image)
+report_download()
 
 st.title("BRIGHT WATER FOUNDATION (BWF) \nATIWA WEST DISTRICT, EASTERN REGION, GHANA")
 st.write("LDS Charities Sankubenase Village Safe Water Project #WE21GHA0005")
@@ -476,3 +510,5 @@ budget projections will be more accurate.
 directly back into the local economy.
 """
 )
+
+render_panel()
@@ -0,0 +1,162 @@
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+import typing
+import uuid
+
+import pandas as pd
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+# profile every session, not just the ones opened with ?debug=1
+ALWAYS_ON = os.environ.get("BWF_PROFILE", "0") == "1"
+# JSON lines file every timing is appended to, if set
+LOG_PATH = os.environ.get("BWF_PROFILE_LOG")
+
+# runs kept for their debug panel, the oldest are dropped beyond this, which
+# also bounds the runs of sessions that were closed
+MAX_RUNS = 100
+
+# latest run of each session: {"run": id, "page": name, "enabled": bool,
+# "tracing": bool, "records": [...]}, keyed by session id in order of start
+_runs: typing.Dict[str, dict] = {}
+_lock = threading.Lock()
+# tracemalloc slows every allocation of the process down, so it only runs
+# while a profiled run that started it is going, see _end_run()
+_tracing_runs = 0
+
+
+def _session_id() -> typing.Union[str, None]:
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else None
+
+
+def _current_run() -> typing.Union[dict, None]:
+    """returns the profiled run of the calling session, or None if this
+    session isn't being profiled"""
+    with _lock:
+        run = _runs.get(_session_id())
+    if run is None or not run["enabled"]:
+        return None
+    return run
+
+
+def _end_run(run: dict) -> None:
+    """stops tracing allocations for {run}, and stops tracemalloc once no
+    other run needs it. Must be called with the lock held"""
+    global _tracing_runs
+    if not run["tracing"]:
+        return
+    run["tracing"] = False
+    _tracing_runs -= 1
+    if _tracing_runs == 0:
+        tracemalloc.stop()
+
+
+def start_run(page: str) -> None:
+    """start a new profiled run for the calling session, ending its previous
+    one. Timings are only recorded if BWF_PROFILE=1 or the page was opened
+    with ?debug=1"""
+    global _tracing_runs
+    session_id = _session_id()
+    if session_id is None:
+        return
+    enabled = ALWAYS_ON or st.query_params.get("debug") == "1"
+    run = {
+        "run": uuid.uuid4().hex[:8],
+        "page": page,
+        "enabled": enabled,
+        "tracing": False,
+        "records": [],
+    }
+    with _lock:
+        previous = _runs.pop(session_id, None)
+        if previous is not None:
+            _end_run(previous)
+        while len(_runs) >= MAX_RUNS:
+            _end_run(_runs.pop(next(iter(_runs))))
+        # tracing started outside of this module (e.g. by PYTHONTRACEMALLOC)
+        # is used as it is, and never stopped
+        if enabled and (_tracing_runs or not tracemalloc.is_tracing()):
+            if not _tracing_runs:
+                tracemalloc.start()
+            _tracing_runs += 1
+            run["tracing"] = True
+        _runs[session_id] = run
+
+
+@contextlib.contextmanager
+def timer(name: str) -> typing.Iterator[None]:
+    """records the wall time, CPU time and net allocated bytes of the block
+    against the current run of the calling session"""
+    run = _current_run()
+    if run is None:
+        yield
+        return
+
+    tracing = tracemalloc.is_tracing()
+    alloc_start = tracemalloc.get_traced_memory()[0] if tracing else 0
+    cpu_start = time.thread_time()
+    wall_start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record = {
+            "run": run["run"],
+            "page": run["page"],
+            "section": name,
+            "wall_ms": round((time.perf_counter() - wall_start) * 1000, 2),
+            "cpu_ms": round((time.thread_time() - cpu_start) * 1000, 2),
+            "alloc_bytes": (
+                tracemalloc.get_traced_memory()[0] - alloc_start
+                # unknown if tracing stopped meanwhile
+                if tracing and tracemalloc.is_tracing()
+                else None
+            ),
+            "thread": threading.current_thread().name,
+            "time": time.time(),
+        }
+        with _lock:
+            run["records"].append(record)
+        if LOG_PATH:
+            with open(LOG_PATH, "a") as f:
+                f.write(json.dumps(record) + "\n")
+
+
+def timed(name: str = None) -> typing.Callable:
+    """decorator that wraps every call of the function in timer(name), which
+    defaults to the function name"""
+
+    def decorator(func: typing.Callable) -> typing.Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer(name or func.__name__):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def render_panel() -> None:
+    """show the timings of the current run in a sidebar expander, which ends
+    it. Does nothing if the session isn't being profiled"""
+    run = _current_run()
+    if run is None:
+        return
+    with _lock:
+        _end_run(run)
+        records = pd.DataFrame(run["records"])
+    with st.sidebar.expander("Debug: section timings", expanded=True):
+        if records.empty:
+            st.write("nothing was timed in this run")
+            return
+        # sections nest (get_data contains query_api etc.), so times overlap
+        st.write(f"run {run['run']} of {run['page']}")
+        st.dataframe(
+            records[["section", "wall_ms", "cpu_ms", "alloc_bytes", "thread"]]
+        )
@@ -0,0 +1,115 @@
+import logging
+import os
+import threading
+import typing
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+import aggregates
+import memo
+import table_cache
+
+logger = logging.getLogger(__name__)
+
+# csv with a project and community column, one row per community of a project
+PROJECTS_PATH = os.environ.get("BWF_PROJECTS", "projects.csv")
+# compute the aggregates of every project in the background whenever a table
+# is refreshed
+PRECOMPUTE = os.environ.get("BWF_PRECOMPUTE_PROJECTS", "1") == "1"
+
+
+def load_projects(path: str) -> typing.Dict[str, typing.List[str]]:
+    """returns {project: [communities]} from the project registry csv at
+    {path}, in the order they are listed"""
+    df = pd.read_csv(path)
+    return {
+        project: list(group.community)
+        for project, group in df.groupby("project", sort=False)
+    }
+
+
+PROJECTS = load_projects(PROJECTS_PATH)
+
+
+def expand(selection: typing.List[str]) -> typing.List[str]:
+    """returns the communities in {selection}, with every project replaced by
+    its communities"""
+    communities = []
+    for name in selection:
+        communities += PROJECTS.get(name, [name])
+    return list(dict.fromkeys(communities))
+
+
+def _frames(
+    aggregate: aggregates.Aggregate,
+) -> typing.Union[typing.List[pd.DataFrame], None]:
+    """the stored frames {aggregate} is computed from: each of its tables as
+    its page requests them, for every community. Tables the API filtered to a
+    community selection are only read by the sessions that chose it. Returns
+    None if one of them isn't in memory"""
+    import Home  # imported here since Home imports this module
+
+    states = dict(table_cache.stored())
+    frames = []
+    for table, columns in aggregate.tables.items():
+        state = states.get(Home.table_key(table, columns))
+        if state is None:
+            return None
+        frames.append(state.frame)
+    return frames
+
+
+def precompute() -> None:
+    """compute every aggregate of every project from the stored tables its
+    page reads, so choosing a project only reads memoized results. Projects
+    without rows in one of the tables are left to the pages"""
+    for aggregate in aggregates.AGGREGATES:
+        frames = _frames(aggregate)
+        if frames is None:
+            continue
+        for communities in PROJECTS.values():
+            selected = [
+                table_cache.select(df, "Community", communities) for df in frames
+            ]
+            if any(df.empty for df in selected):
+                continue
+            memo.Scope(selected, communities).value(
+                aggregate.section,
+                lambda: aggregate.compute(*selected, communities),
+            )
+
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="precompute")
+_scheduled = False
+_scheduled_lock = threading.Lock()
+
+
+def _run() -> None:
+    global _scheduled
+    with _scheduled_lock:
+        _scheduled = False
+    try:
+        precompute()
+    except Exception:
+        logger.warning("precomputing project aggregates failed", exc_info=True)
+
+
+def schedule(
+    old: typing.Union[str, None] = None, new: typing.Union[str, None] = ""
+) -> None:
+    """run precompute() in the background, unless a run is already waiting
+    to start (which will see the latest tables anyway). Nothing is run when
+    a table is only dropped from memory"""
+    global _scheduled
+    if new is None:
+        return
+    with _scheduled_lock:
+        if _scheduled:
+            return
+        _scheduled = True
+    _executor.submit(_run)
+
+
+if PRECOMPUTE:
+    table_cache.on_change(schedule)
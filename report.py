@@ -0,0 +1,278 @@
+import base64
+import datetime
+import html
+import io
+import logging
+import os
+import threading
+import typing
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import pandas as pd
+from matplotlib.figure import Figure
+
+import aggregates
+import comparison
+import households
+import memo
+import table_cache
+
+logger = logging.getLogger(__name__)
+
+TITLE = "Bright Water Foundation Year-End Report"
+# fields the report uses from each table, only these are downloaded
+COLUMNS = {
+    "InitialSurvey": sorted(
+        set(aggregates.DEMOGRAPHICS_COLUMNS) | set(aggregates.FOLLOWUP_COLUMNS)
+    ),
+    "FollowUpSurvey": aggregates.FOLLOWUP_COLUMNS,
+    "CommunityWaterTest": aggregates.WATER_TEST_COLUMNS,
+}
+TABLES = list(COLUMNS)
+# finished reports kept for downloading again, the least recently asked for
+# are dropped beyond this
+MAX_REPORTS = int(os.environ.get("BWF_REPORT_CACHE_SIZE", 8))
+
+STYLE = """
+body { font-family: sans-serif; max-width: 60em; margin: 2em auto; color: #222 }
+table { border-collapse: collapse; margin: 1em 0 }
+th, td { padding: 0.2em 0.8em; text-align: right; border-bottom: 1px solid #ddd }
+th:first-child, td:first-child { text-align: left }
+img { max-width: 100%; display: block; margin: 1em 0 }
+"""
+
+
+def _png(fig: Figure) -> str:
+    """returns an <img> tag with {fig} embedded as a PNG. Figures are made
+    without pyplot so reports can be drawn outside the script thread"""
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png", bbox_inches="tight")
+    data = base64.b64encode(buf.getvalue()).decode()
+    return f'<img src="data:image/png;base64,{data}">'
+
+
+def _bar_chart(
+    data: typing.Union[pd.Series, pd.DataFrame], title: str, ylabel: str
+) -> str:
+    """bar chart of {data}, one group of bars per row"""
+    fig = Figure(figsize=(7, 3.5))
+    ax = fig.subplots()
+    data.plot.bar(ax=ax, title=title, ylabel=ylabel, rot=30)
+    ax.set_xlabel("")
+    ax.grid(axis="y")
+    for label in ax.get_xticklabels():
+        label.set_horizontalalignment("right")
+    return _png(fig)
+
+
+def _table(data: typing.Union[pd.Series, pd.DataFrame]) -> str:
+    if isinstance(data, pd.Series):
+        data = data.to_frame()
+    return data.to_html(float_format="{:.1f}".format, border=0)
+
+
+def _section(title: str, *parts: str) -> str:
+    return f"<h2>{html.escape(title)}</h2>\n" + "\n".join(parts)
+
+
+def _text(text: str) -> str:
+    return f"<p>{html.escape(text)}</p>"
+
+
+def demographics_section(initial: pd.DataFrame, communities: list) -> str:
+    """household make-up and water collection, from the initial survey"""
+    summary = aggregates.demographics_summary(initial, communities)
+    numbers = pd.Series(
+        {
+            "Households surveyed": summary["entries"],
+            "People in surveyed households": summary["total_pop"],
+            "Average household size": summary["average_family_size"],
+            "% under 5 years": summary["pct_under_5"],
+            "% under 12 years": summary["pct_under_12"],
+            "% under 18 years": summary["pct_under_18"],
+            "Average age of head of household": summary["average_age"],
+        },
+        name="",
+    )
+    return _section(
+        "Community Survey Demographics",
+        _table(numbers),
+        _bar_chart(summary["drinking_water_source"], "Drinking Water Source", "%"),
+        _bar_chart(
+            summary["water_collection_frequency"], "Water Collection Frequency", "%"
+        ),
+        _bar_chart(summary["education"], "Head of Household Education", "%"),
+    )
+
+
+def water_treatment_section(comparisons: dict) -> str:
+    """how the answers to the water treatment questions shifted between the
+    surveys"""
+    parts = []
+    for question in comparison.QUESTIONS:
+        if question.kind != "category":
+            continue
+        shares = pd.concat(
+            {
+                wave: comparisons["percent"][wave].get(
+                    question.column, pd.Series(dtype=float)
+                )
+                for wave in comparison.WAVES
+            },
+            axis=1,
+        ).fillna(0)
+        if shares.empty:
+            continue
+        shares.index = shares.index.astype(str)
+        parts += [
+            _text(question.text),
+            _table(shares),
+            _bar_chart(shares, "", "% of Households"),
+        ]
+    return _section("Household Water Treatment", *parts)
+
+
+def water_test_section(communitywater: pd.DataFrame, communities: list) -> str:
+    """Colilert and Petrifilm results of the community water sources"""
+    summary = aggregates.water_test_summary(communitywater, communities)
+    parts = [_text(f"{len(communitywater)} community water source tests.")]
+    for key, title in [("colilert", "Colilert"), ("petrifilm", "Petrifilm")]:
+        data = summary[key].rename(index=str)
+        parts += [_table(data), _bar_chart(data, f"{title} Test Results", "% of Tests")]
+    return _section("Community Water Source Testing", *parts)
+
+
+def illness_section(
+    initial: pd.DataFrame, followup: pd.DataFrame, communities: list
+) -> str:
+    """average days lost to diarrhea illness and medical costs per household
+    in each survey, and their change within the same households"""
+    rows = {}
+    for question in comparison.QUESTIONS:
+        if question.kind not in comparison.TOTAL_KINDS:
+            continue
+        before = initial[question.column].astype(float).mean()
+        after = followup[question.column].astype(float).mean()
+        rows[question.text] = {
+            comparison.WAVES[0]: before,
+            comparison.WAVES[1]: after,
+            "% change": 100 * (after - before) / before if before else float("nan"),
+        }
+    averages = pd.DataFrame.from_dict(rows, orient="index")
+    panel = households.panel_summary(initial, followup, communities)
+    parts = [
+        _text("Average per household in each survey."),
+        _table(averages),
+    ]
+    if not averages.empty:
+        parts.append(
+            _bar_chart(
+                averages[comparison.WAVES].set_axis(
+                    [f"Question {i + 1}" for i in range(len(averages))]
+                ),
+                "",
+                "Average per Household",
+            )
+        )
+    if not panel["changes"].empty:
+        parts += [
+            _text(
+                f"Average change within the {panel['households']} households "
+                "surveyed again."
+            ),
+            _table(panel["changes"]),
+        ]
+    return _section("Illness and Lost Productivity", *parts)
+
+
+def build_report(
+    initial: pd.DataFrame,
+    followup: pd.DataFrame,
+    communitywater: pd.DataFrame,
+    communities: list,
+    title: str = TITLE,
+) -> bytes:
+    """returns a self-contained HTML report of the surveys and water tests
+    of {communities}, with the charts embedded"""
+    comparisons = comparison.compare(initial, followup)
+    body = [
+        f"<h1>{html.escape(title)}</h1>",
+        _text(", ".join(communities)),
+        _text(
+            f"{len(initial)} initial surveys, {len(followup)} follow up surveys. "
+            f"Generated {datetime.datetime.now():%d %B %Y %H:%M}."
+        ),
+        demographics_section(initial, communities),
+        water_treatment_section(comparisons),
+        water_test_section(communitywater, communities),
+        illness_section(initial, followup, communities),
+    ]
+    document = (
+        f'<!DOCTYPE html>\n<html><head><meta charset="utf-8">'
+        f"<title>{html.escape(title)}</title><style>{STYLE}</style></head>\n"
+        "<body>\n" + "\n".join(body) + "\n</body></html>\n"
+    )
+    return document.encode()
+
+
+# reports of the table versions and community selections that have been
+# downloaded, built one at a time in the background, in order of last request.
+# Reports of superseded versions are dropped as soon as a table is refreshed
+_reports: "OrderedDict[tuple, Future]" = OrderedDict()
+_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="report")
+
+
+def _drop_version(old: typing.Union[str, None], new: str) -> None:
+    with _lock:
+        for key in [key for key in _reports if old in key[0]]:
+            del _reports[key]
+
+
+table_cache.on_change(_drop_version)
+
+
+def _build(*args) -> bytes:
+    try:
+        return build_report(*args)
+    except Exception:
+        logger.warning("building the report failed", exc_info=True)
+        raise
+
+
+def request(
+    initial: pd.DataFrame,
+    followup: pd.DataFrame,
+    communitywater: pd.DataFrame,
+    communities: list,
+    title: str = TITLE,
+) -> Future:
+    """returns the future build_report() of the selected rows of each table,
+    starting it in the background unless a report of the same table versions
+    and communities has already been asked for. At most MAX_REPORTS finished
+    reports are kept"""
+    scope = memo.Scope([initial, followup, communitywater], communities)
+    args = (initial, followup, communitywater, communities, title)
+    if scope.versions is None:
+        return _executor.submit(_build, *args)
+    key = (scope.versions, scope.communities, title)
+    with _lock:
+        future = _reports.get(key)
+        started = future is None or (future.done() and future.exception() is not None)
+        if started:
+            future = _reports[key] = _executor.submit(_build, *args)
+        _reports.move_to_end(key)
+    if started:
+        # called right away if it is already done, so not with the lock held
+        future.add_done_callback(_drop_oldest)
+    return future
+
+
+def _drop_oldest(future: Future) -> None:
+    """drops the least recently asked for finished reports beyond
+    MAX_REPORTS"""
+    with _lock:
+        finished = [key for key, built in _reports.items() if built.done()]
+        for key in finished[: max(0, len(finished) - MAX_REPORTS)]:
+            del _reports[key]
@@ -0,0 +1,104 @@
+import threading
+import typing
+
+import pandas as pd
+
+import table_cache
+
+COMMUNITY_COLUMN = "Community"
+DATE_COLUMN = "date"
+WEEKDAYS = ["Mon", "Tues", "Wed", "Thur", "Fr", "Sat", "Sun"]
+
+
+def _empty(dtype: typing.Any) -> pd.Series:
+    """returns no counts, indexed by dates of {dtype}, the dtype of the days
+    counted, so they line up with the counts of other tables. Dates of tables
+    without a datetime column are in UTC like the synced ones"""
+    if not pd.api.types.is_datetime64_any_dtype(dtype):
+        dtype = pd.DatetimeTZDtype(unit="us", tz="UTC")
+    return pd.Series(
+        0, index=pd.DatetimeIndex([], dtype=dtype, name=DATE_COLUMN), dtype=int
+    )
+
+
+class DailyRollup:
+    """number of surveys conducted each day in each community, for one version
+    of a synced table. There are at most a few rows per community and day, so
+    the weekly, monthly and weekday counts of any community selection are
+    summed from these rather than from the survey rows"""
+
+    def __init__(self, frame: pd.DataFrame):
+        days = pd.to_datetime(frame[DATE_COLUMN]).dt.normalize()
+        self.dtype = days.dtype
+        self.counts = frame.groupby(
+            [frame[COMMUNITY_COLUMN], days], observed=True
+        ).size()
+
+    def daily(self, communities: typing.List[str]) -> pd.Series:
+        """returns the number of surveys conducted on each day in
+        {communities}, for the days any were"""
+        counts = self.counts[self.counts.index.get_level_values(0).isin(communities)]
+        if counts.empty:
+            return _empty(self.dtype)
+        return counts.groupby(level=1).sum()
+
+
+# rollup of every table version that has been asked for. Rollups of
+# superseded versions are dropped as soon as the table is refreshed
+_rollups: typing.Dict[str, DailyRollup] = {}
+_lock = threading.Lock()
+table_cache.on_change(lambda old, new: _rollups.pop(old, None))
+
+
+def for_frame(df: pd.DataFrame) -> typing.Union[DailyRollup, None]:
+    """returns the daily rollup of the whole synced table {df} was taken from,
+    or None if it didn't come from one"""
+    version = table_cache.data_version(df)
+    if version is None:
+        return None
+    with _lock:
+        rollup = _rollups.get(version)
+        if rollup is None:
+            frame = table_cache.frame_for_version(version)
+            if frame is None or not {COMMUNITY_COLUMN, DATE_COLUMN} <= set(
+                frame.columns
+            ):
+                return None
+            rollup = _rollups[version] = DailyRollup(frame)
+        return rollup
+
+
+def daily_counts(
+    df: pd.DataFrame, communities: typing.Union[typing.List[str], None] = None
+) -> pd.Series:
+    """returns the number of surveys in {df}, the rows of {communities},
+    conducted on each day. Read from the rollup of the table df came from
+    when df holds just its rows of communities, otherwise df is counted
+    directly"""
+    rollup = None
+    if communities is not None and table_cache.holds(df, COMMUNITY_COLUMN, communities):
+        rollup = for_frame(df)
+    if rollup is not None:
+        return rollup.daily(communities)
+    if DATE_COLUMN not in df.columns:
+        # an empty download has no columns at all
+        return _empty(None)
+    days = pd.to_datetime(df[DATE_COLUMN]).dt.normalize()
+    counts = df.groupby(days).size()
+    return counts if not counts.empty else _empty(days.dtype)
+
+
+def by_period(daily: pd.Series, freq: str) -> pd.Series:
+    """returns the {daily} counts summed per period of {freq}, "W" for weeks
+    ending on Sunday or "MS" for months, with periods without surveys as 0"""
+    if daily.empty:
+        return daily
+    return daily.resample(freq).sum()
+
+
+def by_weekday(daily: pd.Series) -> pd.Series:
+    """returns the {daily} counts summed per day of the week, for the days of
+    the week any surveys were conducted on"""
+    counts = daily.groupby(daily.index.day_of_week).sum()
+    counts = counts[counts > 0]
+    return counts.rename(dict(enumerate(WEEKDAYS))).rename("count")
@@ -0,0 +1,275 @@
+import hashlib
+import os
+import re
+import typing
+
+import pandas as pd
+
+# salt mixed into phone number hashes so they can't be looked up from a list
+# of known numbers
+PHONE_SALT = os.environ.get("BWF_PHONE_SALT", "")
+
+
+def load_question_mapping(path: str) -> pd.DataFrame:
+    """returns the question mapping csv at {path} as a DataFrame with a
+    question (the text asked in the survey app) and key (short name) column"""
+    return pd.read_csv(path).rename(columns={"0": "question", "1": "key"})
+
+
+INITIAL_QUESTIONS = load_question_mapping("initial_questions_mapping.csv")
+FOLLOWUP_QUESTIONS = load_question_mapping("followup_questions_mapping.csv")
+
+# API column for each question key in the mapping files. Questions the
+# dashboard doesn't use yet have no entry and are left as they come
+QUESTION_COLUMNS = {
+    "id": "id",
+    "SWE_name": "Namebwe",
+    "community": "Community",
+    "date": "date",
+    "initial_survey_id": "SurveyId",
+    "hh_name": "HeadHouseholdName",
+    "hh_phone": "HeadHouseholdPhoneNumber",
+    "hh_sex": "HeadHouseholdSex",
+    "hh_marital": "HeadHouseholdMaritalStatus",
+    "hh_age": "HeadHouseholdAge",
+    "hh_occupation": "HeadHouseholdOccupation",
+    "hh_education": "HeadHouseholdEducation",
+    "males_0_1_yr": "NoHouseholdMale0_1Year",
+    "females_0_1_yr": "NoHouseholdFemale0_1Year",
+    "males_1_5_yr": "NoHouseholdMale1_5Year",
+    "females_1_5_yr": "NoHouseholdFemale1_5Year",
+    "males_5_12_yr": "NoHouseholdMale5_12Year",
+    "females_5_12_yr": "NoHouseholdFemale5_12Year",
+    "males_12_17_yr": "NoHouseholdMale13_17Year",
+    "females_12_17_yr": "NoHouseholdFemale13_17Year",
+    "hh_size": "TotalNoPeopleHousehold",
+    "drinking_water_source": "MainSourceDrinkingWater",
+    "nondrinking_water_source": "MainSourceOtherPurposeWater",
+    "minutes_fetch_water": "TimeToWaterSourceGetReturn",
+    "freq_fetch_water": "HouseholdFrequencyAtWaterSource",
+    "who_fetch_water": "UsualHouseholdWaterFetcher",
+    "fetch_water_container": "ContainerCarryWater",
+    "treat_water": "WaterTreatmentBeforeDrinking",
+    "treat_water_freq": "FrequencyWaterTreatment",
+    "treat_water_last_chlorine": "LastTimeTreatedHouseholdWaterWithChlorine",
+    "two_weeks_children_school_days": "NoTotalSchoolDaysMissedBySchoolAgeChildrenIn2LastWeek",
+    "two_weeks_days_work_missed": "NoDaysNoWorkBecauseOfOwnIllness",
+    "two_weeks_days_hh_work_missed": "NoDaysNoWorkBecauseOfIllnessFamilyMembers",
+    "medical_cost_four_weeks_local": "MoneySpentMedicalTreatmentLast4weeks",
+}
+
+# how each question key is stored in memory
+#   category: multiple choice answer, stored as a pandas categorical
+#   count: small non-negative whole number, downcast to the smallest int
+#   number: any other number, downcast where possible
+#   date: parsed to datetime
+#   pii: replaced with a salted hash on ingest, the raw value is never kept
+QUESTION_KINDS = {
+    "community": "category",
+    "date": "date",
+    "hh_phone": "pii",
+    "hh_sex": "category",
+    "hh_marital": "category",
+    "hh_age": "count",
+    "hh_occupation": "category",
+    "hh_education": "category",
+    "males_0_1_yr": "count",
+    "females_0_1_yr": "count",
+    "males_1_5_yr": "count",
+    "females_1_5_yr": "count",
+    "males_5_12_yr": "count",
+    "females_5_12_yr": "count",
+    "males_12_17_yr": "count",
+    "females_12_17_yr": "count",
+    "hh_size": "count",
+    "drinking_water_source": "category",
+    "nondrinking_water_source": "category",
+    "minutes_fetch_water": "count",
+    "freq_fetch_water": "category",
+    "who_fetch_water": "category",
+    "fetch_water_container": "category",
+    "treat_water": "category",
+    "treat_water_freq": "category",
+    "treat_water_last_chlorine": "category",
+    "two_weeks_children_school_days": "count",
+    "two_weeks_days_work_missed": "count",
+    "two_weeks_days_hh_work_missed": "count",
+    "medical_cost_four_weeks_local": "number",
+}
+
+
+def _table_schema(questions: pd.DataFrame) -> typing.Dict[str, str]:
+    """returns {API column: kind} for the questions in a mapping file"""
+    return {
+        QUESTION_COLUMNS[key]: QUESTION_KINDS[key]
+        for key in questions.key
+        if key in QUESTION_COLUMNS and key in QUESTION_KINDS
+    }
+
+
+TABLE_SCHEMAS = {
+    "InitialSurvey": _table_schema(INITIAL_QUESTIONS),
+    "FollowUpSurvey": _table_schema(FOLLOWUP_QUESTIONS),
+    "CommunityWaterTest": {
+        "Community": "category",
+        "date": "date",
+        "ColilertTestResult": "category",
+        "PetrifilmTestResult": "category",
+    },
+}
+
+# column the hash of a pii column is stored in
+HASH_SUFFIX = "Hash"
+# pii columns are hashed in every table, whichever mapping file lists them
+PII_COLUMNS = [
+    QUESTION_COLUMNS[key]
+    for key, kind in QUESTION_KINDS.items()
+    if kind == "pii" and key in QUESTION_COLUMNS
+]
+
+# questions whose answers identify a person, which never leave the dashboard
+# in an export. They are only stripped once they have an API column in
+# QUESTION_COLUMNS, pii columns are stripped along with their hash
+PRIVATE_KEYS = [
+    "hh_name",
+    "hh_phone",
+    "SWE_name",
+    "SWE_email",
+    "interviewee",
+    "latitude",
+    "longitude",
+]
+PRIVATE_COLUMNS = {
+    QUESTION_COLUMNS[key] for key in PRIVATE_KEYS if key in QUESTION_COLUMNS
+} | {column + HASH_SUFFIX for column in PII_COLUMNS}
+
+# memory use of each table before and after apply_schema(), see memory_report()
+_memory_usage: typing.Dict[str, typing.Dict[str, int]] = {}
+
+
+def normalize_phone(phone: str) -> typing.Union[str, None]:
+    """returns the last 9 digits of a phone number, which drops any +233 or
+    leading 0 prefix, or None if it doesn't contain enough digits"""
+    digits = re.sub(r"\D", "", str(phone))
+    return digits[-9:] if len(digits) >= 9 else None
+
+
+def hash_phone(phone: str) -> typing.Union[str, None]:
+    """returns a salted hash of a normalized phone number"""
+    if pd.isna(phone):
+        return None
+    normalized = normalize_phone(phone)
+    if normalized is None:
+        return None
+    return hashlib.sha256((PHONE_SALT + normalized).encode()).hexdigest()[:16]
+
+
+def _downcast(s: pd.Series, kind: str) -> pd.Series:
+    """returns s as the smallest numeric dtype that holds it, or s unchanged if
+    it contains anything that isn't a number"""
+    numeric = pd.to_numeric(s, errors="coerce")
+    if numeric.isna().sum() > s.isna().sum():
+        return s
+    if numeric.isna().any() or (numeric % 1 != 0).any():
+        return pd.to_numeric(numeric, downcast="float")
+    if kind == "count" and (numeric >= 0).all():
+        return pd.to_numeric(numeric, downcast="unsigned")
+    return pd.to_numeric(numeric, downcast="integer")
+
+
+def apply_schema(
+    df: pd.DataFrame, table: str, report: bool = False
+) -> pd.DataFrame:
+    """returns {df} with the dtypes from TABLE_SCHEMAS[table] applied and pii
+    columns replaced by their hash. Columns not in the schema (or missing from
+    df) are left alone, so it is safe to call more than once. If {report} is
+    True the memory use before and after is recorded for memory_report()"""
+    table_schema = {
+        **TABLE_SCHEMAS.get(table, {}),
+        **{column: "pii" for column in PII_COLUMNS},
+    }
+    if report:
+        before = int(df.memory_usage(deep=True).sum())
+
+    converted = {}
+    dropped = []
+    for column, kind in table_schema.items():
+        if column not in df.columns:
+            continue
+        s = df[column]
+        if kind == "category":
+            if not isinstance(s.dtype, pd.CategoricalDtype):
+                try:
+                    converted[column] = s.astype("category")
+                except TypeError:
+                    # multi-select answers come back as lists, which can't be
+                    # categories
+                    pass
+        elif kind in ("count", "number"):
+            converted[column] = _downcast(s, kind)
+        elif kind == "date":
+            converted[column] = pd.to_datetime(s, errors="coerce")
+        elif kind == "pii":
+            converted[column + HASH_SUFFIX] = s.map(hash_phone)
+            dropped.append(column)
+    df = df.drop(columns=dropped).assign(**converted)
+
+    if report:
+        _memory_usage[table] = {
+            "rows": len(df),
+            "bytes_before": before,
+            "bytes_after": int(df.memory_usage(deep=True).sum()),
+        }
+    return df
+
+
+def concat(
+    chunks: typing.List[pd.DataFrame],
+    table: str,
+    bytes_before: typing.Union[int, None] = None,
+) -> pd.DataFrame:
+    """returns the {chunks} of one download of {table}, each with
+    apply_schema() applied, as one frame with the schema applied. Every chunk
+    has categories of its own, they are combined first so the columns stay
+    categorical rather than turning into objects. If {bytes_before}, the
+    memory use of the chunks as downloaded, is given the memory use is
+    recorded for memory_report()"""
+    columns = {column for chunk in chunks for column in chunk.columns}
+    for column in columns:
+        dtypes = [chunk[column].dtype for chunk in chunks if column in chunk.columns]
+        if len(dtypes) < 2 or not all(
+            isinstance(dtype, pd.CategoricalDtype) for dtype in dtypes
+        ):
+            continue
+        categories = dtypes[0].categories
+        for dtype in dtypes[1:]:
+            categories = categories.union(dtype.categories)
+        chunks = [
+            (
+                chunk.assign(**{column: chunk[column].cat.set_categories(categories)})
+                if column in chunk.columns
+                else chunk
+            )
+            for chunk in chunks
+        ]
+    df = apply_schema(pd.concat(chunks, ignore_index=True), table)
+    if bytes_before is not None:
+        _memory_usage[table] = {
+            "rows": len(df),
+            "bytes_before": bytes_before,
+            "bytes_after": int(df.memory_usage(deep=True).sum()),
+        }
+    return df
+
+
+def memory_report() -> pd.DataFrame:
+    """returns the memory used by each ingested table before and after its
+    schema was applied"""
+    report = pd.DataFrame.from_dict(
+        _memory_usage,
+        orient="index",
+        columns=["rows", "bytes_before", "bytes_after"],
+    )
+    return report.assign(
+        saved_pct=lambda df_: (1 - df_.bytes_after / df_.bytes_before).mul(100).round(1)
+    )
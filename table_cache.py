@@ -0,0 +1,445 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import typing
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# column used as the delta-sync watermark. The API returns it as an ISO string,
+# which sorts the same way as the timestamps it represents
+WATERMARK_COLUMN = "createdAt"
+
+# on-disk copy of every synced table so a restarted server can start from a
+# local file read instead of an API pull
+CACHE_DIR = os.environ.get("BWF_CACHE_DIR", ".bwf_cache")
+DISK_TTL = float(os.environ.get("BWF_DISK_CACHE_TTL", 3600 * 24 * 7))  # 1 week
+DISK_MAX_BYTES = int(os.environ.get("BWF_DISK_CACHE_MAX_MB", 512)) * 1024 * 1024
+# memory the stored frames may use before the least recently used ones are
+# dropped. They stay in the disk cache, so they are read from there if asked
+# for again
+MEMORY_MAX_BYTES = int(os.environ.get("BWF_MEMORY_CACHE_MAX_MB", 1024)) * 1024 * 1024
+
+
+class TableKey(typing.NamedTuple):
+    """key Home stores a synced table under: the query and extra of its
+    download, the communities the API filtered it to (None for every
+    community) and the version of the ingest pipeline it went through"""
+
+    table: str
+    query: str
+    extra: str
+    communities: typing.Union[typing.Tuple[str, ...], None]
+    ingest_version: int
+
+
+@dataclass
+class TableState:
+    """last synced copy of a table along with its watermark. version changes
+    whenever the rows of the frame do"""
+
+    frame: pd.DataFrame
+    watermark: typing.Union[str, None]
+    synced_at: float
+    full_synced_at: float
+    version: str = ""
+    nbytes: int = 0
+
+    def __post_init__(self):
+        if not self.version:
+            self.version = uuid.uuid4().hex
+        if not self.nbytes:
+            self.nbytes = int(self.frame.memory_usage(deep=True).sum())
+        # travels with the frame (and copies of it), see data_version()
+        self.frame.attrs["version"] = self.version
+
+
+# in order of last use, see _store()
+_states: "OrderedDict[typing.Hashable, TableState]" = OrderedDict()
+_lock = threading.Lock()
+# partition of each stored frame by a column, see partition()
+_partitions: typing.Dict[typing.Tuple[str, str], "Partition"] = {}
+# called with (old version, new version) whenever a stored table changes, see
+# on_change()
+_listeners: typing.List[
+    typing.Callable[[typing.Union[str, None], typing.Union[str, None]], None]
+] = []
+
+
+def data_version(df: pd.DataFrame) -> typing.Union[str, None]:
+    """returns the version of the synced table df was taken from, or None if
+    it didn't come from one"""
+    return df.attrs.get("version")
+
+
+def frame_for_version(version: str) -> typing.Union[pd.DataFrame, None]:
+    """returns the whole stored frame with the given version, or None if no
+    stored table has it (any more)"""
+    with _lock:
+        for state in _states.values():
+            if state.version == version:
+                return state.frame
+    return None
+
+
+@dataclass
+class Partition:
+    """positions of the rows of a stored frame with each value of one column,
+    in the order they are stored. Rows are taken from the stored frame
+    itself, so only the positions add to the memory it uses"""
+
+    rows: typing.Dict[typing.Hashable, np.ndarray]
+
+
+def partition(version: str, column: str) -> typing.Union[Partition, None]:
+    """returns the partition by {column} of the stored frame with {version},
+    built the first time it is asked for. None if there is no such frame"""
+    with _lock:
+        part = _partitions.get((version, column))
+    if part is not None:
+        return part
+    frame = frame_for_version(version)
+    if frame is None or column not in frame.columns:
+        return None
+    part = Partition(rows=frame.groupby(column, observed=True).indices)
+    with _lock:
+        # don't keep partitions of a version that was replaced meanwhile
+        if any(state.version == version for state in _states.values()):
+            _partitions[(version, column)] = part
+    return part
+
+
+def holds(df: pd.DataFrame, column: str, values: typing.Iterable) -> bool:
+    """True if df holds the rows of the stored table it came from with one of
+    {values} in {column}, as select() returns them. Aggregates of the whole
+    table can only stand in for df then"""
+    version = data_version(df)
+    part = None if version is None else partition(version, column)
+    if part is None:
+        return False
+    rows = sum(len(part.rows[v]) for v in set(values) if v in part.rows)
+    return len(df) == rows
+
+
+def select(df: pd.DataFrame, column: str, values: typing.Iterable) -> pd.DataFrame:
+    """returns the rows of df with one of {values} in {column}. If df is a
+    whole stored table the rows are taken by their positions in its partition
+    by {column} instead of scanning df, otherwise df is filtered directly"""
+    version = data_version(df)
+    frame = None if version is None else frame_for_version(version)
+    part = None
+    # frames taken from a stored table (like a subset of its rows) carry its
+    # version too, but only the table itself holds all of its rows
+    if frame is not None and len(df) == len(frame):
+        part = partition(version, column)
+    if part is None:
+        return df[df[column].isin(values)]
+
+    positions = [part.rows[v] for v in set(values) if v in part.rows]
+    if not positions:
+        return frame.iloc[:0]
+    if len(positions) == 1:
+        return frame.take(positions[0])
+    # in their stored order, like filtering df would
+    return frame.take(np.sort(np.concatenate(positions)))
+
+
+def on_change(
+    callback: typing.Callable[[typing.Union[str, None], typing.Union[str, None]], None],
+) -> None:
+    """register callback(old_version, new_version) to be called whenever a
+    stored table is replaced by a new version. old_version is None when a
+    table is stored (or loaded from disk) for the first time, new_version is
+    None when it is dropped from memory, see MEMORY_MAX_BYTES"""
+    _listeners.append(callback)
+
+
+def _drop_partitions(
+    old: typing.Union[str, None], new: typing.Union[str, None]
+) -> None:
+    with _lock:
+        for key in [key for key in _partitions if key[0] == old]:
+            del _partitions[key]
+
+
+on_change(_drop_partitions)
+
+
+def _notify(old: typing.Union[TableState, None], new: TableState) -> None:
+    if old is not None and old.version == new.version:
+        return
+    for callback in _listeners:
+        callback(None if old is None else old.version, new.version)
+
+
+def _store(key: typing.Hashable, state: TableState) -> typing.List[TableState]:
+    """stores {state} for key as the most recently used table, and drops the
+    least recently used others beyond MEMORY_MAX_BYTES. Returns the dropped
+    states, to be passed to _dropped() once the lock is released. Must be
+    called with the lock held"""
+    _states[key] = state
+    _states.move_to_end(key)
+    total = sum(stored.nbytes for stored in _states.values())
+    dropped = []
+    for oldest in list(_states):
+        if total <= MEMORY_MAX_BYTES:
+            break
+        if oldest == key:
+            continue
+        dropped.append(_states.pop(oldest))
+        total -= dropped[-1].nbytes
+    return dropped
+
+
+def _dropped(states: typing.List[TableState]) -> None:
+    for state in states:
+        logger.info("dropped table version %s from memory", state.version)
+        for callback in _listeners:
+            callback(state.version, None)
+
+
+def get_state(key: typing.Hashable) -> typing.Union[TableState, None]:
+    """returns the stored TableState for key. Falls back to the on-disk copy
+    when the table has not been synced in this process yet. Returns None if
+    neither exists"""
+    with _lock:
+        state = _states.get(key)
+        if state is not None:
+            _states.move_to_end(key)
+    if state is not None:
+        return state
+    # read the disk copy without holding the lock, so other tables can be
+    # read and stored meanwhile
+    loaded = load(key)
+    if loaded is None:
+        return None
+    with _lock:
+        state = _states.get(key)
+        if state is not None:
+            # synced (or loaded by another session) meanwhile
+            return state
+        state = loaded
+        dropped = _store(key, state)
+    _dropped(dropped)
+    _notify(None, state)
+    return state
+
+
+def stored() -> typing.List[typing.Tuple[typing.Hashable, TableState]]:
+    """returns (key, TableState) of every table stored in this process"""
+    with _lock:
+        return list(_states.items())
+
+
+def needs_full_sync(state: typing.Union[TableState, None], max_age: float) -> bool:
+    """True if there is no stored state, no watermark to sync from or the last
+    full sync is older than max_age seconds"""
+    return (
+        state is None
+        or state.watermark is None
+        or time.time() - state.full_synced_at > max_age
+    )
+
+
+def compute_watermark(
+    df: pd.DataFrame, previous: typing.Union[str, None] = None
+) -> typing.Union[str, None]:
+    """returns the largest watermark value in df (or previous if that is
+    larger)"""
+    if df.empty or WATERMARK_COLUMN not in df.columns:
+        return previous
+    latest = df[WATERMARK_COLUMN].dropna().max()
+    if pd.isna(latest):
+        return previous
+    if previous is None:
+        return latest
+    return max(previous, latest)
+
+
+def replace(key: typing.Hashable, df: pd.DataFrame) -> TableState:
+    """store the result of a full sync for key"""
+    now = time.time()
+    state = TableState(
+        frame=df,
+        watermark=compute_watermark(df),
+        synced_at=now,
+        full_synced_at=now,
+    )
+    with _lock:
+        old = _states.get(key)
+        dropped = _store(key, state)
+    save(key, state)
+    _dropped(dropped)
+    _notify(old, state)
+    return state
+
+
+def merge(
+    key: typing.Hashable,
+    new_rows: pd.DataFrame,
+    removed_ids: typing.Iterable = (),
+    sort_by: str = "date",
+    prepare: typing.Union[typing.Callable[[pd.DataFrame], pd.DataFrame], None] = None,
+) -> TableState:
+    """merge the rows of a delta sync into the stored frame for key.
+    Rows whose id is in removed_ids (e.g. records that were disabled since
+    the last sync) are dropped. New rows replace stored rows with the same id.
+    If given, prepare is applied to the merged frame before it is stored.
+    The merge runs without holding the lock, if another sync stored a new
+    version of key meanwhile that version is kept and returned instead"""
+    old = get_state(key)
+    if old is None:
+        raise KeyError(key)
+    frame = old.frame
+    removed = set(removed_ids)
+    if not new_rows.empty:
+        removed |= set(new_rows.id)
+    if removed and not frame.empty:
+        frame = frame[~frame.id.isin(removed)]
+    if new_rows.empty and len(frame) == len(old.frame):
+        # nothing changed, keep the version (and everything cached for it)
+        old.synced_at = time.time()
+        return old
+    if not new_rows.empty:
+        frame = pd.concat([frame, new_rows], ignore_index=True)
+        if sort_by in frame.columns:
+            frame = frame.sort_values(sort_by, kind="stable", ignore_index=True)
+    elif removed:
+        frame = frame.reset_index(drop=True)
+    if prepare is not None:
+        frame = prepare(frame)
+    state = TableState(
+        frame=frame,
+        watermark=compute_watermark(new_rows, old.watermark),
+        synced_at=time.time(),
+        full_synced_at=old.full_synced_at,
+    )
+    return _swap(key, old, state) or get_state(key)
+
+
+def update(
+    key: typing.Hashable, old: TableState, frame: pd.DataFrame
+) -> typing.Union[TableState, None]:
+    """store {frame}, worked out from the frame of {old} without syncing (e.g.
+    with derived columns recomputed), as a new version of key with the same
+    watermark and sync times. Returns None and stores nothing if key doesn't
+    hold {old} any more"""
+    state = TableState(
+        frame=frame,
+        watermark=old.watermark,
+        synced_at=old.synced_at,
+        full_synced_at=old.full_synced_at,
+    )
+    return _swap(key, old, state)
+
+
+def _swap(
+    key: typing.Hashable, old: TableState, state: TableState
+) -> typing.Union[TableState, None]:
+    """stores {state} for key if it still holds {old}, returns None otherwise"""
+    with _lock:
+        if _states.get(key) is not old:
+            return None
+        dropped = _store(key, state)
+    save(key, state)
+    _dropped(dropped)
+    _notify(old, state)
+    return state
+
+
+def _paths(key: typing.Hashable) -> typing.Tuple[str, str]:
+    """returns the (parquet, metadata) file paths for key"""
+    digest = hashlib.sha1(repr(key).encode()).hexdigest()
+    return (
+        os.path.join(CACHE_DIR, f"{digest}.parquet"),
+        os.path.join(CACHE_DIR, f"{digest}.json"),
+    )
+
+
+def save(key: typing.Hashable, state: TableState) -> None:
+    """write state to the disk cache and evict old entries. Failures are
+    logged and ignored, the disk cache is only an optimisation"""
+    data_path, meta_path = _paths(key)
+    meta = {
+        "key": repr(key),
+        "version": state.version,
+        "watermark": state.watermark,
+        "synced_at": state.synced_at,
+        "full_synced_at": state.full_synced_at,
+    }
+    # write to temporary files first so a crash never leaves a torn entry
+    tmp = f".{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        state.frame.to_parquet(data_path + tmp, index=False)
+        with open(meta_path + tmp, "w") as f:
+            json.dump(meta, f)
+        os.replace(data_path + tmp, data_path)
+        os.replace(meta_path + tmp, meta_path)
+    except Exception:
+        logger.warning("could not write %r to the disk cache", key, exc_info=True)
+        return
+    evict()
+
+
+def load(key: typing.Hashable) -> typing.Union[TableState, None]:
+    """returns the TableState stored on disk for key, or None if there is no
+    entry or it is older than DISK_TTL"""
+    data_path, meta_path = _paths(key)
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if time.time() - meta["synced_at"] > DISK_TTL:
+            return None
+        frame = pd.read_parquet(data_path)
+    except FileNotFoundError:
+        return None
+    except Exception:
+        logger.warning("could not read %r from the disk cache", key, exc_info=True)
+        return None
+    return TableState(
+        frame=frame,
+        watermark=meta["watermark"],
+        synced_at=meta["synced_at"],
+        full_synced_at=meta["full_synced_at"],
+        version=meta["version"],
+    )
+
+
+def evict() -> None:
+    """delete disk cache entries older than DISK_TTL, then the least recently
+    synced entries until the cache is smaller than DISK_MAX_BYTES"""
+    entries = []
+    for name in os.listdir(CACHE_DIR):
+        if not name.endswith(".json"):
+            continue
+        meta_path = os.path.join(CACHE_DIR, name)
+        data_path = meta_path[: -len(".json")] + ".parquet"
+        try:
+            with open(meta_path) as f:
+                synced_at = json.load(f)["synced_at"]
+            size = os.path.getsize(data_path) + os.path.getsize(meta_path)
+        except (OSError, ValueError, KeyError):
+            continue
+        entries.append((synced_at, size, data_path, meta_path))
+
+    entries.sort()
+    total = sum(entry[1] for entry in entries)
+    now = time.time()
+    for synced_at, size, data_path, meta_path in entries:
+        if now - synced_at <= DISK_TTL and total <= DISK_MAX_BYTES:
+            break
+        for path in (data_path, meta_path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        total -= size
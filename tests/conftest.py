@@ -0,0 +1,48 @@
+import os
+import sys
+import tempfile
+
+import pandas as pd
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# schema reads the question mappings relative to the repo, and nothing may
+# sync in the background or write to the real disk cache while testing
+os.chdir(ROOT)
+os.environ["BWF_WARMUP"] = "0"
+os.environ["BWF_PRECOMPUTE_PROJECTS"] = "0"
+os.environ["BWF_CACHE_DIR"] = tempfile.mkdtemp(prefix="bwf_cache_")
+
+import schema  # noqa: E402
+import table_cache  # noqa: E402
+from tools import synthetic_data  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def tables() -> dict:
+    """synthetic InitialSurvey, FollowUpSurvey and CommunityWaterTest records,
+    with the schema applied as if they were downloaded"""
+    data = synthetic_data.generate(scale=1)
+    return {
+        name: schema.apply_schema(pd.DataFrame(records), name)
+        for name, records in data.items()
+        if name in schema.TABLE_SCHEMAS
+    }
+
+
+@pytest.fixture
+def store():
+    """stores frames in table_cache under a fresh key each and returns the
+    stored copy, as get_data() does"""
+    keys = []
+
+    def _store(df: pd.DataFrame) -> pd.DataFrame:
+        key = ("test", len(keys), id(keys))
+        keys.append(key)
+        return table_cache.replace(key, df.copy()).frame
+
+    yield _store
+    with table_cache._lock:
+        for key in keys:
+            table_cache._states.pop(key, None)
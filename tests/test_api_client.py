@@ -0,0 +1,51 @@
+import time
+
+import jwt
+import pytest
+
+import api_client
+
+
+def _token(lifetime: float) -> str:
+    return jwt.encode({"exp": int(time.time() + lifetime)}, "x" * 32)
+
+
+@pytest.fixture
+def manager():
+    managers = []
+
+    def _manager(fetch, margin=300):
+        managers.append(api_client.TokenManager(fetch, margin))
+        return managers[-1]
+
+    yield _manager
+    for manager in managers:
+        if manager._timer is not None:
+            manager._timer.cancel()
+
+
+def test_token_is_refreshed_before_it_expires(manager):
+    tokens = manager(lambda: _token(3600), margin=300)
+    tokens.get()
+    assert tokens._timer.interval == pytest.approx(3300, abs=2)
+
+
+def test_expired_tokens_are_not_refreshed_right_away(manager):
+    fetched = []
+    tokens = manager(lambda: fetched.append(1) or _token(-10))
+    token = tokens.get()
+    assert tokens.get() == token
+    assert len(fetched) == 1
+    assert tokens._timer.interval == api_client.TOKEN_MIN_REFRESH
+
+
+def test_failed_background_refreshes_back_off(manager):
+    def fail():
+        raise api_client.AuthError("rejected")
+
+    tokens = manager(fail, margin=100)
+    delays = []
+    for _ in range(4):
+        tokens._refresh_in_background()
+        delays.append(tokens._timer.interval)
+    assert delays == [30, 60, 100, 100]
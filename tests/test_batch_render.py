@@ -0,0 +1,41 @@
+import json
+import os
+import subprocess
+import sys
+
+from tools import mock_api, synthetic_data
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_renders_every_page_from_the_mock_api(tmp_path):
+    server, api = mock_api.serve(synthetic_data.generate(scale=1))
+    env = dict(
+        os.environ,
+        API_SERVER_URL=f"http://127.0.0.1:{server.server_address[1]}",
+        CERT_NAME="mock",
+        ENCODED_CERT="mock",
+        PUBLIC_KEY=api.public_key.decode(),
+        BWF_CACHE_DIR=str(tmp_path / "cache"),
+    )
+    out = tmp_path / "renders"
+    try:
+        # run as the command line does, so the pages run as __main__ while the
+        # workers are handed their tasks
+        result = subprocess.run(
+            [sys.executable, "-m", "tools.batch_render"]
+            + ["--out", str(out), "--workers", "2"],
+            cwd=ROOT,
+            env=env,
+            capture_output=True,
+            text=True,
+            timeout=300,
+        )
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert result.returncode == 0, result.stderr[-2000:]
+    assert "failed 0" in result.stdout
+    manifest = json.loads((out / "manifest.json").read_text())
+    assert manifest
+    assert all((out / path).is_file() for path in manifest)
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import comparison
+
+
+def _percent(s: pd.Series) -> dict:
+    """{answer: percent} of the answers given, missing answers under None"""
+    return {
+        (None if pd.isna(answer) else answer): value
+        for answer, value in s.items()
+        if value > 0
+    }
+
+
+def _without_answers(df: pd.DataFrame) -> pd.DataFrame:
+    """df with every third answer to the compared questions missing"""
+    df = df.copy()
+    columns = [column for column in comparison.COLUMNS if column in df.columns]
+    df.loc[df.index[::3], columns] = np.nan
+    return df
+
+
+@pytest.fixture(params=["every community", "one community", "missing answers"])
+def surveys(request, tables):
+    initial, followup = tables["InitialSurvey"], tables["FollowUpSurvey"]
+    if request.param == "one community":
+        community = initial.Community.iloc[0]
+        initial = initial[initial.Community == community]
+        followup = followup[followup.Community == community]
+    elif request.param == "missing answers":
+        initial, followup = _without_answers(initial), _without_answers(followup)
+    return initial, followup
+
+
+def test_compare_matches_value_counts(surveys):
+    initial, followup = surveys
+    result = comparison.compare(initial, followup)
+    for wave, df in zip(comparison.WAVES, surveys):
+        for question in comparison.QUESTIONS:
+            if question.kind not in comparison.DISTRIBUTION_KINDS:
+                continue
+            if question.column in df.columns:
+                answers = df[question.column]
+            else:
+                answers = pd.Series(np.nan, index=df.index)
+            expected = (
+                answers.value_counts(normalize=True, dropna=question.kind != "category")
+                .mul(100)
+                .round(2)
+            )
+            percent = result["percent"][wave].get(question.column)
+            if expected.empty:
+                assert percent is None, (wave, question.column)
+                continue
+            assert _percent(percent) == pytest.approx(_percent(expected)), (
+                wave,
+                question.column,
+            )
+            assert list(percent) == sorted(percent, reverse=True)
+
+
+def test_compare_totals(surveys):
+    result = comparison.compare(*surveys)
+    for wave, df in zip(comparison.WAVES, surveys):
+        for question in comparison.QUESTIONS:
+            if question.kind not in comparison.TOTAL_KINDS:
+                continue
+            expected = df.reindex(columns=[question.column])[question.column].sum()
+            assert result["total"][wave][question.column] == pytest.approx(expected)
@@ -0,0 +1,53 @@
+import pandas as pd
+
+import aggregates
+import cube
+import table_cache
+
+COLUMN = "HeadHouseholdSex"
+
+
+def _selection(stored: pd.DataFrame) -> list:
+    return list(stored.Community.dropna().unique())[:3]
+
+
+def test_value_counts_of_selected_rows(tables, store):
+    stored = store(tables["InitialSurvey"])
+    communities = _selection(stored)
+    selected = table_cache.select(stored, "Community", communities)
+    assert table_cache.holds(selected, "Community", communities)
+    for kwargs in [{}, {"normalize": True}, {"dropna": False}]:
+        counts = cube.value_counts(selected, COLUMN, communities, **kwargs)
+        expected = selected[COLUMN].value_counts(**kwargs)
+        pd.testing.assert_series_equal(
+            counts.sort_index(), expected.sort_index(), check_index_type=False
+        )
+
+
+def test_value_counts_mapped(tables, store):
+    stored = store(tables["InitialSurvey"])
+    communities = _selection(stored)
+    selected = table_cache.select(stored, "Community", communities)
+    column = "HeadHouseholdOccupation"
+    counts = cube.value_counts(
+        selected, column, communities, mapping=aggregates.OCC_MAPPING
+    )
+    expected = selected[column].map(aggregates.OCC_MAPPING).value_counts()
+    assert counts.sort_index().to_dict() == expected.sort_index().to_dict()
+
+
+def test_value_counts_of_a_subset(tables, store):
+    stored = store(tables["InitialSurvey"])
+    communities = _selection(stored)
+    # the subset carries the version of the stored frame, but not its rows
+    subset = table_cache.select(stored, "Community", communities).head(10)
+    assert not table_cache.holds(subset, "Community", communities)
+    counts = cube.value_counts(subset, COLUMN, communities)
+    assert counts.sum() == subset[COLUMN].notna().sum()
+
+
+def test_value_counts_of_unstored_frame(tables):
+    df = tables["InitialSurvey"].head(50).copy()
+    df.attrs.clear()
+    counts = cube.value_counts(df, COLUMN, list(df.Community.unique()))
+    pd.testing.assert_series_equal(counts, df[COLUMN].value_counts())
@@ -0,0 +1,70 @@
+import pandas as pd
+
+import duplicates
+
+
+def _records(names, communities=None, phones=None) -> pd.DataFrame:
+    df = pd.DataFrame(
+        {
+            "id": [f"r{i}" for i in range(len(names))],
+            "Community": communities or ["Kpalsogu"] * len(names),
+            "HeadHouseholdName": names,
+        }
+    )
+    if phones is not None:
+        df["HeadHouseholdPhoneNumberHash"] = phones
+    return df
+
+
+def test_similar_names_cluster():
+    df = _records(["Kofi Mensah", "Mensah  kofi", "Kofi Mensa", "Ama Owusu"])
+    result = duplicates.find_duplicates(df)
+    assert set(result.id) == {"r0", "r1", "r2"}
+    assert result.cluster.nunique() == 1
+    assert 0.6 <= result.score.iloc[0] < 1
+
+
+def test_exact_names_score_one():
+    result = duplicates.find_duplicates(_records(["Kofi Mensah", "kofi mensah"]))
+    assert list(result.score) == [1.0, 1.0]
+
+
+def test_only_compared_within_a_community():
+    df = _records(["Kofi Mensah", "Kofi Mensah"], communities=["Kpalsogu", "Tampe"])
+    assert duplicates.find_duplicates(df).empty
+
+
+def test_same_phone_clusters():
+    df = _records(["Kofi Mensah", "Ama Owusu", "Yaw Boateng"], phones=["a", "a", None])
+    result = duplicates.find_duplicates(df)
+    assert set(result.id) == {"r0", "r1"}
+
+
+def test_no_names():
+    # nothing to hash, which MinHash can't reduce
+    for df in [_records([None, None]), _records([]), pd.DataFrame()]:
+        result = duplicates.find_duplicates(df)
+        assert result.empty
+        assert {"cluster", "score", "Community"} <= set(result.columns)
+
+
+def test_duplicate_households_of_stored_table(tables, store):
+    frame = store(tables["InitialSurvey"])
+    communities = list(frame.Community.cat.categories[:3])
+    result = duplicates.duplicate_households(frame, communities)
+    expected = duplicates.find_duplicates(frame)
+    expected = expected[expected.Community.isin(communities)].reset_index(drop=True)
+    pd.testing.assert_frame_equal(result, expected)
+    assert duplicates.duplicate_households(frame, []).empty
+
+
+def test_duplicate_households_of_a_subset(tables, store):
+    frame = store(tables["InitialSurvey"])
+    communities = list(frame.Community.cat.categories)
+    # the subset carries the version of the stored frame, but not its rows
+    subset = pd.concat(
+        [frame.head(30), frame.head(30).assign(id=lambda df: df.id + "x")]
+    )
+    result = duplicates.duplicate_households(subset, communities)
+    assert set(result.id) <= set(subset.id)
+    assert len(result) >= 60
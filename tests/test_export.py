@@ -0,0 +1,48 @@
+import io
+
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+from streamlit.runtime.download_data_util import convert_data_to_bytes_and_infer_mime
+
+import export
+
+
+def test_parquet_types_come_from_every_chunk(monkeypatch):
+    monkeypatch.setattr(export, "CHUNK_ROWS", 37)
+    df = pd.DataFrame(
+        {
+            # empty in the first chunk
+            "late": pd.Series([None] * 40 + [1, 2, 3], dtype=object),
+            "mixed": pd.Series([1, "x"] * 21 + [None], dtype=object),
+            "empty": pd.Series([None] * 43, dtype=object),
+        }
+    )
+    table = pq.read_table(export.export(df, "Parquet"))
+    assert table.column("late").to_pylist() == [None] * 40 + [1, 2, 3]
+    assert table.column("mixed").to_pylist() == ["1", "x"] * 21 + [None]
+    assert table.column("empty").null_count == 43
+
+
+def test_parquet_keeps_the_schema_of_synced_tables(tables, monkeypatch):
+    monkeypatch.setattr(export, "CHUNK_ROWS", 100)
+    df = tables["InitialSurvey"]
+    written = pq.read_table(export.export(df, "Parquet")).to_pandas()
+    assert list(written.columns) == export.export_columns(df)
+    assert len(written) == len(df)
+    assert isinstance(written.Community.dtype, pd.CategoricalDtype)
+
+
+@pytest.mark.parametrize("fmt", list(export.FORMATS))
+def test_downloads_accept_every_format(tables, fmt):
+    df = tables["CommunityWaterTest"]
+    data, _ = convert_data_to_bytes_and_infer_mime(
+        export.export(df, fmt), TypeError("unsupported")
+    )
+    assert data
+    if fmt == "CSV":
+        assert len(pd.read_csv(io.BytesIO(data))) == len(df)
+    elif fmt == "Parquet":
+        assert pq.read_table(io.BytesIO(data)).num_rows == len(df)
+    else:
+        assert len(pd.read_excel(io.BytesIO(data))) == len(df)
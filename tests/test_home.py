@@ -0,0 +1,38 @@
+import pytest
+
+import Home
+import api_client
+import table_cache
+
+
+@pytest.fixture
+def stored(tables):
+    """stores the initial surveys under the key get_data() serves them from"""
+    key = Home.table_key("InitialSurvey", ["Community"])
+    state = table_cache.replace(key, tables["InitialSurvey"][["Community"]].copy())
+    Home.get_data.clear()
+    yield state
+    Home.get_data.clear()
+    with table_cache._lock:
+        table_cache._states.pop(key, None)
+
+
+@pytest.fixture
+def tokens(monkeypatch):
+    """records the get_api_token() calls instead of asking the API"""
+    calls = []
+    monkeypatch.setattr(Home, "get_api_token", lambda: calls.append(1))
+    return calls
+
+
+def test_no_token_while_the_api_is_down(stored, tokens, monkeypatch):
+    monkeypatch.setattr(api_client.breaker, "is_open", lambda: True)
+    stored.synced_at = 0  # would be synced if the API was up
+    (df,) = Home.get_tables(["InitialSurvey"], {"InitialSurvey": ["Community"]})
+    assert df.equals(stored.frame)
+    assert tokens == []
+
+
+def test_no_token_for_fresh_tables(stored, tokens):
+    Home.get_tables(["InitialSurvey"], {"InitialSurvey": ["Community"]})
+    assert tokens == []
@@ -0,0 +1,78 @@
+import pandas as pd
+import pytest
+
+import households
+import schema
+from tools import synthetic_data
+
+
+@pytest.fixture(scope="module")
+def raw() -> dict:
+    return {
+        name: pd.DataFrame(records)
+        for name, records in synthetic_data.generate(scale=1).items()
+    }
+
+
+def _followups(initial_raw: pd.DataFrame, **changes) -> pd.DataFrame:
+    """raw follow up records revisiting the first households of the initial
+    survey records, with {changes} made to them"""
+    df = initial_raw.head(20)[
+        ["id", "Community", "date", "SurveyId", "HeadHouseholdName"]
+        + ["HeadHouseholdPhoneNumber"]
+    ].copy()
+    df["initial_id"] = df["id"]
+    df["id"] = "followup-" + df["id"]
+    return df.assign(**changes)
+
+
+def test_links_by_survey_id(tables):
+    links = households.for_frame(tables["InitialSurvey"]).link(
+        tables["FollowUpSurvey"]
+    )
+    truth = tables["FollowUpSurvey"].set_index("id").SurveyId
+    assert (links.household_id == truth.reindex(links.index)).all()
+    assert (links.match == "survey id").all()
+
+
+def test_links_by_phone_only(raw, tables):
+    followup = _followups(
+        raw["InitialSurvey"],
+        SurveyId=None,
+        HeadHouseholdName=[f"Someone Else {i}" for i in range(20)],
+    )
+    # the phone number as the follow up app records it, with the country code
+    followup["HeadHouseholdPhoneNumber"] = (
+        "+233 " + followup.HeadHouseholdPhoneNumber.str[1:]
+    )
+    followup = schema.apply_schema(followup, "FollowUpSurvey")
+    links = households.for_frame(tables["InitialSurvey"]).link(followup)
+    links = links.reindex(followup.id)
+    assert (links.match == "phone").all()
+    assert (links.initial_id.to_numpy() == followup.initial_id.to_numpy()).all()
+
+
+def test_links_by_name_and_phone(raw, tables):
+    followup = schema.apply_schema(
+        _followups(raw["InitialSurvey"], SurveyId=None), "FollowUpSurvey"
+    )
+    links = households.for_frame(tables["InitialSurvey"]).link(followup)
+    assert (links.reindex(followup.id).match == "name and phone").all()
+
+
+def test_ambiguous_names_are_left_unlinked(tables):
+    initial = tables["InitialSurvey"].head(2).assign(
+        HeadHouseholdName="Kofi Mensah",
+        Community="Same",
+        SurveyId=None,
+        HeadHouseholdPhoneNumberHash=None,
+    )
+    followup = initial.head(1).assign(id="followup")
+    links = households.HouseholdIndex(initial).link(followup)
+    assert links.match.tolist() == [households.UNLINKED]
+    assert links.household_id.isna().all()
+
+
+def test_link_an_empty_follow_up_table(tables):
+    links = households.for_frame(tables["InitialSurvey"]).link(pd.DataFrame([]))
+    assert links.empty
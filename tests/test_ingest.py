@@ -0,0 +1,93 @@
+import pandas as pd
+import pytest
+
+import ingest
+import table_cache
+
+
+def _key(table: str, n: int = 0) -> table_cache.TableKey:
+    return table_cache.TableKey(table, f"test {n}", "", None, ingest.VERSION)
+
+
+@pytest.fixture
+def keys():
+    """TableKeys to store synced tables under, removed again afterwards"""
+    used = []
+
+    def _make(table: str) -> table_cache.TableKey:
+        key = _key(table, len(used))
+        used.append(key)
+        return key
+
+    yield _make
+    with table_cache._lock:
+        for key in used:
+            table_cache._states.pop(key, None)
+
+
+def test_prepare_matches_deriving_on_the_page(tables):
+    initial = ingest.prepare(tables["InitialSurvey"], "InitialSurvey")
+    followup = ingest.prepare(
+        tables["FollowUpSurvey"],
+        "FollowUpSurvey",
+        ingest.first_survey_dates(initial),
+    )
+    first = initial.groupby("Community", observed=True).date.min()
+    expected = (
+        tables["FollowUpSurvey"].date
+        - tables["FollowUpSurvey"].Community.astype(object).map(first)
+    ).dt.days
+    assert (followup.sinceEarliest.to_numpy() == expected.to_numpy()).all()
+    assert (initial.sinceEarliest >= 0).all()
+
+
+def test_prepare_strips_free_text(tables):
+    df = tables["InitialSurvey"].head(3).copy()
+    df.loc[df.index[0], "HeadHouseholdName"] = "  Ama Mensah "
+    assert ingest.prepare(df, "InitialSurvey").HeadHouseholdName.iloc[0] == (
+        "Ama Mensah"
+    )
+
+
+def test_prepare_an_empty_download(tables):
+    first_dates = ingest.first_survey_dates(tables["InitialSurvey"])
+    df = ingest.prepare(pd.DataFrame([]), "FollowUpSurvey", first_dates)
+    assert df.empty
+    assert {ingest.FIRST_DATE_COLUMN, ingest.SINCE_EARLIEST_COLUMN} <= set(df.columns)
+    assert ingest.prepare(pd.DataFrame([]), "InitialSurvey").empty
+
+
+def test_follow_ups_need_first_dates(tables):
+    with pytest.raises(ValueError):
+        ingest.prepare(tables["FollowUpSurvey"], "FollowUpSurvey")
+
+
+def test_follow_ups_are_derived_again_when_initial_surveys_change(tables, keys):
+    initial = ingest.prepare(tables["InitialSurvey"], "InitialSurvey")
+    initial_key = keys("InitialSurvey")
+    table_cache.replace(initial_key, initial)
+    followup_key = keys("FollowUpSurvey")
+    table_cache.replace(
+        followup_key,
+        ingest.prepare(
+            tables["FollowUpSurvey"],
+            "FollowUpSurvey",
+            ingest.first_survey_dates(initial),
+        ),
+    )
+    community = tables["FollowUpSurvey"].Community.iloc[0]
+
+    # an initial survey turns up from before the community's first one
+    earlier = initial[initial.Community == community].head(1).copy()
+    earlier["id"] = "earlier"
+    earlier["date"] -= pd.Timedelta(days=30)
+    table_cache.merge(
+        initial_key,
+        earlier,
+        prepare=lambda df: ingest.prepare(df, "InitialSurvey"),
+    )
+
+    followup = table_cache.get_state(followup_key).frame
+    rows = followup[followup.Community == community]
+    assert (rows.firstDateCommunity == earlier.date.iloc[0]).all()
+    assert (rows.sinceEarliest == (rows.date - earlier.date.iloc[0]).dt.days).all()
@@ -0,0 +1,47 @@
+import tracemalloc
+
+import pytest
+
+import profiling
+
+
+@pytest.fixture
+def session(monkeypatch):
+    """profiles every run, started by the session set with the returned
+    function"""
+    current = {}
+    monkeypatch.setattr(profiling, "ALWAYS_ON", True)
+    monkeypatch.setattr(profiling, "_session_id", lambda: current.get("id"))
+    monkeypatch.setattr(profiling, "_runs", {})
+    yield lambda session_id: current.update(id=session_id)
+    with profiling._lock:
+        for run in profiling._runs.values():
+            profiling._end_run(run)
+
+
+def test_tracing_stops_when_the_last_run_ends(session):
+    assert not tracemalloc.is_tracing()
+    session("a")
+    profiling.start_run("Home")
+    session("b")
+    profiling.start_run("Home")
+    with profiling.timer("section"):
+        list(range(1000))
+    assert profiling._runs["b"]["records"][0]["alloc_bytes"] is not None
+    session("a")
+    profiling.start_run("Report")  # ends the previous run of a
+    assert profiling._tracing_runs == 2
+    for session_id in ["a", "b"]:
+        with profiling._lock:
+            profiling._end_run(profiling._runs[session_id])
+    assert profiling._tracing_runs == 0
+    assert not tracemalloc.is_tracing()
+
+
+def test_runs_are_bounded(session, monkeypatch):
+    monkeypatch.setattr(profiling, "MAX_RUNS", 3)
+    for i in range(5):
+        session(i)
+        profiling.start_run("Home")
+    assert list(profiling._runs) == [2, 3, 4]
+    assert profiling._tracing_runs == 3
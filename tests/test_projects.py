@@ -0,0 +1,55 @@
+import pytest
+
+import Home
+import aggregates
+import projects
+import table_cache
+
+
+@pytest.fixture
+def demographics():
+    return next(
+        aggregate
+        for aggregate in aggregates.AGGREGATES
+        if aggregate.section == "demographics.summary"
+    )
+
+
+@pytest.fixture
+def stored(tables):
+    """the initial surveys stored keyed like Home does: whole, with the
+    demographics columns, and with those columns for one community"""
+    frame = tables["InitialSurvey"]
+    community = frame.Community.iloc[0]
+    columns = aggregates.DEMOGRAPHICS_COLUMNS
+    keys = {
+        "whole": Home.table_key("InitialSurvey"),
+        "columns": Home.table_key("InitialSurvey", columns),
+        "filtered": Home.table_key("InitialSurvey", columns, [community]),
+    }
+    states = {
+        "whole": table_cache.replace(keys["whole"], frame.copy()),
+        "columns": table_cache.replace(keys["columns"], frame[columns].copy()),
+        "filtered": table_cache.replace(
+            keys["filtered"], frame[frame.Community == community][columns].copy()
+        ),
+    }
+    yield states
+    with table_cache._lock:
+        for key in keys.values():
+            table_cache._states.pop(key, None)
+
+
+def test_only_the_table_the_page_requests_is_precomputed(demographics, stored):
+    (frame,) = projects._frames(demographics)
+    assert frame is stored["columns"].frame
+
+
+def test_nothing_is_precomputed_before_the_page_requested_it(demographics, tables):
+    key = Home.table_key("InitialSurvey")
+    table_cache.replace(key, tables["InitialSurvey"].copy())
+    try:
+        assert projects._frames(demographics) is None
+    finally:
+        with table_cache._lock:
+            table_cache._states.pop(key, None)
@@ -0,0 +1,41 @@
+import pytest
+
+import report
+
+
+@pytest.fixture
+def built(monkeypatch):
+    """builds reports instantly, recording the communities of each build"""
+    builds = []
+
+    def build_report(initial, followup, communitywater, communities, title):
+        builds.append(communities)
+        return b"report"
+
+    monkeypatch.setattr(report, "build_report", build_report)
+    monkeypatch.setattr(report, "_reports", report.OrderedDict())
+    return builds
+
+
+def _frames(tables, store):
+    return [store(tables[table]) for table in report.TABLES]
+
+
+def test_reports_are_built_once(tables, store, built):
+    frames = _frames(tables, store)
+    for _ in range(2):
+        assert report.request(*frames, ["Tampe"]).result() == b"report"
+    assert built == [["Tampe"]]
+
+
+def test_least_recently_requested_reports_are_dropped(
+    tables, store, built, monkeypatch
+):
+    monkeypatch.setattr(report, "MAX_REPORTS", 2)
+    frames = _frames(tables, store)
+    for communities in [["a"], ["b"], ["a"], ["c"]]:
+        report.request(*frames, communities).result()
+    assert len(report._reports) == 2
+    report.request(*frames, ["a"]).result()
+    report.request(*frames, ["b"]).result()
+    assert built == [["a"], ["b"], ["c"], ["b"]]
@@ -0,0 +1,56 @@
+import pandas as pd
+
+import Home
+import rollups
+import table_cache
+
+
+def _communities(df: pd.DataFrame) -> list:
+    return list(df.Community.dropna().unique())
+
+
+def test_daily_counts_match_the_rows(tables, store):
+    initial = store(tables["InitialSurvey"])
+    communities = _communities(initial)[:2]
+    selected = table_cache.select(initial, "Community", communities)
+    counts = rollups.daily_counts(selected, communities)
+    expected = selected.groupby(selected.date.dt.normalize()).size()
+    pd.testing.assert_series_equal(counts, expected, check_names=False)
+
+
+def test_weekly_counts_of_a_community_without_follow_ups(tables, store):
+    initial = store(tables["InitialSurvey"])
+    community = _communities(initial)[0]
+    followup = store(
+        tables["FollowUpSurvey"][tables["FollowUpSurvey"].Community != community]
+    )
+    weekly = Home.weekly_counts(
+        table_cache.select(initial, "Community", [community]),
+        table_cache.select(followup, "Community", [community]),
+        [community],
+    )
+    assert weekly["Follow up"].isna().all()
+    assert weekly["Initial"].sum() == (initial.Community == community).sum()
+
+
+def test_empty_counts_line_up_with_synced_dates(tables):
+    empty = rollups.daily_counts(pd.DataFrame([]))
+    assert empty.empty
+    synced = rollups.daily_counts(tables["InitialSurvey"])
+    assert empty.index.dtype == synced.index.dtype
+    pd.concat({"a": rollups.by_period(empty, "W"), "b": synced}, axis=1)
+
+
+def test_weekday_counts_sum_the_daily_counts(tables):
+    daily = rollups.daily_counts(tables["InitialSurvey"])
+    weekdays = rollups.by_weekday(daily)
+    assert weekdays.sum() == len(tables["InitialSurvey"])
+    assert set(weekdays.index) <= set(rollups.WEEKDAYS)
+
+
+def test_daily_counts_of_a_subset(tables, store):
+    initial = store(tables["InitialSurvey"])
+    communities = _communities(initial)[:2]
+    # the subset carries the version of the stored frame, but not its rows
+    subset = table_cache.select(initial, "Community", communities).head(10)
+    assert rollups.daily_counts(subset, communities).sum() == 10
@@ -0,0 +1,32 @@
+import pandas as pd
+import pytest
+
+import schema
+from tools import synthetic_data
+
+
+@pytest.mark.parametrize("table", ["InitialSurvey", "FollowUpSurvey"])
+def test_phone_numbers_are_hashed_in_every_survey(table):
+    records = pd.DataFrame(synthetic_data.generate(scale=1)[table]).head(50)
+    records["HeadHouseholdPhoneNumber"] = [f"02692{i:05d}" for i in range(50)]
+    df = schema.apply_schema(records, table)
+    assert "HeadHouseholdPhoneNumber" not in df.columns
+    expected = records.HeadHouseholdPhoneNumber.map(schema.hash_phone)
+    assert (df.HeadHouseholdPhoneNumberHash.fillna("") == expected.fillna("")).all()
+
+
+def test_numbers_written_differently_hash_the_same():
+    assert schema.hash_phone("+233 26 923 9289") == schema.hash_phone("0269239289")
+    assert schema.hash_phone("12") is None
+
+
+@pytest.mark.parametrize("table", ["InitialSurvey", "FollowUpSurvey"])
+def test_concat_matches_the_whole_download(table):
+    df = pd.DataFrame(synthetic_data.generate(scale=1)[table])
+    chunks = [
+        schema.apply_schema(df.iloc[start : start + 100], table)
+        for start in range(0, len(df), 100)
+    ] + [schema.apply_schema(pd.DataFrame(), table)]
+    pd.testing.assert_frame_equal(
+        schema.concat(chunks, table), schema.apply_schema(df, table)
+    )
@@ -0,0 +1,109 @@
+import time
+
+import pandas as pd
+
+import table_cache
+
+
+def test_merge_adds_replaces_and_removes_rows(tables, store):
+    initial = tables["InitialSurvey"]
+    stored = store(initial.iloc[:-5])
+    key = next(key for key, state in table_cache.stored() if state.frame is stored)
+    changed = initial.iloc[[0]].assign(HeadHouseholdName="changed")
+    new_rows = pd.concat([changed, initial.iloc[-5:]])
+    removed = [initial.id.iloc[1]]
+
+    state = table_cache.merge(key, new_rows, removed)
+
+    merged = state.frame.set_index("id")
+    assert len(merged) == len(initial) - 1
+    assert initial.id.iloc[1] not in merged.index
+    assert merged.HeadHouseholdName[initial.id.iloc[0]] == "changed"
+    assert state.frame.date.is_monotonic_increasing
+    assert state.version != table_cache.data_version(stored)
+    assert table_cache.data_version(state.frame) == state.version
+
+
+def test_merge_without_changes_keeps_the_version(tables, store):
+    stored = store(tables["InitialSurvey"])
+    key = next(key for key, state in table_cache.stored() if state.frame is stored)
+    state = table_cache.merge(key, tables["InitialSurvey"].iloc[:0])
+    assert state.version == table_cache.data_version(stored)
+
+
+def test_merge_keeps_a_version_stored_meanwhile(tables, store):
+    initial = tables["InitialSurvey"]
+    stored = store(initial.iloc[:-1])
+    key = next(key for key, state in table_cache.stored() if state.frame is stored)
+    meanwhile = {}
+
+    def prepare(df: pd.DataFrame) -> pd.DataFrame:
+        # another sync stores a full copy while this merge is running
+        meanwhile["state"] = table_cache.replace(key, initial.copy())
+        return df
+
+    state = table_cache.merge(key, initial.iloc[-1:], prepare=prepare)
+    assert state is meanwhile["state"]
+    assert table_cache.get_state(key) is meanwhile["state"]
+
+
+def test_select_takes_rows_of_the_stored_frame(tables, store):
+    stored = store(tables["InitialSurvey"])
+    for communities in [[], list(stored.Community.dropna().unique())[:2]]:
+        selected = table_cache.select(stored, "Community", communities)
+        expected = stored[stored.Community.isin(communities)]
+        pd.testing.assert_frame_equal(selected, expected)
+
+
+def test_select_filters_a_subset_of_the_stored_frame(tables, store):
+    stored = store(tables["InitialSurvey"])
+    communities = list(stored.Community.dropna().unique())[:2]
+    # a subset keeps the version of the stored frame in its attrs
+    subset = stored[stored.Community == communities[0]].head(5)
+    assert table_cache.data_version(subset) == table_cache.data_version(stored)
+    selected = table_cache.select(subset, "Community", communities)
+    assert sorted(selected.id) == sorted(subset.id)
+
+
+def test_get_state_loads_without_the_lock(tables, monkeypatch):
+    key = ("test", "disk", id(tables))
+    frame = tables["InitialSurvey"].head(20).copy()
+    table_cache.save(key, table_cache.TableState(frame, None, time.time(), 0))
+    stored = {}
+
+    def load(key):
+        # another session stores the table while this one reads the disk
+        assert not table_cache._lock.locked()
+        stored["state"] = table_cache.replace(key, frame.copy())
+        return original(key)
+
+    original = table_cache.load
+    monkeypatch.setattr(table_cache, "load", load)
+    try:
+        assert table_cache.get_state(key) is stored["state"]
+    finally:
+        with table_cache._lock:
+            table_cache._states.pop(key, None)
+
+
+def test_least_recently_used_tables_are_dropped(tables, store, monkeypatch):
+    frames = [store(tables["InitialSurvey"].head(n)) for n in (10, 20, 30)]
+    keys = [
+        next(key for key, state in table_cache.stored() if state.frame is frame)
+        for frame in frames
+    ]
+    dropped = []
+    monkeypatch.setattr(
+        table_cache,
+        "_listeners",
+        table_cache._listeners + [lambda old, new: new is None and dropped.append(old)],
+    )
+    sizes = [table_cache.get_state(key).nbytes for key in keys]
+    table_cache.get_state(keys[0])  # now used more recently than keys[1]
+    monkeypatch.setattr(table_cache, "MEMORY_MAX_BYTES", sizes[0] + sizes[2])
+    table_cache.replace(keys[2], frames[2].copy())
+    stored = dict(table_cache.stored())
+    assert keys[0] in stored and keys[2] in stored and keys[1] not in stored
+    assert dropped == [table_cache.data_version(frames[1])]
+    # still on disk
+    assert table_cache.get_state(keys[1]).version == dropped[0]
@@ -0,0 +1,266 @@
+"""Render every page for every project and community to static HTML.
+
+    python -m tools.batch_render --out renders --workers 4
+
+Each page script is run headlessly with Streamlit's AppTest, exactly as a
+browser session would run it, and its text, tables and charts are written to
+one self-contained HTML file per (page, community selection). The tables are
+synced once, then worker processes are forked so they all share that one
+loaded copy of the data instead of each downloading it. Outputs whose input
+table versions haven't changed since the last run are skipped.
+"""
+
+import argparse
+import base64
+import html
+import json
+import multiprocessing
+import os
+import re
+import sys
+import time
+import typing
+
+# workers are forked from this process, which must not have background
+# threads running, share whole tables rather than one download per selection
+# and can only save charts as images
+os.environ["BWF_PRECOMPUTE_PROJECTS"] = "0"
+os.environ["BWF_WARMUP"] = "0"
+os.environ["BWF_SERVER_SIDE_FILTER"] = "0"
+os.environ["BWF_CHART_BACKEND"] = "matplotlib"
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# the app reads files relative to the repo from the moment it is imported,
+# --out is relative to where this was started from
+CWD = os.getcwd()
+os.chdir(ROOT)
+
+import pandas as pd  # noqa: E402
+from streamlit.runtime.memory_media_file_storage import (  # noqa: E402
+    MemoryMediaFileStorage,
+)
+from streamlit.testing.v1 import AppTest, app_test  # noqa: E402
+
+import Home  # noqa: E402
+import projects  # noqa: E402
+import table_cache  # noqa: E402
+
+# the report page is static text, its live report is built by report.py
+PAGES = [
+    "Home.py",
+    "pages/1_👪_Demographics.py",
+    "pages/2_💧_Community_Water.py",
+    "pages/3_📝_Follow_Up_Comparison.py",
+]
+MANIFEST = "manifest.json"
+TIMEOUT = 600  # seconds for a single page run
+
+
+def slug(name: str) -> str:
+    """returns {name} as a file name"""
+    return re.sub(r"[^A-Za-z0-9]+", "_", name).strip("_") or "_"
+
+
+class KeptMediaStorage(MemoryMediaFileStorage):
+    """AppTest keeps the images a page shows in a media storage that is gone
+    once the run is over, this one stays readable until the next run"""
+
+    latest: "KeptMediaStorage" = None
+
+    def __init__(self, media_endpoint: str):
+        super().__init__(media_endpoint)
+        KeptMediaStorage.latest = self
+
+
+app_test.MemoryMediaFileStorage = KeptMediaStorage
+
+
+# one app per page and process. Setting up an AppTest scans every installed
+# package for components, so apps are rerun with a new selection instead
+_apps: typing.Dict[str, AppTest] = {}
+
+
+def run_page(page: str, selection: typing.List[str]) -> AppTest:
+    """runs the {page} script with {selection} chosen in the sidebar"""
+    # the script runs as __main__, which would leave render() unpicklable for
+    # the pool when this is run with -m
+    main_module = sys.modules["__main__"]
+    try:
+        at = _apps.get(page)
+        if at is None or not at.sidebar.multiselect:
+            at = _apps[page] = AppTest.from_file(
+                os.path.join(ROOT, page), default_timeout=TIMEOUT
+            )
+            at.session_state["c_select"] = selection
+            return at.run()
+        return at.sidebar.multiselect[0].set_value(selection).run()
+    finally:
+        sys.modules["__main__"] = main_module
+
+
+def _media(url: str) -> str:
+    """returns the image Streamlit stored at {url} as a data URL"""
+    media = KeptMediaStorage.latest.get_file(url.rsplit("/", 1)[1])
+    data = base64.b64encode(media.content).decode()
+    return f"data:{media.mimetype};base64,{data}"
+
+
+def _markdown(text: str) -> str:
+    """just enough markdown for what the pages write: headings and rules"""
+    parts = []
+    for block in text.split("\n\n"):
+        stripped = block.strip()
+        heading = re.match(r"(#{1,6})\s+(.*)", stripped, re.S)
+        if stripped == "---":
+            parts.append("<hr>")
+        elif heading:
+            level = len(heading.group(1))
+            parts.append(f"<h{level}>{html.escape(heading.group(2))}</h{level}>")
+        elif stripped:
+            parts.append(f"<p>{html.escape(stripped)}</p>".replace("\n", "<br>"))
+    return "\n".join(parts)
+
+
+def page_html(at: AppTest, title: str) -> str:
+    """returns the output of a page run as a self-contained HTML document"""
+    body = [f"<h1>{html.escape(title)}</h1>"]
+    for node in at.main:
+        kind = getattr(node, "type", None)
+        if kind in ("markdown", "caption", "text"):
+            body.append(_markdown(node.value))
+        elif kind in ("title", "header", "subheader"):
+            body.append(f"<h2>{html.escape(node.value)}</h2>")
+        elif kind in ("dataframe", "table"):
+            try:
+                body.append(pd.DataFrame(node.value).to_html(border=0))
+            except Exception:
+                # AppTest can't decode every table Streamlit can show, e.g.
+                # ones indexed by intervals
+                body.append("<p>(table not rendered)</p>")
+        elif kind == "json":
+            body.append(f"<pre>{html.escape(str(node.value))}</pre>")
+        elif kind == "image":
+            body += [f'<img src="{_media(url)}">' for url in node.value]
+        elif kind in ("error", "warning", "info", "success"):
+            body.append(f'<p class="{kind}">{html.escape(node.value)}</p>')
+    return (
+        '<!DOCTYPE html>\n<html><head><meta charset="utf-8">'
+        f"<title>{html.escape(title)}</title>"
+        "<style>body { font-family: sans-serif; max-width: 60em; margin: auto }"
+        " img { max-width: 100% }</style></head>\n<body>\n"
+        + "\n".join(body)
+        + "\n</body></html>\n"
+    )
+
+
+# keys of the synced tables read since the last reset, see page_tables
+_read: typing.Set[tuple] = set()
+_get_state = table_cache.get_state
+
+
+def _recording_get_state(key: typing.Hashable) -> table_cache.TableState:
+    _read.add(key)
+    return _get_state(key)
+
+
+table_cache.get_state = _recording_get_state
+# page -> keys of the synced tables it reads, whatever the selection
+page_tables: typing.Dict[str, typing.Set[tuple]] = {}
+
+
+def signature(page: str, selection: typing.List[str]) -> str:
+    """returns what the output of {page} for {selection} depends on: the
+    versions of the synced tables it reads and the selected communities"""
+    states = dict(table_cache.stored())
+    versions = sorted(states[key].version for key in page_tables[page] if key in states)
+    return json.dumps([versions, projects.expand(selection)])
+
+
+def output_path(page: str, name: str) -> str:
+    page_name = os.path.splitext(os.path.basename(page))[0]
+    return os.path.join(slug(page_name), slug(name) + ".html")
+
+
+def render(task: typing.Tuple[str, str, str]) -> typing.Tuple[str, str, str]:
+    """runs a page for a selection and writes its HTML, returns (path, error,
+    signature), in a worker process"""
+    page, name, out = task
+    path = output_path(page, name)
+    try:
+        at = run_page(page, [name])
+        if at.exception:
+            return path, str(at.exception[0].value), ""
+        title = f"{os.path.splitext(os.path.basename(page))[0]}: {name}"
+        os.makedirs(os.path.join(out, os.path.dirname(path)), exist_ok=True)
+        with open(os.path.join(out, path), "w", encoding="utf-8") as f:
+            f.write(page_html(at, title))
+    except Exception as e:
+        return path, repr(e), ""
+    return path, "", signature(page, [name])
+
+
+def groupings() -> typing.List[str]:
+    """every project and every community, as offered in the sidebar"""
+    return list(projects.PROJECTS) + Home.community_names(Home.get_community_options())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--out", default="renders", help="output directory")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument(
+        "--force", action="store_true", help="render outputs that are up to date"
+    )
+    args = parser.parse_args()
+    out = os.path.join(CWD, args.out)
+    os.makedirs(out, exist_ok=True)
+    start = time.perf_counter()
+
+    # sync every table each page reads once, here, so the workers inherit it
+    names = groupings()
+    for page in PAGES:
+        _read.clear()
+        at = run_page(page, names[:1])
+        if at.exception:
+            raise SystemExit(f"{page} failed: {at.exception[0].value}")
+        page_tables[page] = set(_read)
+    Home.OFFLINE = True
+    os.environ["BWF_OFFLINE"] = "1"
+
+    manifest_path = os.path.join(out, MANIFEST)
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    tasks = [
+        (page, name, out)
+        for page in PAGES
+        for name in names
+        if args.force
+        or manifest.get(output_path(page, name)) != signature(page, [name])
+        or not os.path.exists(os.path.join(out, output_path(page, name)))
+    ]
+    print(
+        f"{len(PAGES) * len(names)} outputs, {len(tasks)} to render "
+        f"with {args.workers} workers"
+    )
+
+    failed = 0
+    with multiprocessing.get_context("fork").Pool(args.workers) as pool:
+        for path, error, sig in pool.imap_unordered(render, tasks):
+            if error:
+                failed += 1
+                print(f"{path}: {error}")
+                continue
+            manifest[path] = sig
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    print(
+        f"rendered {len(tasks) - failed}, failed {failed} "
+        f"in {time.perf_counter() - start:.0f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""Local stand-in for the survey API, serving synthetic data.
+
+    python -m tools.mock_api --scale 10 --port 8765
+
+prints the environment variables that point the dashboard at it.
+"""
+
+import argparse
+import ast
+import datetime
+import json
+import os
+import tempfile
+import threading
+import time
+import typing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import jwt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from tools import synthetic_data
+
+TOKEN_LIFETIME = 3600  # seconds
+
+
+def make_key_pair() -> typing.Tuple[bytes, bytes]:
+    """returns a throwaway (private, public) RS256 key pair as PEM"""
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private = key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    )
+    public = key.public_key().public_bytes(
+        serialization.Encoding.PEM,
+        serialization.PublicFormat.SubjectPublicKeyInfo,
+    )
+    return private, public
+
+
+def matches(record: dict, query: dict) -> bool:
+    """True if record satisfies the mongo style {query}. Supports $and, $or
+    and the $eq/$ne/$in/$gt/$gte/$lt/$lte field operators"""
+    for field, condition in query.items():
+        if field == "$and":
+            if not all(matches(record, q) for q in condition):
+                return False
+        elif field == "$or":
+            if not any(matches(record, q) for q in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = record.get(field)
+            for op, operand in condition.items():
+                if op == "$eq" and not value == operand:
+                    return False
+                if op == "$ne" and not value != operand:
+                    return False
+                if op == "$in" and value not in operand:
+                    return False
+                if op in ("$gt", "$gte", "$lt", "$lte"):
+                    if value is None:
+                        return False
+                    if op == "$gt" and not value > operand:
+                        return False
+                    if op == "$gte" and not value >= operand:
+                        return False
+                    if op == "$lt" and not value < operand:
+                        return False
+                    if op == "$lte" and not value <= operand:
+                        return False
+        elif record.get(field) != condition:
+            return False
+    return True
+
+
+def run_query(
+    records: typing.List[dict], query: dict, extra: dict
+) -> typing.List[dict]:
+    """applies the query and its sort/skip/limit/projection options"""
+    results = [record for record in records if matches(record, query)]
+    for field, direction in reversed(extra.get("sort", [])):
+        results.sort(key=lambda record: record.get(field) or "", reverse=direction < 0)
+    skip = extra.get("skip", 0)
+    limit = extra.get("limit")
+    results = results[skip : skip + limit if limit else None]
+    projection = extra.get("projection")
+    if projection:
+        fields = [field for field, keep in projection.items() if keep]
+        results = [{f: record[f] for f in fields if f in record} for record in results]
+    return results
+
+
+class MockAPI:
+    """the data and keys behind a mock API server"""
+
+    def __init__(self, tables: typing.Dict[str, typing.List[dict]], latency: float = 0):
+        self.tables = tables
+        self.latency = latency
+        self.private_key, self.public_key = make_key_pair()
+
+    def issue_token(self) -> str:
+        now = datetime.datetime.now(datetime.timezone.utc)
+        claims = {
+            "sub": "mock",
+            "exp": now + datetime.timedelta(seconds=TOKEN_LIFETIME),
+        }
+        return jwt.encode(claims, self.private_key, "RS256")
+
+    def token_valid(self, token: str) -> bool:
+        try:
+            jwt.decode(token, self.public_key, ["RS256"])
+        except jwt.exceptions.InvalidTokenError:
+            return False
+        return True
+
+    def handler(self) -> typing.Type[BaseHTTPRequestHandler]:
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+
+            def send_json(self, status: int, body) -> None:
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                time.sleep(api.latency)
+                if self.path != "/auth":
+                    return self.send_json(404, {"msg": "not found"})
+                if not self.headers.get("mykey") or not self.headers.get("test"):
+                    return self.send_json(401, {"msg": "missing certificate"})
+                self.send_json(200, {"access_token": api.issue_token()})
+
+            def do_POST(self):
+                time.sleep(api.latency)
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if not self.path.startswith("/query/"):
+                    return self.send_json(404, {"msg": "not found"})
+                table = self.path[len("/query/") :]
+                if table not in api.tables:
+                    return self.send_json(404, {"msg": f"unknown table {table}"})
+                token = self.headers.get("Authorization", "").replace("Bearer ", "")
+                if not api.token_valid(token):
+                    return self.send_json(401, {"msg": "invalid token"})
+
+                form = parse_qs(body.decode())
+                try:
+                    query = ast.literal_eval(form.get("query", ["{}"])[0])
+                    extra = ast.literal_eval(form.get("extra", ["{}"])[0])
+                except (ValueError, SyntaxError) as e:
+                    return self.send_json(400, {"msg": f"bad query: {e}"})
+                data = run_query(api.tables[table], query, extra)
+                self.send_json(
+                    200, jwt.encode({"data": data}, api.private_key, "RS256")
+                )
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def serve(
+    tables: typing.Dict[str, typing.List[dict]],
+    port: int = 0,
+    latency: float = 0,
+) -> typing.Tuple[ThreadingHTTPServer, MockAPI]:
+    """starts a mock API server on a background thread and returns it. port=0
+    picks a free port, see server.server_address"""
+    api = MockAPI(tables, latency)
+    server = ThreadingHTTPServer(("127.0.0.1", port), api.handler())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, api
+
+
+def configure_environment(server: ThreadingHTTPServer, api: MockAPI) -> None:
+    """points the dashboard's environment variables at a mock server"""
+    os.environ["API_SERVER_URL"] = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ["CERT_NAME"] = "mock"
+    os.environ["ENCODED_CERT"] = "mock"
+    os.environ["PUBLIC_KEY"] = api.public_key.decode()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=int, default=1, choices=synthetic_data.SCALES)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument(
+        "--latency", type=float, default=0, help="seconds added to every request"
+    )
+    args = parser.parse_args()
+
+    tables = synthetic_data.generate(args.scale, args.seed)
+    server, api = serve(tables, args.port, args.latency)
+    key_path = os.path.join(tempfile.gettempdir(), "bwf_mock_api.pub")
+    with open(key_path, "wb") as f:
+        f.write(api.public_key)
+
+    for table, records in tables.items():
+        print(f"{table}: {len(records)} records")
+    print("\nrun the dashboard against it with:\n")
+    print(f"export API_SERVER_URL=http://127.0.0.1:{server.server_address[1]}")
+    print("export CERT_NAME=mock ENCODED_CERT=mock")
+    print(f'export PUBLIC_KEY="$(cat {key_path})"')
+    print("streamlit run Home.py")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+"""Run the dashboard with its tables warming up from the moment it starts.
+
+    python -m tools.serve [streamlit run options, e.g. --server.port 8501]
+
+`streamlit run Home.py` only imports the app once the first session opens a
+page, so the warm-up worker would start with that first visitor. This starts
+the worker first and then the Streamlit server in the same process, so the
+tables are synced before anyone arrives.
+"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# the app reads files relative to the repo from the moment it is imported
+os.chdir(ROOT)
+
+from streamlit.web import cli  # noqa: E402
+
+import warmup  # noqa: E402
+
+
+def main() -> None:
+    warmup.start()
+    cli.main(["run", os.path.join(ROOT, "Home.py")] + sys.argv[1:], "streamlit")
+
+
+if __name__ == "__main__":
+    main()
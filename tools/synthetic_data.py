@@ -0,0 +1,328 @@
+"""Generates realistic looking survey records for load testing the dashboard.
+
+python -m tools.synthetic_data --scale 10 --out synthetic.json
+"""
+
+import argparse
+import datetime
+import json
+import random
+import typing
+import uuid
+
+# roughly the number of completed records per table in the live data, scale=1
+BASE_COUNTS = {
+    "InitialSurvey": 400,
+    "FollowUpSurvey": 800,
+    "CommunityWaterTest": 120,
+}
+SCALES = [1, 10, 100, 1000]
+
+COMMUNITIES = [
+    "Sankebunase (Nkurakan/Amonon)",
+    "Sankebunase",
+    "Nkurakan",
+    "Amonom",
+    "Mampong",
+    "Wekpeti/Abresu",
+    "Ekorso",
+    "Akwadum",
+    "Akwadusu",
+]
+FIRST_NAMES = [
+    "Kwame",
+    "Kofi",
+    "Ama",
+    "Akosua",
+    "Yaw",
+    "Abena",
+    "Kwaku",
+    "Adwoa",
+    "Kwabena",
+    "Efua",
+    "Kojo",
+    "Esi",
+    "Kweku",
+    "Afua",
+    "Yaa",
+    "Akua",
+]
+LAST_NAMES = [
+    "Mensah",
+    "Owusu",
+    "Asante",
+    "Boateng",
+    "Osei",
+    "Agyeman",
+    "Appiah",
+    "Ofori",
+    "Darko",
+    "Amoah",
+    "Acheampong",
+    "Frimpong",
+    "Gyasi",
+    "Adjei",
+]
+
+ANSWERS = {
+    "HeadHouseholdSex": ["MALE", "FEMALE"],
+    "HeadHouseholdMaritalStatus": ["MARRIED", "SINGLE", "WIDOWED", "DIVORCED"],
+    "HeadHouseholdOccupation": [
+        "FARMER",
+        "TRADER",
+        "OTHER",
+        "NONE",
+        "CIVILSERVANT",
+        "TEACHER",
+    ],
+    "HeadHouseholdEducation": [
+        "NOFORMALEDUCATION",
+        "SOMEPRIMARYSCHOOL",
+        "COMPLETEDPRIMARYSCHOOL",
+        "SOMEJRHIGHSCHOOL",
+        "COMPLETEDJRHIGHSCHOOL",
+        "SOMESRHIGHSCHOOL",
+        "COMPLETEDSRHIGHSCHOOL",
+        "SOMEEDUCATIONBEYONDHIGHSCHOOL",
+    ],
+    "MainSourceDrinkingWater": [
+        "BOREHOLE",
+        "STREAM",
+        "PIPEDWATER",
+        "WELL",
+        "RAINWATER",
+        "SACHETWATER",
+    ],
+    "MainSourceOtherPurposeWater": [
+        "BOREHOLE",
+        "STREAM",
+        "PIPEDWATER",
+        "WELL",
+        "RAINWATER",
+    ],
+    "HouseholdFrequencyAtWaterSource": [
+        "2ORMORETIMEPERDAY",
+        "ONCEDAILY",
+        "EVERYOTHERDAY",
+        "EVERYTHIRDDAY",
+        "WEEKLY",
+    ],
+    "UsualHouseholdWaterFetcher": [
+        "ADULTWOMAN",
+        "ADULTMAN",
+        "FEMALECHILD",
+        "MALECHILD",
+    ],
+    "ContainerCarryWater": ["BUCKET", "JERRYCAN", "POT", "OTHER"],
+    "WaterTreatmentBeforeDrinking": ["ALWAYS", "SOMETIMES", "NEVER"],
+    "FrequencyWaterTreatment": ["DAILY", "WEEKLY", "MONTHLY", "RARELY", "NEVER"],
+    "LastTimeTreatedHouseholdWaterWithChlorine": [
+        "TODAY",
+        "YESTERDAY",
+        "LASTWEEK",
+        "LASTMONTH",
+        "NEVER",
+    ],
+    "ColilertTestResult": ["POSITIVE", "NEGATIVE"],
+    "PetrifilmTestResult": ["HIGHRISK", "MEDIUMRISK", "LOWRISK", "SAFE"],
+}
+# answers that become more likely in follow up surveys, after the program
+IMPROVED_ANSWERS = {
+    "WaterTreatmentBeforeDrinking": "ALWAYS",
+    "FrequencyWaterTreatment": "DAILY",
+    "LastTimeTreatedHouseholdWaterWithChlorine": "TODAY",
+}
+AGE_GROUPS = ["0_1Year", "1_5Year", "5_12Year", "13_17Year"]
+
+START_DATE = datetime.datetime(2021, 9, 1)
+
+
+def _timestamp(d: datetime.datetime) -> str:
+    return d.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+def _base_record(rng: random.Random, community: str, date: datetime.datetime) -> dict:
+    """fields every table has"""
+    return {
+        "id": str(uuid.UUID(int=rng.getrandbits(128))),
+        "Country": "Ghana",
+        "Completed": 1,
+        # a few records are soft deleted, the dashboard must never show them
+        "disabled": rng.random() < 0.02,
+        "Community": community,
+        "date": _timestamp(date),
+        "createdAt": _timestamp(date + datetime.timedelta(minutes=rng.randint(1, 600))),
+        "Namebwe": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+    }
+
+
+def _survey_date(
+    rng: random.Random, community: str, offset_days: int = 0
+) -> datetime.datetime:
+    """communities are surveyed in turn, each within a few weeks"""
+    start = START_DATE + datetime.timedelta(days=14 * COMMUNITIES.index(community))
+    return start + datetime.timedelta(
+        days=offset_days + rng.randint(0, 21), hours=rng.randint(8, 17)
+    )
+
+
+def _illness_answers(rng: random.Random, improvement: float) -> dict:
+    """days missed and medical costs, {improvement} in [0, 1) lowers them"""
+    scale = 1 - improvement
+    return {
+        "NoDaysNoWorkBecauseOfOwnIllness": (
+            int(rng.expovariate(1 / (2 * scale + 0.01)))
+            if rng.random() < 0.5 * scale
+            else 0
+        ),
+        "NoDaysNoWorkBecauseOfIllnessFamilyMembers": (
+            int(rng.expovariate(1 / (3 * scale + 0.01)))
+            if rng.random() < 0.5 * scale
+            else 0
+        ),
+        "NoTotalSchoolDaysMissedBySchoolAgeChildrenIn2LastWeek": (
+            int(rng.expovariate(1 / (2 * scale + 0.01)))
+            if rng.random() < 0.4 * scale
+            else 0
+        ),
+        "MoneySpentMedicalTreatmentLast4weeks": (
+            round(rng.expovariate(1 / (40 * scale + 1)), 2)
+            if rng.random() < 0.6 * scale
+            else 0
+        ),
+    }
+
+
+def _water_answers(rng: random.Random, improvement: float) -> dict:
+    answers = {}
+    for column, improved in IMPROVED_ANSWERS.items():
+        if rng.random() < improvement:
+            answers[column] = improved
+        else:
+            answers[column] = rng.choice(ANSWERS[column])
+    return answers
+
+
+def make_initial(rng: random.Random, n: int) -> typing.List[dict]:
+    """returns {n} InitialSurvey records"""
+    records = []
+    for _ in range(n):
+        community = rng.choice(COMMUNITIES)
+        record = _base_record(rng, community, _survey_date(rng, community))
+        record["SurveyId"] = str(uuid.UUID(int=rng.getrandbits(128)))
+        name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        # spelling and spacing slips, like the ones in the live data
+        if rng.random() < 0.05:
+            name = "  " + name.replace(" ", "  ")
+        record["HeadHouseholdName"] = name
+        record["HeadHouseholdPhoneNumber"] = (
+            f"0{rng.choice([20, 24, 26, 27, 50, 54, 55])}{rng.randint(0, 9999999):07d}"
+        )
+        record["HeadHouseholdAge"] = rng.randint(18, 85)
+        total = 0
+        for group in AGE_GROUPS:
+            for sex in ["Male", "Female"]:
+                count = rng.choices([0, 1, 2, 3], [5, 3, 2, 1])[0]
+                record[f"NoHousehold{sex}{group}"] = count
+                total += count
+        total += rng.randint(1, 4)  # adults
+        record["TotalNoPeopleHousehold"] = total
+        record["TimeToWaterSourceGetReturn"] = rng.choice(
+            [5, 10, 15, 20, 30, 45, 60, 90]
+        )
+        for column in [
+            "HeadHouseholdSex",
+            "HeadHouseholdMaritalStatus",
+            "HeadHouseholdOccupation",
+            "HeadHouseholdEducation",
+            "MainSourceDrinkingWater",
+            "MainSourceOtherPurposeWater",
+            "HouseholdFrequencyAtWaterSource",
+            "UsualHouseholdWaterFetcher",
+            "ContainerCarryWater",
+        ]:
+            record[column] = rng.choice(ANSWERS[column])
+        record.update(_water_answers(rng, improvement=0.1))
+        record.update(_illness_answers(rng, improvement=0.0))
+        records.append(record)
+    return records
+
+
+def make_followup(
+    rng: random.Random, initial: typing.List[dict], n: int
+) -> typing.List[dict]:
+    """returns {n} FollowUpSurvey records, each revisiting a household from
+    {initial} 3 to 12 months later"""
+    records = []
+    for _ in range(n):
+        household = rng.choice(initial)
+        offset = rng.randint(90, 365)
+        record = _base_record(
+            rng,
+            household["Community"],
+            _survey_date(rng, household["Community"], offset),
+        )
+        record["SurveyId"] = household["SurveyId"]
+        record["HeadHouseholdName"] = household["HeadHouseholdName"].strip()
+        # asked again in most follow ups, sometimes with the country code
+        if rng.random() < 0.8:
+            phone = household["HeadHouseholdPhoneNumber"]
+            record["HeadHouseholdPhoneNumber"] = (
+                "+233" + phone[1:] if rng.random() < 0.3 else phone
+            )
+        improvement = min(0.8, offset / 365)
+        record.update(_water_answers(rng, improvement))
+        record.update(_illness_answers(rng, improvement / 2))
+        records.append(record)
+    return records
+
+
+def make_community_water(rng: random.Random, n: int) -> typing.List[dict]:
+    """returns {n} CommunityWaterTest records"""
+    records = []
+    for _ in range(n):
+        community = rng.choice(COMMUNITIES)
+        record = _base_record(
+            rng, community, _survey_date(rng, community, rng.randint(0, 365))
+        )
+        record["ColilertTestResult"] = rng.choice(ANSWERS["ColilertTestResult"])
+        record["PetrifilmTestResult"] = rng.choice(ANSWERS["PetrifilmTestResult"])
+        records.append(record)
+    return records
+
+
+def generate(scale: int = 1, seed: int = 0) -> typing.Dict[str, typing.List[dict]]:
+    """returns {table name: records} with {scale} times the live data volume,
+    sorted by date like the API returns them"""
+    rng = random.Random(seed)
+    initial = make_initial(rng, BASE_COUNTS["InitialSurvey"] * scale)
+    tables = {
+        "InitialSurvey": initial,
+        "FollowUpSurvey": make_followup(
+            rng, initial, BASE_COUNTS["FollowUpSurvey"] * scale
+        ),
+        "CommunityWaterTest": make_community_water(
+            rng, BASE_COUNTS["CommunityWaterTest"] * scale
+        ),
+    }
+    for records in tables.values():
+        records.sort(key=lambda record: record["date"])
+    return tables
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=int, default=1, choices=SCALES)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="synthetic.json")
+    args = parser.parse_args()
+
+    tables = generate(args.scale, args.seed)
+    with open(args.out, "w") as f:
+        json.dump(tables, f)
+    for table, records in tables.items():
+        print(f"{table}: {len(records)} records")
+
+
+if __name__ == "__main__":
+    main()
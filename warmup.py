@@ -0,0 +1,83 @@
+import logging
+import os
+import threading
+import time
+import typing
+
+import aggregates
+import duplicates
+import households
+import report
+import rollups
+
+logger = logging.getLogger(__name__)
+
+# keep the synced tables, and what is derived from them, warm in a background
+# thread so no session waits on a download, see start()
+ENABLED = os.environ.get("BWF_WARMUP", "1") == "1"
+# seconds between warm-ups. Shorter than Home.SYNC_MAX_AGE, so tables are
+# synced again before sessions would have to
+INTERVAL = float(os.environ.get("BWF_WARMUP_INTERVAL", 45 * 60))
+
+# (table, columns) of every get_data() call the pages make, None for every
+# column. With BWF_SERVER_SIDE_FILTER pages download one copy per community
+# selection, which can't be known ahead of time, so only the tables that are
+# shared by every selection are warmed then
+TABLES: typing.List[typing.Tuple[str, typing.Union[typing.List[str], None]]] = [
+    ("InitialSurvey", ["Community"]),  # get_community_options()
+    ("InitialSurvey", None),
+    ("FollowUpSurvey", None),
+    ("InitialSurvey", aggregates.DEMOGRAPHICS_COLUMNS),
+    ("InitialSurvey", aggregates.FOLLOWUP_COLUMNS),
+    ("FollowUpSurvey", aggregates.FOLLOWUP_COLUMNS),
+    ("CommunityWaterTest", aggregates.WATER_TEST_COLUMNS),
+] + list(report.COLUMNS.items())
+
+
+def warm() -> None:
+    """syncs every table in TABLES and builds what the pages derive from
+    whole tables: the daily rollups, the household index and duplicates of
+    the initial surveys. Project aggregates are computed whenever a table
+    changes anyway, see projects.schedule()"""
+    import Home  # imported here since Home imports this module
+
+    for tableName, columns in TABLES:
+        df = Home.sync_data(tableName, columns)
+        if df is None:
+            logger.warning("warming up %s failed", tableName)
+            continue
+        if Home.SERVER_SIDE_FILTER or columns is not None:
+            continue
+        rollups.for_frame(df)
+        if tableName == "InitialSurvey":
+            households.for_frame(df)
+            duplicates.duplicate_households(df, [])
+
+
+def _loop() -> None:
+    while True:
+        start = time.monotonic()
+        try:
+            warm()
+        except Exception:
+            logger.warning("warming up the tables failed", exc_info=True)
+        logger.info("warmed up the tables in %.1fs", time.monotonic() - start)
+        time.sleep(INTERVAL)
+
+
+_started = False
+_lock = threading.Lock()
+
+
+def start() -> None:
+    """starts the warm-up worker, once per process and unless it is
+    disabled. It warms every table right away and again every INTERVAL
+    seconds"""
+    global _started
+    if not ENABLED:
+        return
+    with _lock:
+        if _started:
+            return
+        _started = True
+    threading.Thread(target=_loop, name="warmup", daemon=True).start()